@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+#
+# Purpose: Optional long-lived broker for the vra_guest and thycotic_secret modules. The
+# modules are loaded once (along with requests, suds, aiohttp and the Ansible module
+# utilities they import) and each module invocation handed over by a module is run in a
+# child forked from the warm broker rather than in a brand new Python process. A module
+# may also define a 'prepare_broker(params)' function, which the broker calls at start-up
+# for the arguments given with 'prepare' so that children inherit whatever it prepares
+# (thycotic_secret parses its WSDL there once).
+#
+# Modules look for the broker socket (see the 'broker_socket' module option) and run
+# directly, as before, when no broker is listening. An invocation is only accepted when the
+# module Ansible shipped for it is the same code the broker loaded - a module that has been
+# changed since the broker started runs directly.
+#
+# Requirements:
+#  - The dependencies of the modules being served must be installed
+#      pip install -r ../vra-guest/requirements.txt -r ../thycotic-secret/requirements.txt
+#  - A POSIX system (unix sockets and fork)
+#
+# Parameters:
+#  - 'socket': Path of the unix socket to listen on (default ~/.ansible/module_broker.sock)
+#  - 'module': NAME=PATH of a module to serve - may be repeated (defaults to the modules in
+#              this repository)
+#  - 'idle-timeout': Seconds without any invocation after which the broker exits (0 to run forever)
+#  - 'module-utils': Directory of Ansible module utilities the modules import - may be repeated
+#                    (defaults to the module_utils directories in this repository)
+#  - 'prepare': NAME=FILE of a module arguments file (e.g. test_args/thycotic_secret.json) to
+#               prepare the module for at start-up - may be repeated
+#
+# Example:
+#    python module-broker/module_broker.py --idle-timeout 3600 &
+#    ansible-playbook -i "localhost," sample_playbooks/test_vra.yml
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import random
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SOCKET = "~/.ansible/module_broker.sock"
+
+DEFAULT_MODULES = {
+    'vra_guest': os.path.join(BASE_DIR, '../vra-guest/lib/ansible/modules/cloud/vmware/vra_guest.py'),
+    'thycotic_secret': os.path.join(BASE_DIR, '../thycotic-secret/lib/ansible/modules/identity/thycotic/thycotic_secret.py')
+}
+
+# module utilities imported by the modules (Ansible ships them along with a module, the broker loads them from here)
+DEFAULT_MODULE_UTILS = [
+    os.path.join(BASE_DIR, '../module-utils/lib/ansible/module_utils'),
+    os.path.join(BASE_DIR, '../vra-guest/lib/ansible/module_utils'),
+    os.path.join(BASE_DIR, '../thycotic-secret/lib/ansible/module_utils')
+]
+
+# environment variable marking a module run by the broker (so that it does not call the broker again)
+CHILD_ENV = 'ANSIBLE_MODULE_BROKER_CHILD'
+
+# libraries the modules only import on demand, loaded up-front so that children inherit them
+PRELOAD_LIBRARIES = ('asyncio', 'aiohttp')
+
+# state prepared by the modules' prepare_broker() hooks - filled in at start-up so that children inherit it
+PREPARED = {}
+
+# seconds a module has to send its invocation once connected
+REQUEST_TIMEOUT = 10
+
+def log(message):
+    """
+    Write a timestamped message to stderr
+    """
+    sys.stderr.write("%s module_broker[%s]: %s\n" % (time.strftime("%Y-%m-%dT%H:%M:%S"), os.getpid(), message))
+    sys.stderr.flush()
+
+class ModuleBroker(object):
+    '''Unix socket server running module invocations in children forked from a warm process.'''
+
+    def __init__(self, socket_path, modules, idle_timeout, prepare=None):
+        """
+        Default constructor
+        Args:
+            socket_path: path of the unix socket to listen on
+            modules: dict of module name to module file path
+            idle_timeout: seconds without any invocation after which the broker exits (0 to run forever)
+            prepare: dict of module name to list of module arguments to call the module's prepare_broker() hook with
+
+        Returns: (ModuleBroker) Instance of the ModuleBroker class
+        """
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.modules = {}
+        self.children = set()
+        self.last_activity = time.time()
+
+        for library in PRELOAD_LIBRARIES:
+            try:
+                __import__(library)
+            except ImportError:
+                pass
+
+        for name, path in modules.items():
+            try:
+                self.modules[name] = self.preload(name, path)
+                log("serving %s from %s" % (name, path))
+            except Exception as e:
+                log("not serving %s - failed to load %s: %s" % (name, path, e))
+
+        for name, params_list in (prepare or {}).items():
+            hook = self.modules[name][3] if name in self.modules else None
+            for params in params_list:
+                if hook is None:
+                    log("not preparing %s - the module is not served or has no prepare_broker() hook" % (name))
+                    break
+                try:
+                    hook(params)
+                    log("prepared %s" % (name))
+                except Exception as e:
+                    log("failed to prepare %s: %s" % (name, e))
+
+    @staticmethod
+    def preload(name, path):
+        """
+        Compile a module and import everything it depends on - the module is executed with a name other
+        than __main__ so that only its imports and definitions run
+        Args:
+            name: name of the module
+            path: path to the module file
+
+        Returns: (tuple) Module file path, compiled code, digest of the source and the module's prepare_broker()
+                 hook (or None)
+        """
+        with open(path, 'rb') as f:
+            source = f.read()
+        code = compile(source, path, 'exec')
+
+        namespace = {'__name__': "module_broker_preload_%s" % (name), '__file__': path}
+        exec(code, namespace)
+        return path, code, source_digest(source), namespace.get('prepare_broker')
+
+    def serve(self):
+        """
+        Accept invocations until the idle timeout passes (or forever)
+
+        Returns: None
+        """
+        socket_dir = os.path.dirname(self.socket_path)
+        if not os.path.isdir(socket_dir):
+            os.makedirs(socket_dir, 0o700)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        # the socket runs modules with arbitrary arguments - only the owner may connect
+        old_umask = os.umask(0o177)
+        try:
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(128)
+        log("listening on %s" % (self.socket_path))
+
+        try:
+            while True:
+                self.reap()
+                if self.idle_timeout and not self.children and time.time() - self.last_activity > self.idle_timeout:
+                    log("idle for %ss - exiting" % (self.idle_timeout))
+                    break
+
+                try:
+                    readable, _, _ = select.select([listener], [], [], 1)
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                if readable:
+                    conn, _ = listener.accept()
+                    self.last_activity = time.time()
+                    try:
+                        self.fork(listener, conn)
+                    except Exception as e:
+                        log("failed to fork for invocation: %s" % (e))
+                    finally:
+                        conn.close()
+        finally:
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def reap(self):
+        """
+        Collect children that have finished
+
+        Returns: None
+        """
+        for pid in list(self.children):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except OSError:
+                done = pid
+            if done:
+                self.children.discard(pid)
+
+    def fork(self, listener, conn):
+        """
+        Fork a child to handle a connection - everything that may take a while (reading the invocation included)
+        happens in the child, so that a slow client never holds up the others
+        Args:
+            listener: listening socket (closed in the child)
+            conn: connection from the module
+
+        Returns: None
+        """
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+
+        # child - never returns into the broker loop
+        status = 1
+        try:
+            listener.close()
+            request = self.handle(conn)
+            if request is not None:
+                status = self.run(conn, request)
+        except Exception as e:
+            log("failed to handle invocation: %s" % (e))
+        finally:
+            os._exit(status)
+
+    def handle(self, conn):
+        """
+        Read an invocation and tell the client whether it is served here ('ok') or whether it should run the
+        module itself - only invocations from the broker's own user, of a module whose source matches the code
+        the broker loaded, are served
+        Args:
+            conn: connection from the module
+
+        Returns: (dict) Invocation to run, or None if it is not served
+        """
+        if hasattr(socket, 'SO_PEERCRED'):
+            _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+            if uid != os.getuid():
+                log("refusing invocation from user %s" % (uid))
+                return None
+
+        conn.settimeout(REQUEST_TIMEOUT)
+        request = json.loads(conn.makefile('rb').readline().decode('utf-8'))
+        conn.settimeout(None)
+
+        module = self.modules.get(request.get('module'))
+        if module is None or request.get('digest') != module[2]:
+            if module is not None:
+                log("not serving %s - the module differs from the one loaded at start-up" % (request['module']))
+            conn.sendall(b"unsupported\n")
+            return None
+
+        conn.sendall(b"ok\n")
+        return request
+
+    def run(self, conn, request):
+        """
+        Run a module invocation in a forked child with its output going to the client
+        Args:
+            conn: connection from the module
+            request: invocation (module name, raw arguments, serialization profile, cwd and environment)
+
+        Returns: (int) Exit status of the module
+        """
+        from ansible.module_utils import basic
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        random.seed()
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.environ[CHILD_ENV] = "1"
+        os.chdir(request['cwd'])
+
+        basic._ANSIBLE_ARGS = request['args'].encode('utf-8')
+        if request.get('profile'):
+            basic._ANSIBLE_PROFILE = request['profile']
+
+        os.dup2(conn.fileno(), 1)
+        sys.stdout = os.fdopen(1, 'w')
+
+        path, code = self.modules[request['module']][:2]
+        status = 0
+        try:
+            exec(code, {'__name__': '__main__', '__file__': path})
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException as e:
+            sys.stdout.write(json.dumps({'failed': True, 'msg': "Module failed in the broker: %s" % (e),
+                                         'exception': traceback.format_exc()}))
+            status = 1
+        finally:
+            sys.stdout.flush()
+
+        return status
+
+def source_digest(source):
+    """
+    Get the digest a module's source is identified by - the interpreter line is left out, as Ansible may
+    rewrite it (must match source_digest() in module_utils/module_broker_client.py)
+    """
+    if source.startswith(b"#!"):
+        source = source.split(b"\n", 1)[1] if b"\n" in source else b""
+
+    return hashlib.sha256(source).hexdigest()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local broker for the vra_guest and thycotic_secret modules')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Path of the unix socket to listen on')
+    parser.add_argument('--module', action='append', default=[], help='NAME=PATH of a module to serve (repeatable)')
+    parser.add_argument('--idle-timeout', type=int, default=0, help='Seconds without invocations before exiting')
+    parser.add_argument('--module-utils', action='append', default=[], help='Directory of module utilities (repeatable)')
+    parser.add_argument('--prepare', action='append', default=[], help='NAME=FILE of module arguments to prepare for (repeatable)')
+    args = parser.parse_args()
+
+    modules = dict(DEFAULT_MODULES)
+    if args.module:
+        modules = dict(m.split('=', 1) for m in args.module)
+
+    import ansible.module_utils
+    for path in args.module_utils or DEFAULT_MODULE_UTILS:
+        path = os.path.abspath(os.path.expanduser(path))
+        if os.path.isdir(path) and path not in ansible.module_utils.__path__:
+            ansible.module_utils.__path__.append(path)
+
+    prepare = {}
+    for item in args.prepare:
+        name, path = item.split('=', 1)
+        with open(os.path.expanduser(path)) as f:
+            params = json.load(f)
+        prepare.setdefault(name, []).append(params.get('ANSIBLE_MODULE_ARGS', params))
+
+    # modules find the prepared state through this name
+    sys.modules['module_broker'] = sys.modules[__name__]
+
+    broker = ModuleBroker(os.path.expanduser(args.socket), modules, args.idle_timeout, prepare)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    broker.serve()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Purpose: Development launcher for running code straight from a checkout of this repository - with this directory
+# on PYTHONPATH, Python processes (modules run directly, the lookup and inventory plugins in ansible, the helper
+# scripts and the benchmarks) import ansible.module_utils.<name> from the ANSIBLE_MODULE_UTILS directories, as
+# Ansible already does for the modules it ships. Installed copies of the module utilities never need it.
+#
+# Example:
+#    export ANSIBLE_MODULE_UTILS=./lib/ansible/module_utils/:../module-utils/lib/ansible/module_utils/
+#    export PYTHONPATH=../module-utils/hacking/
+
+import os
+import sys
+
+try:
+    import importlib.util
+    HAS_IMPORTLIB_UTIL = True
+except ImportError:
+    HAS_IMPORTLIB_UTIL = False
+
+class ModuleUtilsFinder(object):
+    '''Finds the module utilities of the ANSIBLE_MODULE_UTILS directories - consulted last, so Ansible's own
+    module utilities and those shipped in an AnsiballZ payload still take precedence.'''
+
+    def __init__(self, paths):
+        """
+        Default constructor
+        Args:
+            paths: directories holding module utilities
+
+        Returns: (ModuleUtilsFinder) Instance of the ModuleUtilsFinder class
+        """
+        self.paths = paths
+
+    def find_spec(self, fullname, path=None, target=None):
+        """
+        Find a module utility that the regular import system did not
+        Args:
+            fullname: full name of the module being imported
+            path: search path of the parent package (unused)
+            target: module being reloaded (unused)
+
+        Returns: (ModuleSpec) Spec of the module utility - None for any other module
+        """
+        package, _, name = fullname.rpartition('.')
+        if package != 'ansible.module_utils':
+            return None
+
+        for directory in self.paths:
+            candidate = os.path.join(directory, "%s.py" % (name))
+            if os.path.isfile(candidate):
+                return importlib.util.spec_from_file_location(fullname, candidate)
+
+        return None
+
+MODULE_UTILS_PATHS = [os.path.abspath(os.path.expanduser(path))
+                      for path in os.environ.get('ANSIBLE_MODULE_UTILS', '').split(os.pathsep) if path]
+
+if MODULE_UTILS_PATHS and HAS_IMPORTLIB_UTIL:
+    sys.meta_path.append(ModuleUtilsFinder(MODULE_UTILS_PATHS))
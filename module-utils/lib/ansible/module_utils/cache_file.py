@@ -0,0 +1,99 @@
+# Purpose: Locked JSON documents in a cache directory on the controller, shared between module runs
+# (and the lookup and inventory plugins) - the base of the vra_guest and thycotic_secret caches.
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+
+class CacheFileError(Exception):
+    '''Raised when a cache directory cannot be trusted.'''
+    pass
+
+class CacheFile(object):
+    '''JSON document stored on the controller and shared between module runs (and plugins).'''
+
+    def __init__(self, cache_dir, prefix, *key_parts):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the document in
+            prefix: name prefix for the document (type of data being cached)
+            key_parts: values identifying the document (hostname, username, etc.)
+
+        Returns: (CacheFile) Instance of the CacheFile class
+        """
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+
+        key = hashlib.sha256("|".join([str(k) for k in key_parts]).encode('utf-8')).hexdigest()
+        self.path = os.path.join(cache_dir, "%s-%s.json" % (prefix, key))
+        self.lock_path = "%s.lock" % (self.path)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Hold an exclusive lock on the document so that only one process refreshes it at a time
+
+        Returns: None (context manager)
+        """
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def load(self):
+        """
+        Read the document
+
+        Returns: (dict) Document contents, or None if missing or unreadable
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def store(self, data):
+        """
+        Atomically replace the document
+        Args:
+            data: JSON-serializable document contents
+
+        Returns: None
+        """
+        tmp_path = "%s.%s.tmp" % (self.path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        """
+        Delete the document if it exists
+
+        Returns: None
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def require_private(self, cache_dir):
+        """
+        Make sure no other user can replace the documents in the cache directory - for documents whose contents are
+        trusted once read
+        Args:
+            cache_dir: directory on the controller the document is stored in
+
+        Returns: None (raises CacheFileError if the directory is not private)
+        """
+        info = os.stat(cache_dir)
+        if info.st_uid != os.getuid():
+            raise CacheFileError("%s is not owned by the current user" % (cache_dir))
+        if info.st_mode & 0o022:
+            raise CacheFileError("%s is writable by other users" % (cache_dir))
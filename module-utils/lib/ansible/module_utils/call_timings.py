@@ -0,0 +1,102 @@
+# Purpose: Outbound call instrumentation shared by the modules in this repository - every call
+# a module makes is recorded for its 'timings' result and, when the ANSIBLE_MODULES_TRACE_DIR
+# environment variable is set, traced (along with a cProfile dump) into that directory.
+
+import cProfile
+import json
+import os
+import threading
+import time
+
+class CallTimings(object):
+    '''Records every outbound call (operation name, latency, payload size and retries) for the
+    'timings' module result and, when the ANSIBLE_MODULES_TRACE_DIR environment variable is set, writes
+    a JSON trace file and a cProfile dump for the invocation into that directory.'''
+
+    TRACE_DIR_ENV = 'ANSIBLE_MODULES_TRACE_DIR'
+
+    def __init__(self, module_name):
+        """
+        Default constructor
+        Args:
+            module_name: name used to prefix trace files
+
+        Returns: (CallTimings) Instance of the CallTimings class
+        """
+        self.module_name = module_name
+        self.calls = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.trace_dir = os.environ.get(self.TRACE_DIR_ENV)
+        self.profile = None
+
+    def start_profile(self):
+        """
+        Start profiling the invocation if tracing is enabled
+
+        Returns: None
+        """
+        if self.trace_dir:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def record(self, operation, latency, size=None, retries=0):
+        """
+        Record a single outbound call
+        Args:
+            operation: name of the operation (e.g. get_vm or GetSecret)
+            latency: seconds the call took
+            size: size of the response payload in bytes (if known)
+            retries: number of times the call was retried
+
+        Returns: None
+        """
+        with self.lock:
+            self.calls.append({
+                'operation': operation,
+                'start': round(time.time() - latency - self.started, 6),
+                'latency': round(latency, 6),
+                'size': size,
+                'retries': retries
+            })
+
+    def summary(self):
+        """
+        Aggregate the recorded calls per operation
+
+        Returns: (dict) Operation -> calls, total/max latency, bytes and retries
+        """
+        summary = {}
+        with self.lock:
+            for call in self.calls:
+                entry = summary.setdefault(call['operation'], {'calls': 0, 'total_latency': 0.0, 'max_latency': 0.0, 'bytes': 0, 'retries': 0})
+                entry['calls'] += 1
+                entry['total_latency'] = round(entry['total_latency'] + call['latency'], 6)
+                entry['max_latency'] = max(entry['max_latency'], call['latency'])
+                entry['bytes'] += call['size'] or 0
+                entry['retries'] += call['retries']
+
+        return summary
+
+    def write_trace(self):
+        """
+        Write the trace file and profile dump if tracing is enabled
+
+        Returns: None
+        """
+        if not self.trace_dir:
+            return
+
+        if self.profile is not None:
+            self.profile.disable()
+
+        if not os.path.isdir(self.trace_dir):
+            os.makedirs(self.trace_dir)
+
+        prefix = os.path.join(self.trace_dir, "%s-%s-%s" % (self.module_name, int(self.started), os.getpid()))
+        with open("%s.json" % (prefix), 'w') as f:
+            json.dump({'module': self.module_name, 'duration': time.time() - self.started,
+                       'calls': self.calls, 'summary': self.summary()}, f, indent=2)
+
+        if self.profile is not None:
+            self.profile.dump_stats("%s.prof" % (prefix))
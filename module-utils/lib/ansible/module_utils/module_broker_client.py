@@ -0,0 +1,160 @@
+# Purpose: Client side of the optional module broker (module-broker/module_broker.py) shared by the
+# modules in this repository - a module calls run_via_broker() before importing its heavier
+# libraries, and the invocation is handed to the broker when one is listening (the module runs
+# directly otherwise).
+
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+from ansible.module_utils import basic
+from ansible.module_utils.six import string_types
+
+# default location of the socket of the broker
+BROKER_SOCKET = "~/.ansible/module_broker.sock"
+
+# set by the broker when it runs a module, so that the module does not hand itself back to the broker
+BROKER_CHILD_ENV = 'ANSIBLE_MODULE_BROKER_CHILD'
+
+# environment of the module passed on to the broker's child - what changes how a module behaves for its caller
+# (home directory, locale, proxies, CA bundles and tracing), rather than the entire environment
+FORWARDED_ENV = ('HOME', 'LANG', 'LANGUAGE', 'PATH', 'TMPDIR', 'TZ', 'HTTP_PROXY', 'HTTPS_PROXY', 'NO_PROXY',
+                 'http_proxy', 'https_proxy', 'no_proxy', 'REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE', 'SSL_CERT_FILE',
+                 'SSL_CERT_DIR', 'ANSIBLE_MODULES_TRACE_DIR')
+FORWARDED_ENV_PREFIXES = ('LC_',)
+
+def source_digest(source):
+    """
+    Get the digest a module's source is identified by - the interpreter line is left out, as Ansible may rewrite it
+    Args:
+        source: module source (str or bytes)
+
+    Returns: (str) SHA-256 of the source
+    """
+    if not isinstance(source, bytes):
+        source = source.encode('utf-8')
+    if source.startswith(b"#!"):
+        source = source.split(b"\n", 1)[1] if b"\n" in source else b""
+
+    return hashlib.sha256(source).hexdigest()
+
+def module_source(module_globals):
+    """
+    Get the source of the running module - from the loader Ansible ran it with, or from its file
+    Args:
+        module_globals: globals() of the module
+
+    Returns: (str) Module source, or None if it cannot be read
+    """
+    loader = module_globals.get('__loader__')
+    spec = module_globals.get('__spec__')
+    try:
+        if loader is not None and hasattr(loader, 'get_source'):
+            return loader.get_source(spec.name if spec is not None else module_globals['__name__'])
+        with open(module_globals['__file__'], 'rb') as f:
+            return f.read()
+    except Exception:
+        return None
+
+def owned_socket(path):
+    """
+    Check that a broker socket belongs to the current user - arguments (credentials included) are only ever
+    handed to the user's own broker
+
+    Returns: (bool) True if the path is a socket owned by the current user
+    """
+    try:
+        info = os.stat(path)
+    except OSError:
+        return False
+
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+def peer_uid(conn):
+    """
+    Get the user ID of the process at the other end of a unix socket connection
+
+    Returns: (int) User ID, or None where the platform does not report it
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+
+    _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+def run_via_broker(module_name, module_globals):
+    """
+    Hand the invocation to the local module broker if one is listening on broker_socket, so that the
+    libraries and parsed documents it holds are re-used rather than loaded by a new process - the arguments
+    are passed on exactly as Ansible handed them to the module (as Ansible does when respawning a module)
+    Args:
+        module_name: name the broker serves the module under
+        module_globals: globals() of the module, used to identify the module source the broker must be serving
+
+    Returns: None (exits with the broker's result if the broker ran the module)
+    """
+    # only modules run by Ansible are handed over - not modules run straight from a file
+    args = getattr(basic, '_ANSIBLE_ARGS', None)
+    if os.environ.get(BROKER_CHILD_ENV) or args is None:
+        return
+
+    try:
+        path = json.loads(args.decode('utf-8'))['ANSIBLE_MODULE_ARGS'].get('broker_socket', BROKER_SOCKET)
+    except (AttributeError, KeyError, ValueError):
+        return
+    if not path or not isinstance(path, string_types):
+        return
+    path = os.path.expanduser(path)
+    if not owned_socket(path):
+        return
+
+    source = module_source(module_globals)
+    if source is None:
+        return
+
+    env = dict((k, v) for k, v in os.environ.items() if k in FORWARDED_ENV or k.startswith(FORWARDED_ENV_PREFIXES))
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            conn.connect(path)
+            uid = peer_uid(conn)
+            if uid is not None and uid != os.getuid():
+                return
+
+            request = {
+                'module': module_name,
+                'digest': source_digest(source),
+                'args': args.decode('utf-8'),
+                'profile': getattr(basic, '_ANSIBLE_PROFILE', None),
+                'cwd': os.getcwd(),
+                'env': env
+            }
+            conn.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            reply = conn.makefile('rb')
+            accepted = reply.readline().strip() == b"ok"
+        except socket.error:
+            # stale socket - no broker is running
+            return
+
+        # the module does not run directly once the broker has accepted it, even if the broker fails
+        if not accepted:
+            return
+        try:
+            output = reply.read().decode('utf-8')
+        except socket.error:
+            output = ""
+    finally:
+        conn.close()
+
+    try:
+        failed = json.loads(output).get('failed')
+    except ValueError:
+        output = json.dumps({'failed': True, 'msg': "The module broker did not return a result: %s" % (output[-500:])})
+        failed = True
+
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+#
+# Purpose: Benchmark the thycotic_secret module against the local mock Secret Server in
+# 'mock_thycotic.py' - compares the soap and rest transports by wall time, calls, bytes
+# transferred and peak RSS for a range of concurrent task counts.
+#
+# Requirements:
+#  - The module dependencies (ansible, suds, requests, cryptography) must be installed -
+#    remember to install dependencies prior to running this file
+#      pip install -r requirements.txt
+#
+# Parameters:
+#  - 'tasks': Comma-separated list of secret counts to run (default 1,20,100)
+#  - 'secrets': Number of pre-existing secrets in the mock (at least the largest task count)
+#  - 'latency': Seconds of latency added to every mock response
+#  - 'transports': Comma-separated list of transports to compare (default soap,rest)
+#  - 'modes': Comma-separated list of 'forks' (one module process per secret, as Ansible
+#             forks would run it) and/or 'batch' (one module process using 'secrets')
+#  - 'scenario': 'converge' to ensure pre-existing secrets are unchanged, 'update' to change
+#                their values or 'create' to add new secrets
+#  - 'extra-args': JSON object of additional module arguments (e.g. '{"token_cache": false}')
+#
+# Each scenario starts with an empty cache directory, so the first task of a run pays for
+# logging in (and, for soap, downloading and parsing the WSDL) as a new controller would.
+#
+# Example:
+#    python benchmarks/bench_thycotic_secret.py --tasks 1,50 --latency 0.02 --scenario update
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_thycotic import FIELDS, PASSWORD, TEMPLATE_ID, MockThycoticServer
+
+MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/ansible/modules/identity/thycotic/thycotic_secret.py')
+
+# the modules load the module utilities of the checkout through the development launcher (see module-utils/hacking)
+MODULE_ENV = dict(os.environ,
+                  ANSIBLE_MODULE_UTILS=os.pathsep.join([
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/ansible/module_utils'),
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../module-utils/lib/ansible/module_utils')]),
+                  PYTHONPATH=os.pathsep.join(
+                      [os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../module-utils/hacking')] +
+                      [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]))
+
+def module_args(server, cache_dir, transport, extra_args):
+    """
+    Build the module arguments common to every task
+    """
+    args = {
+        "secret_type_id": TEMPLATE_ID,
+        "secret_content": "",
+        "secret_field_ids": [f[0] for f in FIELDS],
+        "thycotic_transport": transport,
+        "thycotic_wsdl_url": server.wsdl_url,
+        "thycotic_auth_username": "automation-user",
+        "thycotic_auth_password": PASSWORD,
+        "thycotic_auth_domain": "local",
+        "cache_dir": cache_dir,
+        "broker_socket": ""
+    }
+    args.update(extra_args)
+    return args
+
+def secret_entries(count, scenario, run_id):
+    """
+    Build the per-secret settings of a scenario
+    Args:
+        count: number of secrets
+        scenario: 'converge', 'update' or 'create'
+        run_id: unique suffix for changed values and new secret names
+
+    Returns: (list) Dicts of secret_name, folder_id and secret_item_values
+    """
+    entries = []
+    for i in range(count):
+        name = "existing-%05d" % (i) if scenario != 'create' else "new-%s-%05d" % (run_id, i)
+        password = "password-%s" % (i) if scenario == 'converge' else "password-%s-%s" % (i, run_id)
+        entries.append({"secret_name": name, "folder_id": 10 + (i % 3),
+                        "secret_item_values": ["resource-%s" % (i), "user-%s" % (i), password, ""]})
+
+    return entries
+
+def run_tasks(task_args, work_dir):
+    """
+    Run one module process per set of arguments concurrently
+    Args:
+        task_args: list of module argument dicts
+        work_dir: directory to write argument files to
+
+    Returns: (list) Dict per task with 'wall', 'rss_mb' and the module 'result'
+    """
+    processes = {}
+    for i, args in enumerate(task_args):
+        args_file = os.path.join(work_dir, "args-%s.json" % (i))
+        with open(args_file, 'w') as f:
+            json.dump({"ANSIBLE_MODULE_ARGS": args}, f)
+
+        out = tempfile.TemporaryFile()
+        process = subprocess.Popen([sys.executable, MODULE, args_file], stdout=out, stderr=subprocess.STDOUT,
+                                   env=MODULE_ENV)
+        processes[process.pid] = {'process': process, 'out': out, 'start': time.time()}
+
+    tasks = []
+    while processes:
+        pid, status, rusage = os.wait4(-1, 0)
+        if pid not in processes:
+            continue
+
+        task = processes.pop(pid)
+        task['process'].returncode = status
+        task['out'].seek(0)
+        output = task['out'].read().decode('utf-8', 'replace')
+        try:
+            result = json.loads(output)
+        except ValueError:
+            result = {'failed': True, 'msg': output[-500:]}
+
+        # ru_maxrss is reported in KB on linux and bytes on macOS
+        rss = rusage.ru_maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rusage.ru_maxrss / 1024.0
+        tasks.append({'wall': time.time() - task['start'], 'rss_mb': rss, 'result': result})
+
+    return tasks
+
+def run_scenario(server, count, transport, mode, scenario, extra_args, run_id):
+    """
+    Run a single benchmark scenario with a fresh cache directory
+    Args:
+        server: MockThycoticServer instance
+        count: number of secrets to manage
+        transport: 'soap' or 'rest'
+        mode: 'forks' or 'batch'
+        scenario: 'converge', 'update' or 'create'
+        extra_args: additional module arguments
+        run_id: unique identifier of the scenario
+
+    Returns: (dict) Scenario measurements
+    """
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, "cache")
+    entries = secret_entries(count, scenario, run_id)
+
+    try:
+        server.state.reset_stats()
+        start = time.time()
+        args = module_args(server, cache_dir, transport, extra_args)
+        if mode == 'forks':
+            tasks = run_tasks([dict(args, **entry) for entry in entries], work_dir)
+        else:
+            tasks = run_tasks([dict(args, secrets=entries)], work_dir)
+        wall = time.time() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    failures = [t['result'].get('msg') for t in tasks if t['result'].get('failed')]
+    stats = server.state.stats
+    return {
+        'secrets': count,
+        'transport': transport,
+        'mode': mode,
+        'failed': len(failures),
+        'first_failure': failures[0] if failures else None,
+        'wall_s': round(wall, 2),
+        'task_wall_max_s': round(max(t['wall'] for t in tasks), 2),
+        'http_calls': stats['http_calls'],
+        'logins': stats['logins'],
+        'wsdl_downloads': stats['wsdl_downloads'],
+        'bytes_in': stats['bytes_in'],
+        'bytes_out': stats['bytes_out'],
+        'peak_rss_mb_max': round(max(t['rss_mb'] for t in tasks), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark thycotic_secret transports against a local mock Secret Server')
+    parser.add_argument('--tasks', default='1,20,100', help='Comma-separated secret counts')
+    parser.add_argument('--secrets', type=int, default=1000, help='Pre-existing secrets in the mock')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per mock response')
+    parser.add_argument('--transports', default='soap,rest', help='Comma-separated transports (soap, rest)')
+    parser.add_argument('--modes', default='forks,batch', help='Comma-separated modes (forks, batch)')
+    parser.add_argument('--scenario', default='converge', choices=['converge', 'update', 'create'], help='Secret changes to make')
+    parser.add_argument('--extra-args', default='{}', help='JSON object of additional module arguments')
+    parser.add_argument('--json', action='store_true', help='Output JSON Lines rather than a table')
+    args = parser.parse_args()
+
+    extra_args = json.loads(args.extra_args)
+    server = MockThycoticServer(secrets=args.secrets, latency=args.latency).start()
+    columns = ['secrets', 'transport', 'mode', 'failed', 'wall_s', 'task_wall_max_s', 'http_calls', 'logins',
+               'wsdl_downloads', 'bytes_in', 'bytes_out', 'peak_rss_mb_max']
+
+    try:
+        if not args.json:
+            print(" ".join(["%15s" % c for c in columns]))
+
+        for count in [int(t) for t in args.tasks.split(',')]:
+            for mode in args.modes.split(','):
+                for transport in args.transports.split(','):
+                    run_id = "%s%s" % (int(time.time() * 1000), transport)
+                    measurement = run_scenario(server, count, transport, mode, args.scenario, extra_args, run_id)
+                    if args.json:
+                        print(json.dumps(measurement))
+                    else:
+                        print(" ".join(["%15s" % measurement[c] for c in columns]))
+                        if measurement['first_failure']:
+                            print("    first failure: %s" % (measurement['first_failure']))
+                    sys.stdout.flush()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,541 @@
+#!/usr/bin/env python
+#
+# Purpose: Local stand-in for the subset of the Thycotic Secret Server SOAP and REST APIs
+# used by the thycotic_secret module, for benchmarking the two transports without a real
+# Secret Server. Both APIs share the same secrets, tokens and traffic statistics.
+#
+# Endpoints (under /SecretServer):
+#  - GET  /webservices/SSWebService.asmx?wsdl (honours If-None-Match)
+#  - POST /webservices/SSWebService.asmx (Authenticate, GetTokenIsValid, SearchSecretsByFolder,
+#         GetSecret, AddSecret, UpdateSecret, GetSecretTemplates, FolderGetAllChildren)
+#  - POST /oauth2/token
+#  - GET  /api/v1/users/current
+#  - GET  /api/v1/secrets (filter.folderId, filter.searchText, skip, take)
+#  - GET  /api/v1/secrets/stub (filter.secretTemplateId, filter.folderId)
+#  - GET  /api/v1/secrets/<id>
+#  - POST /api/v1/secrets
+#  - PUT  /api/v1/secrets/<id>
+#  - GET  /api/v1/secret-templates (skip, take)
+#  - GET  /api/v1/secret-templates/<id>
+#
+# The real SSWebService WSDL describes a few hundred operations - 'wsdl-operations' pads the
+# mock WSDL with unused operations so that download and parse costs are comparable.
+#
+# Parameters:
+#  - 'port': Port to listen on (HTTP)
+#  - 'secrets': Number of pre-existing secrets ("existing-00000", ... spread over folders 10-12,
+#               where folders 11 and 12 are below folder 10)
+#  - 'latency': Seconds of latency added to every response
+#  - 'token-ttl': Seconds a token is accepted for
+#  - 'wsdl-operations': Number of unused operations added to the WSDL
+#
+# Example:
+#    python benchmarks/mock_thycotic.py --port 8080 --secrets 1000 --latency 0.02
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+APP = "/SecretServer"
+SOAP_PATH = APP + "/webservices/SSWebService.asmx"
+NS = "urn:thesecretserver.com"
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+PASSWORD = "super-secret-pass"
+
+# template of the pre-existing secrets and its field IDs/names
+TEMPLATE_ID = 6001
+FIELDS = [(108, "Resource"), (111, "Username"), (110, "Password"), (109, "Notes")]
+TEMPLATES = {
+    TEMPLATE_ID: ("Password", FIELDS),
+    6002: ("Unix Account (SSH)", [(201, "Machine"), (202, "Username"), (203, "Password"), (204, "Private Key"), (205, "Notes")])
+}
+
+# folder tree: ID -> (name, parent folder ID)
+FOLDERS = {10: ("Applications", -1), 11: ("Databases", 10), 12: ("Service Accounts", 10)}
+
+# SOAP types and operations: name -> list of (element, type, minOccurs, maxOccurs)
+SOAP_TYPES = {
+    'ArrayOfString': [('string', 's:string', 0, 'unbounded')],
+    'ArrayOfInt': [('int', 's:int', 0, 'unbounded')],
+    'AuthenticateResult': [('Errors', 'tns:ArrayOfString'), ('Token', 's:string')],
+    'TokenIsValidResult': [('Errors', 'tns:ArrayOfString'), ('MaxOfflineSeconds', 's:int', 1)],
+    'SecretSummary': [('SecretId', 's:int', 1), ('SecretName', 's:string'), ('SecretTypeName', 's:string'),
+                      ('SecretTypeId', 's:int', 1), ('FolderId', 's:int', 1), ('IsRestricted', 's:boolean', 1)],
+    'ArrayOfSecretSummary': [('SecretSummary', 'tns:SecretSummary', 0, 'unbounded')],
+    'SearchSecretsResult': [('Errors', 'tns:ArrayOfString'), ('SecretSummaries', 'tns:ArrayOfSecretSummary')],
+    'SecretItem': [('Value', 's:string'), ('Id', 's:int'), ('FieldId', 's:int'), ('FieldName', 's:string'),
+                   ('IsFile', 's:boolean', 1), ('IsNotes', 's:boolean', 1), ('IsPassword', 's:boolean', 1),
+                   ('FieldDisplayName', 's:string')],
+    'ArrayOfSecretItem': [('SecretItem', 'tns:SecretItem', 0, 'unbounded')],
+    'Secret': [('Name', 's:string'), ('Items', 'tns:ArrayOfSecretItem'), ('Id', 's:int'), ('SecretTypeId', 's:int'),
+               ('FolderId', 's:int'), ('Active', 's:boolean', 1)],
+    'GetSecretResult': [('Errors', 'tns:ArrayOfString'), ('Secret', 'tns:Secret')],
+    'WebServiceResult': [('Errors', 'tns:ArrayOfString')],
+    'SecretField': [('DisplayName', 's:string'), ('Id', 's:int', 1), ('IsPassword', 's:boolean', 1),
+                    ('IsUrl', 's:boolean', 1), ('IsNotes', 's:boolean', 1), ('IsFile', 's:boolean', 1),
+                    ('FieldSlugName', 's:string')],
+    'ArrayOfSecretField': [('SecretField', 'tns:SecretField', 0, 'unbounded')],
+    'SecretTemplate': [('Fields', 'tns:ArrayOfSecretField'), ('Id', 's:int', 1), ('Name', 's:string')],
+    'ArrayOfSecretTemplate': [('SecretTemplate', 'tns:SecretTemplate', 0, 'unbounded')],
+    'GetSecretTemplatesResult': [('Errors', 'tns:ArrayOfString'), ('SecretTemplates', 'tns:ArrayOfSecretTemplate')],
+    'Folder': [('Id', 's:int', 1), ('Name', 's:string'), ('TypeId', 's:int', 1), ('ParentFolderId', 's:int', 1)],
+    'ArrayOfFolder': [('Folder', 'tns:Folder', 0, 'unbounded')],
+    'GetFoldersResult': [('Errors', 'tns:ArrayOfString'), ('Folders', 'tns:ArrayOfFolder')]
+}
+SOAP_OPERATIONS = {
+    'Authenticate': ([('username', 's:string'), ('password', 's:string'), ('organization', 's:string'), ('domain', 's:string')], 'AuthenticateResult'),
+    'GetTokenIsValid': ([('token', 's:string')], 'TokenIsValidResult'),
+    'SearchSecretsByFolder': ([('token', 's:string'), ('searchTerm', 's:string'), ('folderId', 's:int', 1), ('includeSubFolders', 's:boolean', 1),
+                               ('includeDeleted', 's:boolean', 1), ('includeRestricted', 's:boolean', 1)], 'SearchSecretsResult'),
+    'GetSecret': ([('token', 's:string'), ('secretId', 's:int', 1), ('loadSettingsAndPermissions', 's:boolean')], 'GetSecretResult'),
+    'UpdateSecret': ([('token', 's:string'), ('secret', 'tns:Secret')], 'WebServiceResult'),
+    'AddSecret': ([('token', 's:string'), ('secretTypeId', 's:int', 1), ('secretName', 's:string'), ('secretFieldIds', 'tns:ArrayOfInt'),
+                   ('secretItemValues', 'tns:ArrayOfString'), ('folderId', 's:int', 1)], 'GetSecretResult'),
+    'GetSecretTemplates': ([('token', 's:string')], 'GetSecretTemplatesResult'),
+    'FolderGetAllChildren': ([('token', 's:string'), ('parentFolderId', 's:int', 1)], 'GetFoldersResult')
+}
+
+def schema_sequence(fields):
+    return "<s:sequence>%s</s:sequence>" % ("".join(
+        '<s:element minOccurs="%s" maxOccurs="%s" name="%s" type="%s"/>' % (
+            f[2] if len(f) > 2 else 0, f[3] if len(f) > 3 else 1, f[0], f[1]) for f in fields))
+
+def build_wsdl(location, padding):
+    """
+    Build the WSDL document - padded with unused operations so that it is comparable in size to the real one
+    Args:
+        location: service address
+        padding: number of unused operations to add
+
+    Returns: (str) WSDL document
+    """
+    types = dict(SOAP_TYPES)
+    operations = dict(SOAP_OPERATIONS)
+    for i in range(padding):
+        types['Unused%sResult' % (i)] = [('Errors', 'tns:ArrayOfString'), ('Value', 's:string'),
+                                         ('Items', 'tns:ArrayOfSecretItem'), ('Count', 's:int', 1)]
+        operations['UnusedOperation%s' % (i)] = ([('token', 's:string'), ('id', 's:int', 1), ('name', 's:string')], 'Unused%sResult' % (i))
+
+    schema = "".join(['<s:complexType name="%s">%s</s:complexType>' % (n, schema_sequence(f)) for n, f in types.items()])
+    messages = port_type = binding = ""
+    for name, (args, result) in operations.items():
+        schema += '<s:element name="%s"><s:complexType>%s</s:complexType></s:element>' % (name, schema_sequence(args))
+        schema += '<s:element name="%sResponse"><s:complexType>%s</s:complexType></s:element>' % (
+            name, schema_sequence([('%sResult' % (name), 'tns:%s' % (result))]))
+        messages += ('<wsdl:message name="%sSoapIn"><wsdl:part name="parameters" element="tns:%s"/></wsdl:message>'
+                     '<wsdl:message name="%sSoapOut"><wsdl:part name="parameters" element="tns:%sResponse"/></wsdl:message>') % (name, name, name, name)
+        port_type += ('<wsdl:operation name="%s"><wsdl:input message="tns:%sSoapIn"/>'
+                      '<wsdl:output message="tns:%sSoapOut"/></wsdl:operation>') % (name, name, name)
+        binding += ('<wsdl:operation name="%s"><soap:operation soapAction="%s/%s" style="document"/>'
+                    '<wsdl:input><soap:body use="literal"/></wsdl:input><wsdl:output><soap:body use="literal"/></wsdl:output>'
+                    '</wsdl:operation>') % (name, NS, name)
+
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<wsdl:definitions xmlns:s="http://www.w3.org/2001/XMLSchema" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+            'xmlns:tns="%s" xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" targetNamespace="%s">'
+            '<wsdl:types><s:schema elementFormDefault="qualified" targetNamespace="%s">%s</s:schema></wsdl:types>%s'
+            '<wsdl:portType name="SSWebServiceSoap">%s</wsdl:portType>'
+            '<wsdl:binding name="SSWebServiceSoap" type="tns:SSWebServiceSoap">'
+            '<soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>%s</wsdl:binding>'
+            '<wsdl:service name="SSWebService"><wsdl:port name="SSWebServiceSoap" binding="tns:SSWebServiceSoap">'
+            '<soap:address location="%s"/></wsdl:port></wsdl:service></wsdl:definitions>') % (
+                NS, NS, NS, schema, messages, port_type, binding, location)
+
+class MockThycoticState(object):
+    '''In-memory Secret Server - secrets, tokens and traffic statistics.'''
+
+    def __init__(self, secrets, latency, token_ttl):
+        """
+        Default constructor
+        Args:
+            secrets: number of pre-existing secrets
+            latency: seconds of latency added to every response
+            token_ttl: seconds a token is accepted for
+
+        Returns: (MockThycoticState) Instance of the MockThycoticState class
+        """
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.secrets = {}
+        self.sequence = 1000
+        self.reset_stats()
+
+        for i in range(secrets):
+            self.add_secret(TEMPLATE_ID, "existing-%05d" % (i), 10 + (i % 3), [f[0] for f in FIELDS],
+                            ["resource-%s" % (i), "user-%s" % (i), "password-%s" % (i), ""])
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'http_calls': 0, 'bytes_in': 0, 'bytes_out': 0, 'logins': 0, 'wsdl_downloads': 0, 'operations': {}}
+
+    def record(self, operation, bytes_in, bytes_out):
+        with self.lock:
+            self.stats['http_calls'] += 1
+            self.stats['bytes_in'] += bytes_in
+            self.stats['bytes_out'] += bytes_out
+            self.stats['operations'][operation] = self.stats['operations'].get(operation, 0) + 1
+
+    def add_secret(self, template_id, name, folder_id, field_ids, values):
+        with self.lock:
+            self.sequence += 1
+            secret = {'id': self.sequence, 'name': name, 'folderId': folder_id, 'secretTemplateId': template_id,
+                      'items': [[int(f), v or ""] for f, v in zip(field_ids, values)]}
+            self.secrets[secret['id']] = secret
+            return secret
+
+    def login(self, password):
+        if password != PASSWORD:
+            return None
+
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.stats['logins'] += 1
+            self.tokens[token] = time.time() + self.token_ttl
+        return token
+
+    def token_valid(self, token):
+        return self.tokens.get(token, 0) > time.time()
+
+    def search(self, folder_id, term):
+        term = (term or "").lower()
+        return [s for s in list(self.secrets.values()) if s['folderId'] == folder_id and term in s['name'].lower()]
+
+def rest_secret(secret):
+    """
+    Build the REST secret model of a secret - padded with the kind of settings Secret Server returns so that
+    payload sizes are realistic
+    """
+    names = dict(TEMPLATES[secret['secretTemplateId']][1])
+    return {
+        'id': secret['id'], 'name': secret['name'], 'secretTemplateId': secret['secretTemplateId'],
+        'secretTemplateName': TEMPLATES[secret['secretTemplateId']][0], 'folderId': secret['folderId'], 'siteId': 1,
+        'active': True, 'checkedOut': False, 'checkOutEnabled': False, 'autoChangeEnabled': False,
+        'requiresComment': False, 'isRestricted': False, 'isOutOfSync': False, 'lastHeartBeatStatus': 'Pending',
+        'lastPasswordChangeAttempt': '0001-01-01T00:00:00', 'responseCodes': None, 'enableInheritPermissions': True,
+        'items': [{
+            'itemId': 9000 + i, 'fieldId': field_id, 'fileAttachmentId': None, 'fieldName': names.get(field_id, ''),
+            'slug': names.get(field_id, '').lower().replace(' ', '-'), 'fieldDescription': names.get(field_id, ''),
+            'filename': None, 'itemValue': value, 'isFile': False, 'isNotes': names.get(field_id) == 'Notes',
+            'isPassword': names.get(field_id) == 'Password'
+        } for i, (field_id, value) in enumerate(secret['items'])]
+    }
+
+def field_slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+def soap_element(parent, tag, text=None):
+    element = ET.SubElement(parent, "{%s}%s" % (NS, tag))
+    if text is not None:
+        element.text = str(text).lower() if isinstance(text, bool) else str(text)
+    return element
+
+def soap_secret(parent, secret):
+    names = dict(TEMPLATES[secret['secretTemplateId']][1])
+    element = soap_element(parent, 'Secret')
+    soap_element(element, 'Name', secret['name'])
+    items = soap_element(element, 'Items')
+    for i, (field_id, value) in enumerate(secret['items']):
+        item = soap_element(items, 'SecretItem')
+        soap_element(item, 'Value', value)
+        soap_element(item, 'Id', 9000 + i)
+        soap_element(item, 'FieldId', field_id)
+        soap_element(item, 'FieldName', names.get(field_id, ''))
+        soap_element(item, 'IsFile', False)
+        soap_element(item, 'IsNotes', names.get(field_id) == 'Notes')
+        soap_element(item, 'IsPassword', names.get(field_id) == 'Password')
+        soap_element(item, 'FieldDisplayName', names.get(field_id, ''))
+    soap_element(element, 'Id', secret['id'])
+    soap_element(element, 'SecretTypeId', secret['secretTemplateId'])
+    soap_element(element, 'FolderId', secret['folderId'])
+    soap_element(element, 'Active', True)
+
+class MockThycoticHandler(BaseHTTPRequestHandler):
+    '''Request handler implementing the mock SOAP and REST endpoints.'''
+
+    protocol_version = "HTTP/1.1"
+    state = None
+    wsdl = None
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, operation, code, data, content_type, headers=None):
+        time.sleep(self.state.latency)
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.state.record(operation, self.bytes_in, len(data))
+
+    def send_json(self, operation, code, body):
+        self.send(operation, code, json.dumps(body).encode('utf-8') if body is not None else b"", "application/json")
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.bytes_in = length + len(self.path)
+        return self.rfile.read(length) if length else b""
+
+    def bearer_token(self):
+        match = re.match(r'Bearer (.+)', self.headers.get('Authorization') or '')
+        return match.group(1) if match and self.state.token_valid(match.group(1)) else None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        self.read_body()
+
+        if url.path == SOAP_PATH:
+            etag = '"%s"' % (hashlib.md5(self.wsdl).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                return self.send("wsdl", 304, b"", "text/xml", {'ETag': etag})
+            with self.state.lock:
+                self.state.stats['wsdl_downloads'] += 1
+            return self.send("wsdl", 200, self.wsdl, "text/xml; charset=utf-8", {'ETag': etag})
+
+        if self.bearer_token() is None:
+            return self.send_json("rest_unauthorized", 401, {'message': 'Authentication failed.'})
+
+        if url.path == APP + "/api/v1/users/current":
+            return self.send_json("GET users/current", 200, {'id': 2, 'userName': 'automation-user'})
+
+        if url.path == APP + "/api/v1/secrets":
+            found = self.state.search(int(query.get('filter.folderId', 0)), query.get('filter.searchText'))
+            skip, take = int(query.get('skip', 0)), int(query.get('take', 10))
+            records = [{'id': s['id'], 'name': s['name'], 'secretTemplateId': s['secretTemplateId'],
+                        'secretTemplateName': TEMPLATES[s['secretTemplateId']][0], 'folderId': s['folderId'],
+                        'siteId': 1, 'active': True, 'checkedOut': False, 'isRestricted': False,
+                        'isOutOfSync': False, 'lastHeartBeatStatus': 'Pending', 'lastAccessed': None}
+                       for s in found[skip:skip + take]]
+            return self.send_json("GET secrets", 200, {'records': records, 'skip': skip, 'take': take, 'total': len(found),
+                                                       'hasNext': skip + take < len(found), 'success': True})
+
+        if url.path == APP + "/api/v1/secrets/stub":
+            template_id = int(query.get('filter.secretTemplateId', 0))
+            if template_id not in TEMPLATES:
+                return self.send_json("GET secrets/stub", 400, {'message': 'Secret Template not found.'})
+            stub = {'id': 0, 'name': None, 'secretTemplateId': template_id, 'folderId': int(query.get('filter.folderId', -1)),
+                    'items': [[f[0], ""] for f in TEMPLATES[template_id][1]]}
+            return self.send_json("GET secrets/stub", 200, rest_secret(stub))
+
+        if url.path == APP + "/api/v1/secret-templates":
+            skip, take = int(query.get('skip', 0)), int(query.get('take', 10))
+            templates = sorted(TEMPLATES.items())
+            records = [{'id': template_id, 'name': name, 'active': True}
+                       for template_id, (name, _) in templates[skip:skip + take]]
+            return self.send_json("GET secret-templates", 200, {'records': records, 'skip': skip, 'take': take,
+                                                                'total': len(templates),
+                                                                'hasNext': skip + take < len(templates), 'success': True})
+
+        match = re.match(r'%s/api/v1/secret-templates/(\d+)$' % (APP), url.path)
+        if match:
+            template_id = int(match.group(1))
+            if template_id not in TEMPLATES:
+                return self.send_json("GET secret-templates/<id>", 400, {'message': 'Secret Template not found.'})
+            name, fields = TEMPLATES[template_id]
+            return self.send_json("GET secret-templates/<id>", 200, {
+                'id': template_id, 'name': name, 'active': True,
+                'fields': [{'secretTemplateFieldId': field_id, 'displayName': field_name, 'name': field_name,
+                            'fieldSlugName': field_slug(field_name), 'isPassword': field_name == "Password"}
+                           for field_id, field_name in fields]})
+
+        match = re.match(r'%s/api/v1/secrets/(\d+)$' % (APP), url.path)
+        if match:
+            secret = self.state.secrets.get(int(match.group(1)))
+            if secret is None:
+                return self.send_json("GET secrets/<id>", 403, {'message': 'Access Denied'})
+            return self.send_json("GET secrets/<id>", 200, rest_secret(secret))
+
+        self.send_json("not_found", 404, {'message': 'No HTTP resource was found'})
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        body = self.read_body()
+        if self.bearer_token() is None:
+            return self.send_json("rest_unauthorized", 401, {'message': 'Authentication failed.'})
+
+        match = re.match(r'%s/api/v1/secrets/(\d+)$' % (APP), url.path)
+        secret = self.state.secrets.get(int(match.group(1))) if match else None
+        if secret is None:
+            return self.send_json("PUT secrets/<id>", 404, {'message': 'Secret not found'})
+
+        model = json.loads(body.decode('utf-8'))
+        values = dict((item['fieldId'], item.get('itemValue') or "") for item in model['items'])
+        with self.state.lock:
+            secret['items'] = [[field_id, values.get(field_id, value)] for field_id, value in secret['items']]
+        self.send_json("PUT secrets/<id>", 200, rest_secret(secret))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.read_body()
+
+        if url.path == SOAP_PATH:
+            return self.soap(body)
+
+        if url.path == APP + "/oauth2/token":
+            form = dict((k, v[0]) for k, v in parse_qs(body.decode('utf-8')).items())
+            token = self.state.login(form.get('password'))
+            if token is None:
+                return self.send_json("POST oauth2/token", 400, {'error': 'Login failed.'})
+            return self.send_json("POST oauth2/token", 200, {'access_token': token, 'token_type': 'bearer',
+                                                             'expires_in': self.state.token_ttl})
+
+        if self.bearer_token() is None:
+            return self.send_json("rest_unauthorized", 401, {'message': 'Authentication failed.'})
+
+        if url.path == APP + "/api/v1/secrets":
+            model = json.loads(body.decode('utf-8'))
+            secret = self.state.add_secret(model['secretTemplateId'], model['name'], model['folderId'],
+                                           [item['fieldId'] for item in model['items']],
+                                           [item.get('itemValue') for item in model['items']])
+            return self.send_json("POST secrets", 200, rest_secret(secret))
+
+        self.send_json("not_found", 404, {'message': 'No HTTP resource was found'})
+
+    def soap(self, body):
+        """
+        Handle a SOAP call
+        """
+        request = ET.fromstring(body).find("{%s}Body" % (SOAP_NS))[0]
+        operation = request.tag.split('}')[1]
+        # suds serializes a request object created with client.factory into the first parameter's element
+        if len(request) and len(request[0]):
+            request = request[0]
+        arg = lambda name: request.findtext("{%s}%s" % (NS, name))
+
+        envelope = ET.Element("{%s}Envelope" % (SOAP_NS))
+        response = soap_element(ET.SubElement(envelope, "{%s}Body" % (SOAP_NS)), "%sResponse" % (operation))
+        result = soap_element(response, "%sResult" % (operation))
+        errors = soap_element(result, 'Errors')
+
+        if operation == 'Authenticate':
+            token = self.state.login(arg('password'))
+            if token is None:
+                soap_element(errors, 'string', 'Login failed.')
+            else:
+                soap_element(result, 'Token', token)
+        elif not self.state.token_valid(arg('token')):
+            soap_element(errors, 'string', 'Token is invalid or has expired.')
+        elif operation == 'GetTokenIsValid':
+            soap_element(result, 'MaxOfflineSeconds', 0)
+        elif operation == 'SearchSecretsByFolder':
+            summaries = soap_element(result, 'SecretSummaries')
+            for secret in self.state.search(int(arg('folderId')), arg('searchTerm')):
+                summary = soap_element(summaries, 'SecretSummary')
+                soap_element(summary, 'SecretId', secret['id'])
+                soap_element(summary, 'SecretName', secret['name'])
+                soap_element(summary, 'SecretTypeName', TEMPLATES[secret['secretTemplateId']][0])
+                soap_element(summary, 'SecretTypeId', secret['secretTemplateId'])
+                soap_element(summary, 'FolderId', secret['folderId'])
+                soap_element(summary, 'IsRestricted', False)
+        elif operation == 'GetSecret':
+            secret = self.state.secrets.get(int(arg('secretId')))
+            if secret is None:
+                soap_element(errors, 'string', 'Access Denied')
+            else:
+                soap_secret(result, secret)
+        elif operation == 'UpdateSecret':
+            element = request.find("{%s}secret" % (NS))
+            secret = self.state.secrets.get(int(element.findtext("{%s}Id" % (NS))))
+            values = dict((int(item.findtext("{%s}FieldId" % (NS))), item.findtext("{%s}Value" % (NS)) or "")
+                          for item in element.find("{%s}Items" % (NS)))
+            with self.state.lock:
+                secret['items'] = [[field_id, values.get(field_id, value)] for field_id, value in secret['items']]
+        elif operation == 'AddSecret':
+            secret = self.state.add_secret(int(arg('secretTypeId')), arg('secretName'), int(arg('folderId')),
+                                           [e.text for e in request.find("{%s}secretFieldIds" % (NS))],
+                                           [e.text for e in request.find("{%s}secretItemValues" % (NS))])
+            soap_secret(result, secret)
+        elif operation == 'GetSecretTemplates':
+            templates = soap_element(result, 'SecretTemplates')
+            for template_id, (name, fields) in sorted(TEMPLATES.items()):
+                template = soap_element(templates, 'SecretTemplate')
+                template_fields = soap_element(template, 'Fields')
+                for field_id, field_name in fields:
+                    field = soap_element(template_fields, 'SecretField')
+                    soap_element(field, 'DisplayName', field_name)
+                    soap_element(field, 'Id', field_id)
+                    for flag in ('IsPassword', 'IsUrl', 'IsNotes', 'IsFile'):
+                        soap_element(field, flag, flag == 'IsPassword' and field_name == "Password")
+                    soap_element(field, 'FieldSlugName', field_slug(field_name))
+                soap_element(template, 'Id', template_id)
+                soap_element(template, 'Name', name)
+        elif operation == 'FolderGetAllChildren':
+            folders = soap_element(result, 'Folders')
+            for folder_id, (name, parent_id) in sorted(FOLDERS.items()):
+                if parent_id == int(arg('parentFolderId')):
+                    folder = soap_element(folders, 'Folder')
+                    soap_element(folder, 'Id', folder_id)
+                    soap_element(folder, 'Name', name)
+                    soap_element(folder, 'TypeId', 1)
+                    soap_element(folder, 'ParentFolderId', parent_id)
+        else:
+            soap_element(errors, 'string', 'Unsupported operation %s' % (operation))
+
+        self.send("soap %s" % (operation), 200, ET.tostring(envelope), "text/xml; charset=utf-8")
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+class MockThycoticServer(object):
+    '''HTTP server wrapper.'''
+
+    def __init__(self, port=0, secrets=100, latency=0.0, token_ttl=1200, wsdl_operations=250):
+        self.state = MockThycoticState(secrets, latency, token_ttl)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MockThycoticHandler)
+        wsdl = build_wsdl("http://%s%s" % (self.address, SOAP_PATH), wsdl_operations).encode('utf-8')
+        self.server.RequestHandlerClass = type('Handler', (MockThycoticHandler,), {'state': self.state, 'wsdl': wsdl})
+        self.thread = None
+
+    @property
+    def address(self):
+        return "127.0.0.1:%s" % (self.server.server_address[1])
+
+    @property
+    def wsdl_url(self):
+        return "http://%s%s?wsdl" % (self.address, SOAP_PATH)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local mock Thycotic Secret Server')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--secrets', type=int, default=100, help='Number of pre-existing secrets')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per response')
+    parser.add_argument('--token-ttl', type=int, default=1200, help='Seconds a token is accepted for')
+    parser.add_argument('--wsdl-operations', type=int, default=250, help='Unused operations added to the WSDL')
+    args = parser.parse_args()
+
+    server = MockThycoticServer(args.port, args.secrets, args.latency, args.token_ttl, args.wsdl_operations)
+    print("Mock Secret Server listening - WSDL at %s" % (server.wsdl_url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
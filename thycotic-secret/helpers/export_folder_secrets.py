@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+#
+# Purpose: Helper script to export (audit) every secret within a tree of folders. Folders
+# are walked one at a time and the details of their secrets are fetched by a bounded pool
+# of concurrent workers, each result being written as a line of JSON as soon as it arrives
+# (so memory use does not grow with the number of secrets).
+#
+# Requirements:
+#  - This script depends on the file ../test_args/thycotic_secret.json (or the file given
+#    as 'config') to exist and have valid URL endpoints and credentials for Thycotic
+#  - Remember to install dependencies prior to running this file
+#      pip install -r requirements
+#  - The shared module utilities must be importable - run from a checkout with the development
+#    launcher (see ../module-utils/README.md):
+#      ANSIBLE_MODULE_UTILS=./lib/ansible/module_utils/ PYTHONPATH=../module-utils/hacking/ python helpers/...
+#
+# Parameters:
+#  - 'folder-id': ID of a folder to export - may be repeated
+#  - 'recursive': Also export every folder below the given folders
+#  - 'concurrency': Maximum number of secrets fetched at the same time (default 8)
+#  - 'output': File to write the JSON Lines to (default stdout) - appended to when resuming
+#  - 'checkpoint': File recording the progress of the export - when it exists, the export
+#                  resumes where it stopped, skipping the folders and secrets already written
+#  - 'redact': Values to replace with "<redacted>" - 'none' (default), 'passwords' (password
+#              and file fields) or 'all' (blank values are kept as-is in every case)
+#  - 'config': Module arguments file with the URL and credentials to use
+#
+# Returns:
+#  - One JSON object per secret (folder_id, secret_id, name, secret_type_id and fields), or
+#    per secret/folder that could not be read (with an 'error' message), written to 'output'
+#  - A summary on stderr - the exit status is 1 when anything could not be read
+#
+# A secret may be written twice when the script is stopped between writing the secret and
+# recording it in the checkpoint - the secret_id identifies duplicates.
+#
+# Example:
+#    python helpers/export_folder_secrets.py --folder-id 123 --recursive --concurrency 16 \
+#        --redact passwords --output audit.jsonl --checkpoint audit.checkpoint
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import suds.client
+from ansible.module_utils.thycotic_soap import soap_errors, token_rejected
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+REDACTED = "<redacted>"
+
+class ExportError(Exception):
+    '''Error reported by Secret Server.'''
+
+class ThycoticExporter(object):
+    '''Authenticated Secret Server client shared by the workers - the token is replaced (once, for every
+    thread) when Secret Server stops accepting it.'''
+
+    def __init__(self, config):
+        """
+        Default constructor
+        Args:
+            config: module arguments with the WSDL URL and credentials
+
+        Returns: (ThycoticExporter) Instance of the ThycoticExporter class
+        """
+        self.config = config
+        self.client = suds.client.Client(config["thycotic_wsdl_url"])
+        self.lock = threading.Lock()
+        self.token = None
+        self.authenticate(None)
+
+    def authenticate(self, rejected_token):
+        """
+        Obtain a new auth token, unless another thread already replaced the rejected one
+        Args:
+            rejected_token: token Secret Server no longer accepts (None for the first login)
+
+        Returns: None
+        """
+        with self.lock:
+            if self.token != rejected_token:
+                return
+
+            auth_token = self.client.service.Authenticate(self.config["thycotic_auth_username"],
+                                                          self.config["thycotic_auth_password"],
+                                                          "",
+                                                          self.config["thycotic_auth_domain"])
+            if not auth_token.Token:
+                raise ExportError("An authentication exception has occurred: {}".format(soap_errors(auth_token)))
+            self.token = auth_token.Token
+
+    def call(self, operation, **params):
+        """
+        Call a SOAP operation taking a token, re-authenticating and retrying once if the token was rejected
+        Args:
+            operation: name of the operation
+            params: parameters of the operation (other than the token)
+
+        Returns: Result of the operation
+        """
+        for attempt in range(2):
+            token = self.token
+            request = self.client.factory.create(operation)
+            request.token = token
+            for name, value in params.items():
+                setattr(request, name, value)
+
+            result = getattr(self.client.service, operation)(request)
+            messages = soap_errors(result)
+            if not messages:
+                return result
+            if attempt == 0 and token_rejected(messages):
+                self.authenticate(token)
+                continue
+
+            raise ExportError("; ".join(messages))
+
+    def child_folders(self, folder_id):
+        """
+        List the IDs of the folders directly below a folder
+        """
+        result = self.call("FolderGetAllChildren", parentFolderId=folder_id)
+        folders = (getattr(result.Folders, 'Folder', None) or []) if result.Folders else []
+        return [folder.Id for folder in folders]
+
+    def secret_ids(self, folder_id):
+        """
+        List the IDs of the secrets directly within a folder
+        """
+        result = self.call("SearchSecretsByFolder", searchTerm="", folderId=folder_id, includeSubFolders=False,
+                           includeDeleted=False, includeRestricted=False)
+        summaries = (getattr(result.SecretSummaries, 'SecretSummary', None) or []) if result.SecretSummaries else []
+        return [summary.SecretId for summary in summaries]
+
+    def secret(self, folder_id, secret_id, redact):
+        """
+        Read a secret and convert it to its exported form
+        Args:
+            folder_id: ID of the folder the secret was listed in
+            secret_id: ID of the secret
+            redact: values to redact (none, passwords or all)
+
+        Returns: (dict) Exported secret
+        """
+        secret = self.call("GetSecret", secretId=secret_id, loadSettingsAndPermissions=False).Secret
+        fields = {}
+        items = (getattr(secret.Items, 'SecretItem', None) or []) if secret.Items else []
+        for item in items:
+            value = item.Value or ""
+            if value and (redact == 'all' or (redact == 'passwords' and (item.IsPassword or item.IsFile))):
+                value = REDACTED
+            fields[item.FieldName] = value
+
+        return {'folder_id': folder_id, 'secret_id': secret_id, 'name': secret.Name,
+                'secret_type_id': secret.SecretTypeId, 'fields': fields}
+
+class Checkpoint(object):
+    '''Progress of an export, kept as an append-only JSON Lines journal: the export settings, then a line per
+    secret written and per folder completed. Lines are only added after the matching output is flushed.'''
+
+    def __init__(self, path, settings):
+        """
+        Default constructor - loads the progress of an earlier run of the export if the file exists
+        Args:
+            path: path of the checkpoint file (None to not record progress)
+            settings: settings of the export, which must match those of a resumed run
+
+        Returns: (Checkpoint) Instance of the Checkpoint class
+        """
+        self.folders = set()
+        self.secrets = {}
+        self.resumed = False
+        self.journal = None
+        if path is None:
+            return
+
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = [json.loads(line) for line in f if line.endswith("\n")]
+            if lines and lines[0].get('settings') != settings:
+                raise ExportError("Checkpoint {} belongs to an export of {} - not resuming".format(path, lines[0].get('settings')))
+            for line in lines[1:]:
+                if line.get('done'):
+                    self.folders.add(line['folder_id'])
+                    self.secrets.pop(line['folder_id'], None)
+                else:
+                    self.secrets.setdefault(line['folder_id'], set()).add(line['secret_id'])
+            self.resumed = bool(lines)
+
+        self.journal = open(path, 'a')
+        if not self.resumed:
+            self.write({'settings': settings})
+
+    def write(self, line):
+        if self.journal is not None:
+            self.journal.write(json.dumps(line) + "\n")
+            self.journal.flush()
+
+    def secret_done(self, folder_id, secret_id):
+        self.write({'folder_id': folder_id, 'secret_id': secret_id})
+
+    def folder_done(self, folder_id):
+        self.write({'folder_id': folder_id, 'done': True})
+        self.secrets.pop(folder_id, None)
+
+def walk(exporter, checkpoint, folder_ids, recursive, tasks, results, workers):
+    """
+    Walk the folders, queueing the secrets still to be exported - runs in its own thread, blocking while
+    the (bounded) task queue is full
+    Args:
+        exporter: ThycoticExporter instance
+        checkpoint: Checkpoint of the export
+        folder_ids: IDs of the folders to start from
+        recursive: whether to walk the folders below them
+        tasks: queue of (folder ID, secret ID) for the workers
+        results: queue of messages for the writer
+        workers: number of workers (each is sent a None task when the walk is over)
+
+    Returns: None
+    """
+    try:
+        visited = set()
+        stack = list(reversed(folder_ids))
+        while stack:
+            folder_id = stack.pop()
+            if folder_id in visited:
+                continue
+            visited.add(folder_id)
+
+            try:
+                if recursive:
+                    stack.extend(reversed(exporter.child_folders(folder_id)))
+                if folder_id in checkpoint.folders:
+                    continue
+
+                done = checkpoint.secrets.get(folder_id, set())
+                secret_ids = [secret_id for secret_id in exporter.secret_ids(folder_id) if secret_id not in done]
+            except Exception as e:
+                results.put(('error', {'folder_id': folder_id, 'error': "Failed to list folder - %s" % (e)}))
+                continue
+
+            # announced before any of its secrets are queued, so the writer knows when the folder is complete
+            results.put(('folder', folder_id, len(secret_ids)))
+            for secret_id in secret_ids:
+                tasks.put((folder_id, secret_id))
+    finally:
+        for _ in range(workers):
+            tasks.put(None)
+
+def work(exporter, redact, tasks, results):
+    """
+    Fetch queued secrets until the walk is over - runs in a worker thread
+    """
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+
+            folder_id, secret_id = task
+            try:
+                results.put(('secret', folder_id, exporter.secret(folder_id, secret_id, redact)))
+            except Exception as e:
+                results.put(('secret', folder_id, {'folder_id': folder_id, 'secret_id': secret_id,
+                                                   'error': "Failed to read secret - %s" % (e)}))
+    finally:
+        results.put(('stopped',))
+
+def export(exporter, checkpoint, args, output):
+    """
+    Export the secrets, writing each one as it arrives
+    Args:
+        exporter: ThycoticExporter instance
+        checkpoint: Checkpoint of the export
+        args: parsed command line arguments
+        output: file to write the JSON Lines to
+
+    Returns: (dict) Counts of the secrets exported, secrets and folders that failed and folders completed
+    """
+    tasks = Queue(maxsize=args.concurrency * 2)
+    results = Queue()
+    threads = [threading.Thread(target=walk, args=(exporter, checkpoint, args.folder_id, args.recursive, tasks,
+                                                   results, args.concurrency))]
+    threads += [threading.Thread(target=work, args=(exporter, args.redact, tasks, results))
+                for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    counts = {'secrets': 0, 'failed_secrets': 0, 'failed_folders': 0, 'folders': 0}
+    remaining = {}
+    incomplete = set()
+    stopped = 0
+    while stopped < args.concurrency:
+        message = results.get()
+        if message[0] == 'stopped':
+            stopped += 1
+            continue
+
+        if message[0] == 'error':
+            output.write(json.dumps(message[1]) + "\n")
+            output.flush()
+            counts['failed_folders'] += 1
+            continue
+
+        folder_id = message[1]
+        if message[0] == 'folder':
+            remaining[folder_id] = message[2]
+        else:
+            record = message[2]
+            output.write(json.dumps(record, sort_keys=True) + "\n")
+            output.flush()
+            if 'error' in record:
+                # the folder is left incomplete so that failed secrets are retried when the export is resumed
+                counts['failed_secrets'] += 1
+                incomplete.add(folder_id)
+            else:
+                counts['secrets'] += 1
+                checkpoint.secret_done(folder_id, record['secret_id'])
+            remaining[folder_id] -= 1
+
+        if remaining[folder_id] == 0:
+            del remaining[folder_id]
+            counts['folders'] += 1
+            if folder_id not in incomplete:
+                checkpoint.folder_done(folder_id)
+
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the secrets of a tree of folders as JSON Lines')
+    parser.add_argument('--folder-id', type=int, action='append', required=True, help='ID of a folder to export (repeatable)')
+    parser.add_argument('--recursive', action='store_true', help='Also export the folders below the given folders')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum number of secrets fetched at the same time')
+    parser.add_argument('--output', default='-', help='File to write the JSON Lines to (default stdout)')
+    parser.add_argument('--checkpoint', help='File recording progress, resumed from when it exists')
+    parser.add_argument('--redact', default='none', choices=['none', 'passwords', 'all'], help='Values to redact')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(__file__), '../test_args/thycotic_secret.json'),
+                        help='Module arguments file with the URL and credentials to use')
+    args = parser.parse_args()
+    args.concurrency = max(1, args.concurrency)
+
+    # load configuration - required to obtain URL, username, password
+    # to log into the Thycotic instance
+    with open(args.config) as f:
+        config = json.load(f)['ANSIBLE_MODULE_ARGS']
+
+    start = time.time()
+    try:
+        settings = {'folder_ids': args.folder_id, 'recursive': args.recursive, 'redact': args.redact}
+        checkpoint = Checkpoint(args.checkpoint, settings)
+        exporter = ThycoticExporter(config)
+    except ExportError as e:
+        sys.exit(str(e))
+
+    if args.output == '-':
+        output = sys.stdout
+    else:
+        output = open(args.output, 'a' if checkpoint.resumed else 'w')
+
+    try:
+        counts = export(exporter, checkpoint, args, output)
+    except KeyboardInterrupt:
+        sys.exit("Interrupted - run again with the same --checkpoint to resume")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    sys.stderr.write("Exported {} secrets from {} folders in {:.1f}s ({} secrets and {} folders could not be read)\n".format(
+        counts['secrets'], counts['folders'], time.time() - start, counts['failed_secrets'], counts['failed_folders']))
+    if counts['failed_secrets'] or counts['failed_folders']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
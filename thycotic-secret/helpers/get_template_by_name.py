@@ -85,3 +85,4 @@ print(yaml.dump(template_yml, default_flow_style=False))
 print("-----------------------------------------------------")
 print("Take the above and place them into your Ansible configuration - note you MUST include ALL")
 print("fields (include blank strings if you don't wish to specify the values) in the particular order.")
+print("Alternatively, give 'secret_template_name' and a 'secret_fields' dictionary of field name to value.")
@@ -0,0 +1,291 @@
+# Purpose: Controller-side state shared between runs of the thycotic_secret module and the thycotic_secret
+# lookup plugin - locked JSON documents in the cache directory, optionally with encrypted fields, the keyring
+# their keys come from and the Secret Server token cache built on them.
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from ansible.module_utils.cache_file import CacheFile
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+class ThycoticCacheFile(CacheFile):
+    '''JSON document stored on the controller and shared between module runs (and the lookup plugin),
+    identified by the WSDL URL, username, domain, etc.'''
+    pass
+
+class ThycoticKeyring(ThycoticCacheFile):
+    '''Master key of a secret only the caller knows (the account password by default), derived with PBKDF2 and a
+    random salt kept in the cache directory once per process - each use of the secret (token encryption, WSDL
+    signature, ledger hashes) gets its own key from it with HMAC, a label and the salt of the document protected.'''
+
+    # iterations of the key derivation for the master key
+    KDF_ITERATIONS = 100000
+
+    # keyrings by cache directory and secret, kept for the life of the process
+    keyrings = {}
+    keyrings_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, cache_dir, secret):
+        """
+        Get the keyring of a secret, shared by every cache of the process using the same directory and secret
+        Args:
+            cache_dir: directory on the controller holding the master key salt
+            secret: secret the master key is derived from
+
+        Returns: (ThycoticKeyring) Shared instance of the ThycoticKeyring class
+        """
+        ident = (os.path.abspath(cache_dir), hashlib.sha256(secret.encode('utf-8')).hexdigest())
+        with cls.keyrings_lock:
+            if ident not in cls.keyrings:
+                cls.keyrings[ident] = cls(cache_dir, secret)
+
+            return cls.keyrings[ident]
+
+    def __init__(self, cache_dir, secret):
+        """
+        Default constructor - use get() to share the master key
+        Args:
+            cache_dir: directory on the controller holding the master key salt
+            secret: secret the master key is derived from
+
+        Returns: (ThycoticKeyring) Instance of the ThycoticKeyring class
+        """
+        super(ThycoticKeyring, self).__init__(cache_dir, "keyring")
+        self.secret = secret.encode('utf-8')
+        self.master = None
+        self.master_lock = threading.Lock()
+
+    def master_key(self):
+        """
+        Get the master key, derived on first use (creating the salt if this is the first run using the directory)
+
+        Returns: (bytes) Master key
+        """
+        with self.master_lock:
+            if self.master is None:
+                with self.lock():
+                    document = self.load() or {}
+                    if not document.get('salt'):
+                        document = {'salt': base64.b64encode(os.urandom(16)).decode('ascii')}
+                        self.store(document)
+
+                self.master = hashlib.pbkdf2_hmac('sha256', self.secret, base64.b64decode(document['salt']), self.KDF_ITERATIONS)
+
+            return self.master
+
+    def derive(self, label, salt):
+        """
+        Get the key for one use of the secret
+        Args:
+            label: name of the use (e.g. the prefix of the document protected)
+            salt: random salt of the document protected
+
+        Returns: (bytes) 32-byte key
+        """
+        return hmac.new(self.master_key(), label.encode('utf-8') + b":" + salt, hashlib.sha256).digest()
+
+class ThycoticEncryptedCacheFile(ThycoticCacheFile):
+    '''JSON document with fields encrypted with a key from the keyring of a secret only the caller knows (the
+    account password by default) - each encryption uses a new random salt, stored alongside the encrypted fields.'''
+
+    def __init__(self, cache_dir, secret, prefix, *key_parts):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the document in
+            secret: secret the encryption key is derived from
+            prefix: name prefix for the document (type of data being cached)
+            key_parts: values identifying the document (WSDL URL, username, domain, etc.)
+
+        Returns: (ThycoticEncryptedCacheFile) Instance of the ThycoticEncryptedCacheFile class
+        """
+        super(ThycoticEncryptedCacheFile, self).__init__(cache_dir, prefix, *key_parts)
+        self.keyring = ThycoticKeyring.get(cache_dir, secret)
+        self.prefix = prefix
+        self.ciphers = {}
+
+    def cipher(self, salt):
+        """
+        Get the cipher for a document salt
+        Args:
+            salt: random salt stored alongside the encrypted fields
+
+        Returns: (Fernet) Cipher keyed with the secret and salt
+        """
+        if salt not in self.ciphers:
+            self.ciphers[salt] = Fernet(base64.urlsafe_b64encode(self.keyring.derive(self.prefix, salt)))
+
+        return self.ciphers[salt]
+
+    def decrypt(self, document, field):
+        """
+        Decrypt a field of the document
+        Args:
+            document: document contents
+            field: name of the encrypted field
+
+        Returns: (str) Decrypted value, or None if missing or not decryptable (e.g. encrypted with another secret)
+        """
+        if not document or not document.get(field):
+            return None
+
+        try:
+            salt = base64.b64decode(document['salt'])
+            return self.cipher(salt).decrypt(document[field].encode('utf-8')).decode('utf-8')
+        except (InvalidToken, KeyError, TypeError, ValueError):
+            return None
+
+    def encrypt(self, document, field, value):
+        """
+        Encrypt a value into a field of the document with a new salt
+        Args:
+            document: document contents (updated in place)
+            field: name of the encrypted field
+            value: value to encrypt
+
+        Returns: None
+        """
+        salt = os.urandom(16)
+        document['salt'] = base64.b64encode(salt).decode('ascii')
+        document[field] = self.cipher(salt).encrypt(value.encode('utf-8')).decode('ascii')
+
+class ThycoticTokenCache(ThycoticEncryptedCacheFile):
+    '''Controller-side cache of Secret Server tokens shared between module runs (and the lookup plugin). Tokens are encrypted with a
+    key derived from a secret only the caller knows (the account password by default), and the cache learns
+    how long the server keeps tokens alive: tokens younger than the learned lifetime are used as-is, older
+    ones are checked with the (cheap, un-audited) GetTokenIsValid call and tokens older than the youngest
+    one the server has rejected are replaced without asking.'''
+
+    # seconds a new token is used without validation before the server has been observed keeping one alive longer
+    INITIAL_TRUSTED_AGE = 60
+
+    # seconds under the age of a rejected token that tokens stop being trusted
+    EXPIRY_SKEW = 30
+
+    def __init__(self, cache_dir, secret, service_url, username, domain):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store tokens in
+            secret: secret the encryption key is derived from
+            service_url: URL of the service the token is issued by (the WSDL URL, or the REST API token URL)
+            username: user the token is issued for
+            domain: domain of the user
+
+        Returns: (ThycoticTokenCache) Instance of the ThycoticTokenCache class
+        """
+        super(ThycoticTokenCache, self).__init__(cache_dir, secret, "token", service_url, username, domain)
+
+    def load_token(self):
+        """
+        Read and decrypt the cached token - callers should hold the lock
+
+        Returns: (tuple) Document, and decrypted token (None if missing, expired or not decryptable)
+        """
+        # a token encrypted with another secret (e.g. the password changed) or corrupted reads as None
+        document = self.load() or {}
+        return document, self.decrypt(document, 'token')
+
+    def read(self):
+        """
+        Get the cached token if one may still be alive - callers should hold the lock
+
+        Returns: (tuple) Token (None if no usable token is cached), and whether it must be validated before use
+        """
+        document, token = self.load_token()
+        if token is None:
+            return None, False
+
+        age = time.time() - document['issued']
+        expired_age = document.get('expired_age')
+        if expired_age is not None and age >= expired_age:
+            return None, False
+
+        return token, age >= document.get('trusted_age', self.INITIAL_TRUSTED_AGE)
+
+    def write(self, token):
+        """
+        Encrypt and store a newly-issued token, keeping what has been learned about token lifetimes - callers
+        should hold the lock
+        Args:
+            token: token returned by Authenticate
+
+        Returns: None
+        """
+        document = self.load() or {}
+        self.encrypt(document, 'token', token)
+        document['issued'] = time.time()
+        self.store(document)
+
+    def confirm(self):
+        """
+        Record that the server still accepts the cached token at its current age - callers should hold the lock
+
+        Returns: None
+        """
+        document = self.load()
+        if not document or not document.get('issued'):
+            return
+
+        age = time.time() - document['issued']
+        if age > document.get('trusted_age', self.INITIAL_TRUSTED_AGE):
+            document['trusted_age'] = age
+            self.store(document)
+
+    def invalidate(self, token):
+        """
+        Drop the cached token after the server rejected it, learning its lifetime - only if it is still the
+        one that was rejected (another process may already have replaced it) - callers should hold the lock
+        Args:
+            token: token that Secret Server rejected
+
+        Returns: None
+        """
+        document, cached = self.load_token()
+        if cached is None or cached != token:
+            return
+
+        age = time.time() - document['issued']
+        document['expired_age'] = min(age, document.get('expired_age') or age)
+        document['trusted_age'] = max(0, min(document.get('trusted_age', self.INITIAL_TRUSTED_AGE),
+                                             document['expired_age'] - self.EXPIRY_SKEW))
+        document['token'] = None
+        self.store(document)
+
+    def get_token(self, authenticate, token_is_valid, stale_token=None):
+        """
+        Get a token - the cached one, validated with Secret Server once it is older than the trusted age, or a new
+        one from authenticate which is then shared - holding the lock so only one process logs in at a time
+        Args:
+            authenticate: function logging in and returning a new token
+            token_is_valid: function returning whether Secret Server still accepts a token
+            stale_token: token that Secret Server rejected and which must not be re-used
+
+        Returns: (str) Token
+        """
+        with self.lock():
+            if stale_token is not None:
+                self.invalidate(stale_token)
+
+            token, validate = self.read()
+            if token is not None and validate:
+                if token_is_valid(token):
+                    self.confirm()
+                else:
+                    self.invalidate(token)
+                    token = None
+
+            if token is None:
+                token = authenticate()
+                self.write(token)
+
+            return token
@@ -0,0 +1,31 @@
+# Purpose: Handling of Secret Server SOAP API results shared by the thycotic_secret module, the thycotic_secret
+# lookup plugin and the helper scripts.
+
+import re
+
+# errors reported by the SOAP API when a token has expired or is otherwise not accepted
+TOKEN_REJECTED = re.compile(r'(token|session).*(invalid|expired)|(invalid|expired).*(token|session)', re.IGNORECASE)
+
+def soap_errors(result):
+    """
+    Get the errors reported in a Secret Server result
+    Args:
+        result: result of a SOAP operation
+
+    Returns: (list) Error messages - empty if the operation succeeded
+    """
+    errors = getattr(result, 'Errors', None)
+    if not errors:
+        return []
+
+    return [str(error) for error in getattr(errors, 'string', None) or []]
+
+def token_rejected(errors):
+    """
+    Check whether the errors of a result mean Secret Server did not accept the token of the call
+    Args:
+        errors: error messages returned by soap_errors
+
+    Returns: (bool) True if the call should be retried with a new token
+    """
+    return any(TOKEN_REJECTED.search(error) for error in errors)
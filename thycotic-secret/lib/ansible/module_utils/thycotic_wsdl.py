@@ -0,0 +1,325 @@
+# Purpose: Controller-side cache of the Thycotic WSDL and its parsed suds definitions, shared between runs of
+# the thycotic_secret module (and its module broker) and the thycotic_secret lookup plugin.
+
+import base64
+import gc
+import glob
+import hashlib
+import hmac
+import io
+import os
+import pickle
+import sys
+import time
+import suds
+import suds.cache
+import suds.client
+import suds.options
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+from ansible.module_utils.six.moves.urllib.request import pathname2url
+from ansible.module_utils.thycotic_cache import ThycoticCacheFile, ThycoticKeyring
+from ansible.module_utils.urls import open_url
+
+# monotonic clock for measuring latency (not available on python 2)
+monotonic = getattr(time, 'monotonic', time.time)
+
+class SudsDefinitionsCache(suds.cache.Cache):
+    '''suds object cache holding the parsed definitions of a single WSDL, and the suds options the schemas
+    within them refer to.'''
+
+    def __init__(self, definitions=None, options=None):
+        self.definitions = definitions
+        self.options = options
+
+    def get(self, id):
+        return self.definitions
+
+    def put(self, id, object):
+        self.definitions = object
+        return object
+
+    def purge(self, id):
+        self.definitions = None
+
+    def clear(self):
+        self.definitions = None
+
+    def bind(self, client):
+        """
+        Point the suds options the definitions refer to at the options of the client using them - suds itself
+        only re-binds the top-level definitions when they come from a cache
+        Args:
+            client: suds client created with this cache
+
+        Returns: None
+        """
+        if self.options is not None and self.options is not client.options:
+            self.options.__pts__ = client.options.__pts__
+
+class ThycoticWSDLCache(ThycoticCacheFile):
+    '''Controller-side copy of the Thycotic WSDL and its parsed definitions, versioned by the WSDL content so that
+    a changed WSDL is never served from an older parse. The parsed definitions are stored as a pickle signed
+    with a key from the keyring of a secret only the caller knows, and are only unpickled once the signature
+    checks out - and the cache directory must be private to the current user.'''
+
+    def __init__(self, cache_dir, ttl, wsdl_url, secret, timings=None):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the WSDL in
+            ttl: number of seconds the copy is trusted before checking whether the WSDL changed
+            wsdl_url: URL (or local path) of the WSDL
+            secret: secret the signing key of the parsed definitions is derived from
+            timings: CallTimings to record WSDL downloads in (optional)
+
+        Returns: (ThycoticWSDLCache) Instance of the ThycoticWSDLCache class
+        """
+        super(ThycoticWSDLCache, self).__init__(cache_dir, "wsdl", wsdl_url)
+        self.require_private(cache_dir)
+        self.timings = timings
+        self.ttl = ttl
+        self.wsdl_url = wsdl_url
+        self.local_path = wsdl_local_path(wsdl_url)
+        self.keyring = ThycoticKeyring.get(cache_dir, secret)
+        self.salt = None
+        self.key = None
+
+    def signing_key(self):
+        """
+        Get the key the parsed definitions are signed with, derived on first use - refresh() must have been
+        called first
+
+        Returns: (bytes) Signing key
+        """
+        if self.key is None:
+            self.key = self.keyring.derive("wsdl", self.salt)
+
+        return self.key
+
+    def version_path(self, digest, suffix):
+        """
+        Get the path of a file belonging to one version of the WSDL
+        Args:
+            digest: SHA-256 of the WSDL content
+            suffix: 'xml' for the WSDL itself, 'pickle' for its parsed definitions
+
+        Returns: (str) Path of the file
+        """
+        return "%s-%s.%s" % (self.path[:-len(".json")], digest[:32], suffix)
+
+    def refresh(self):
+        """
+        Make sure the cached copy matches the WSDL, downloading it (conditionally) once the TTL expires
+
+        Returns: (str) SHA-256 of the current WSDL content
+        """
+        with self.lock():
+            document = self.load() or {}
+            digest = document.get('sha256')
+            self.salt = base64.b64decode(document['salt']) if document.get('salt') else None
+            if (self.local_path is None and digest and self.salt and (time.time() - document.get('fetched', 0)) < self.ttl and
+                    os.path.exists(self.version_path(digest, 'xml'))):
+                return digest
+
+            start = monotonic()
+            content, headers = self.fetch(document if digest and os.path.exists(self.version_path(digest, 'xml')) else {})
+            if self.local_path is None and self.timings is not None:
+                self.timings.record("wsdl_fetch", monotonic() - start, len(content or ""))
+
+            if content is not None:
+                digest = hashlib.sha256(content).hexdigest()
+                if not os.path.exists(self.version_path(digest, 'xml')):
+                    self.write_version(digest, 'xml', content)
+                document = {'sha256': digest, 'salt': document.get('salt')}
+                document.update(headers)
+
+            if self.salt is None:
+                self.salt = os.urandom(16)
+                document['salt'] = base64.b64encode(self.salt).decode('ascii')
+            document['fetched'] = time.time()
+            self.store(document)
+            self.prune(digest)
+
+        return digest
+
+    def fetch(self, document):
+        """
+        Read the WSDL, with a conditional request if a copy is already cached
+        Args:
+            document: cache document of the copy already cached (empty if none)
+
+        Returns: (tuple) WSDL content (None if unchanged), and the validators to store for the next request
+        """
+        if self.local_path is not None:
+            with open(self.local_path, 'rb') as f:
+                return f.read(), {}
+
+        headers = {}
+        if document.get('etag'):
+            headers['If-None-Match'] = document['etag']
+        if document.get('last_modified'):
+            headers['If-Modified-Since'] = document['last_modified']
+
+        try:
+            response = open_url(self.wsdl_url, headers=headers)
+        except HTTPError as e:
+            if e.code == 304:
+                return None, {}
+            raise
+
+        return response.read(), {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+    def write_version(self, digest, suffix, content):
+        """
+        Atomically write a file belonging to one version of the WSDL
+        Args:
+            digest: SHA-256 of the WSDL content
+            suffix: 'xml' for the WSDL itself, 'pickle' for its parsed definitions
+            content: bytes to write
+
+        Returns: None
+        """
+        path = self.version_path(digest, suffix)
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.rename(tmp_path, path)
+
+    def prune(self, digest):
+        """
+        Remove the files of other versions of the WSDL - callers should hold the lock
+        Args:
+            digest: SHA-256 of the version to keep
+
+        Returns: None
+        """
+        keep = (self.version_path(digest, 'xml'), self.version_path(digest, 'pickle'))
+        for path in glob.glob("%s-*.xml" % (self.path[:-len(".json")])) + glob.glob("%s-*.pickle" % (self.path[:-len(".json")])):
+            if path not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load_definitions(self, digest):
+        """
+        Read the parsed definitions of a version of the WSDL, if their signature checks out
+        Args:
+            digest: SHA-256 of the WSDL content
+
+        Returns: (SudsDefinitionsCache) Parsed WSDL, or None if not cached (or unreadable, or not signed with our key)
+        """
+        path = self.version_path(digest, 'pickle')
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            return None
+
+        signature, content = content[:32], content[32:]
+        if not hmac.compare_digest(signature, hmac.new(self.signing_key(), content, hashlib.sha256).digest()):
+            # written with another secret (e.g. the password changed) or tampered with
+            return None
+
+        holder = SudsDefinitionsCache(options=suds.options.Options())
+
+        # the definitions are a large graph of small objects - collecting garbage while loading them only costs time
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            unpickler = pickle.Unpickler(io.BytesIO(content))
+            unpickler.persistent_load = lambda pid: holder.options
+            holder.definitions = unpickler.load()
+        except Exception:
+            return None
+        finally:
+            if enabled:
+                gc.enable()
+
+        return holder
+
+    def store_definitions(self, digest, holder):
+        """
+        Sign and store the parsed definitions of a version of the WSDL - the suds options (transport, plugins,
+        cache) are left out and bound to the options of the client when the definitions are loaded again
+        Args:
+            digest: SHA-256 of the WSDL content
+            holder: SudsDefinitionsCache holding the parsed WSDL
+
+        Returns: None
+        """
+        buf = io.BytesIO()
+        pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: "options" if isinstance(obj, suds.options.Options) else None
+        pickler.dump(holder.definitions)
+        content = buf.getvalue()
+        self.write_version(digest, 'pickle', hmac.new(self.signing_key(), content, hashlib.sha256).digest() + content)
+
+def wsdl_local_path(wsdl_url):
+    """
+    Get the local path of a WSDL given as a file path or file:// URL
+    Args:
+        wsdl_url: full path/URL to the Thycotic WSDL
+
+    Returns: (str) Absolute path of the WSDL file, or None if the WSDL is remote
+    """
+    parsed = urlparse(wsdl_url)
+    if parsed.scheme == 'file':
+        return os.path.abspath(parsed.path)
+    if not parsed.scheme or len(parsed.scheme) == 1:
+        # no scheme (or a windows drive letter) - a path to a local copy of the WSDL
+        return os.path.abspath(os.path.expanduser(wsdl_url))
+
+    return None
+
+def wsdl_definitions(cache):
+    """
+    Get the version of the WSDL to load and its parsed definitions, from the module broker's memory or the
+    cache directory - parsing (and caching) the definitions if neither has them
+    Args:
+        cache: ThycoticWSDLCache for the WSDL
+
+    Returns: (tuple) file:// URL of the cached copy of the WSDL, and SudsDefinitionsCache holding its definitions
+    """
+    digest = cache.refresh()
+    url = "file:%s" % (pathname2url(cache.version_path(digest, 'xml')))
+    key = "thycotic_wsdl:%s" % (digest)
+
+    broker = sys.modules.get('module_broker')
+    holder = broker.PREPARED.get(key) if broker is not None else None
+    if holder is None:
+        holder = cache.load_definitions(digest)
+
+    if holder is None:
+        holder = SudsDefinitionsCache()
+        holder.options = suds.client.Client(url, cache=holder, cachingpolicy=1).options
+        cache.store_definitions(digest, holder)
+
+    if broker is not None:
+        broker.PREPARED[key] = holder
+
+    return url, holder
+
+def wsdl_client(wsdl_url, cache=None, **kwargs):
+    """
+    Create a suds client for the WSDL, through the WSDL cache if one is given
+    Args:
+        wsdl_url: full path/URL to the Thycotic WSDL
+        cache: ThycoticWSDLCache for the WSDL (None to download and parse it)
+        kwargs: other suds client options (e.g. plugins)
+
+    Returns: (Client) suds client
+    """
+    if cache is None:
+        local_path = wsdl_local_path(wsdl_url)
+        return suds.client.Client(wsdl_url if local_path is None else "file:%s" % (pathname2url(local_path)), **kwargs)
+
+    url, holder = wsdl_definitions(cache)
+    client = suds.client.Client(url, cache=holder, cachingpolicy=1, **kwargs)
+    holder.bind(client)
+    return client
@@ -21,31 +21,87 @@ options:
     folder_id:
         description:
             - ID of the folder to store the secret in
-        required: true
+            - Required unless given for every entry in C(secrets)
+        required: false
     secret_type_id:
         description:
             - ID of the type of secret being created
-        required: true
+            - Required (or C(secret_template_name)) unless given for every entry in C(secrets)
+        required: false
+    secret_template_name:
+        description:
+            - Name of the type (template) of secret being created - looked up in the template catalog cached in
+              C(cache_dir), as an alternative to C(secret_type_id)
+            - Mutually exclusive with C(secret_type_id)
+        type: str
+        required: false
     secret_name:
         description:
             - Name of the secret to be stored or referenced
-        required: true
+            - Mutually exclusive with C(secrets)
+        required: false
     secret_content:
         description:
             - Password or secret content to be stored
-        required: true
+            - Required unless given for every entry in C(secrets)
+        required: false
     secret_field_ids:
         description:
             - Sequence of field IDs required to create the secret (requiring all IDs, in specific order)
-        required: true
+            - Required unless given for every entry in C(secrets)
+        required: false
     secret_item_values:
         description:
             - Data for various fields corresponding to the secret_field_ids - can include blank strings
-        required: true
+            - Required unless given for every entry in C(secrets)
+        required: false
+    secret_fields:
+        description:
+            - Dictionary of field name to value, as an alternative to C(secret_field_ids) and C(secret_item_values) -
+              fields are matched (case-insensitively) by their display name or slug in the secret template and
+              may be given in any order
+            - Only the fields given are compared and updated on an existing secret, the other fields are left as
+              they are (and are blank on a new secret)
+            - Mutually exclusive with C(secret_field_ids) and C(secret_item_values)
+        type: dict
+        required: false
+    secrets:
+        description:
+            - List of secrets to manage in a single task - each entry accepts C(secret_name) (required) along with
+              any of C(folder_id), C(secret_type_id), C(secret_template_name), C(secret_content),
+              C(secret_field_ids), C(secret_item_values) and C(secret_fields), which otherwise default to the
+              top-level values (an entry giving a template or its fields by name replaces the top-level ID-based
+              settings and vice versa)
+            - The task authenticates once and lists each folder involved once (secrets are matched by exact
+              name within their folder), and the resulting reads and writes run concurrently
+        type: list
+        required: false
+    batch_concurrency:
+        description:
+            - Maximum number of concurrent calls to Secret Server when managing the entries in C(secrets)
+        type: int
+        default: 10
+        required: false
     thycotic_wsdl_url:
         description:
-            - Full path/URL to the Thycotic WSDL
+            - Full path/URL to the Thycotic WSDL - a path to a local copy of the WSDL may be given instead of a URL
+              (calls are still made to the service address in the WSDL)
         required: true
+    thycotic_transport:
+        description:
+            - API used to talk to Secret Server - C(soap) uses the SOAP web service described by C(thycotic_wsdl_url),
+              C(rest) uses the REST API (JSON over pooled keep-alive connections, with no WSDL to download or parse)
+            - Searches, reads, creates and updates behave the same with either transport
+        type: str
+        choices: [ soap, rest ]
+        default: soap
+        required: false
+    thycotic_api_url:
+        description:
+            - Base URL of Secret Server for the C(rest) transport (e.g. https://thycotic.base.url/SecretServer) - defaults
+              to the application root of C(thycotic_wsdl_url)
+        type: str
+        required: false
     thycotic_auth_username:
         description:
             - Username for the account to authenticate against Secret Server
@@ -58,9 +114,96 @@ options:
         description:
             - Domain for the account to authenticate against Secret Server
         required: true
+    cache_dir:
+        description:
+            - Directory on the controller used to store state shared between module runs (authentication tokens, etc.)
+        type: path
+        default: "~/.ansible/cache/thycotic_secret"
+        required: false
+    token_cache:
+        description:
+            - Whether to share authentication tokens between module runs via C(cache_dir) - tokens are keyed by
+              WSDL URL, username and domain, are encrypted at rest and are re-used until they expire or are
+              rejected by Secret Server
+            - Requires the python cryptography library - the cache is disabled (with a warning) when it is missing
+        type: bool
+        default: true
+        required: false
+    token_cache_key:
+        description:
+            - Secret the key used to encrypt cached tokens (and to hash C(secret_ledger) values and sign the cached parsed
+              WSDL) is derived from - defaults to C(thycotic_auth_password)
+        type: str
+        required: false
+    wsdl_cache_ttl:
+        description:
+            - Number of seconds to trust the copy of the WSDL cached in C(cache_dir) before checking whether it changed
+              (using a conditional GET where supported) - the parsed WSDL is cached alongside it, keyed by the WSDL
+              content, so it is only parsed again when the WSDL changes
+            - A local WSDL file is checked for changes on every run
+            - The WSDL is not cached if C(cache_dir) is owned by another user or writable by other users
+            - A value of 0 disables the WSDL cache
+        type: int
+        default: 86400
+        required: false
+    template_cache_ttl:
+        description:
+            - Number of seconds to trust the catalog of secret templates (names, IDs and fields) cached in C(cache_dir)
+              for C(secret_template_name) and C(secret_fields) - the catalog is fetched again sooner when a template
+              name is not found in it
+            - A value of 0 keeps the catalog for the current run only
+        type: int
+        default: 86400
+        required: false
+    secret_ledger:
+        description:
+            - Whether to keep a ledger in C(cache_dir) of the secrets verified or written by the module (their ID, a hash
+              of the requested values keyed by C(token_cache_key) and the ID, name, template and folder reported by
+              Secret Server) - an existing secret whose requested values and server-side details match an entry
+              verified within C(secret_ledger_ttl) seconds is not fetched, so a run with no changes only searches for it
+            - Values changed in Secret Server by other means are not noticed until the entry expires
+        type: bool
+        default: false
+        required: false
+    secret_ledger_ttl:
+        description:
+            - Number of seconds an entry in the C(secret_ledger) is trusted before the secret is fetched and compared again
+        type: int
+        default: 3600
+        required: false
+    broker_socket:
+        description:
+            - Path of the unix socket of the optional module broker (C(module-broker/module_broker.py)) - when a
+              broker is listening the invocation is handed to it and run in a process forked from the warm broker
+              (re-using the WSDL it parsed at start-up), otherwise the module runs directly
+            - The invocation is only handed to a broker run by the same user that serves this version of the module
+            - An empty value always runs the module directly
+        type: path
+        default: "~/.ansible/module_broker.sock"
+        required: false
 
 requirements:
+    - base64
+    - cProfile
+    - contextlib
+    - cryptography
+    - fcntl
+    - gc
+    - glob
+    - hashlib
+    - hmac
+    - io
+    - json
+    - multiprocessing
+    - os
+    - pickle
+    - re
+    - requests (rest transport only)
+    - socket
     - suds
+    - sys
+    - threading
+    - time
 
 author:
     - Justin Karimi (@jekhokie) <jekhokie@gmail.com>
@@ -91,6 +234,61 @@ EXAMPLES = '''
     thycotic_auth_username: "MyUsername"
     thycotic_auth_password: "auth_password"
     thycotic_auth_domain: "local"
+
+- name: Create a secret over the REST API
+  delegate_to: localhost
+  thycotic_secret:
+    folder_id: "123"
+    secret_type_id: "456"
+    secret_name: "my test secret"
+    secret_content: "supersecretpassword"
+    secret_field_ids: [108, 111, 110, 109]
+    secret_item_values: ["a", "b", "c", ""]
+    thycotic_transport: rest
+    thycotic_wsdl_url: "https://thycotic.base.url/SecretServer/webservices/SSWebService.asmx?wsdl"
+    thycotic_auth_username: "MyUsername"
+    thycotic_auth_password: "auth_password"
+    thycotic_auth_domain: "local"
+
+- name: Create or update many secrets in a single task
+  delegate_to: localhost
+  run_once: true
+  thycotic_secret:
+    folder_id: "123"
+    secret_type_id: "456"
+    secret_content: ""
+    secret_field_ids:
+    - 108
+    - 111
+    - 110
+    - 109
+    secrets:
+    - secret_name: "svc-app-1"
+      secret_item_values: ["app-1", "svc-app-1", "{{ app_1_password }}", ""]
+    - secret_name: "svc-app-2"
+      folder_id: "124"
+      secret_item_values: ["app-2", "svc-app-2", "{{ app_2_password }}", ""]
+    batch_concurrency: 20
+    thycotic_wsdl_url: "https://thycotic.base.url/WebServices/SSWebService.asmx?wsdl"
+    thycotic_auth_username: "MyUsername"
+    thycotic_auth_password: "auth_password"
+    thycotic_auth_domain: "local"
+
+- name: Create a secret using template and field names
+  delegate_to: localhost
+  thycotic_secret:
+    folder_id: "123"
+    secret_template_name: "Windows Account"
+    secret_name: "my test secret"
+    secret_content: "supersecretpassword"
+    secret_fields:
+      Machine: "a"
+      Username: "b"
+      Password: "c"
+    thycotic_wsdl_url: "https://thycotic.base.url/WebServices/SSWebService.asmx?wsdl"
+    thycotic_auth_username: "MyUsername"
+    thycotic_auth_password: "auth_password"
+    thycotic_auth_domain: "local"
 '''
 
 RETURN = '''
@@ -99,98 +297,1152 @@ secret:
     type: dict
     returned: always
     sample: none
+timings:
+    description: Per-operation count, total/max latency (seconds), reply bytes and retries of the calls made to Secret Server
+    type: dict
+    returned: success
+    sample: {"GetSecret": {"calls": 1, "total_latency": 0.21, "max_latency": 0.21, "bytes": 3120, "retries": 0}}
+secrets:
+    description: Per-secret results (secret_name, folder_id, secret_id, changed, failed and msg) when C(secrets) is given
+    type: list
+    returned: when secrets is given
+    sample: none
 '''
 
-import suds
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.call_timings import CallTimings
+from ansible.module_utils.module_broker_client import BROKER_SOCKET, run_via_broker
 
-def run_module():
-    # available options for the module
-    module_args = dict(
-        folder_id=dict(type="int", required=True),
-        secret_type_id=dict(type="int", required=True),
-        secret_name=dict(type="str", required=True),
-        secret_content=dict(type="str", required=True),
-        secret_field_ids=dict(type="list", required=True),
-        secret_item_values=dict(type="list", required=True),
-        thycotic_wsdl_url=dict(type="str", required=True),
-        thycotic_auth_username=dict(type="str", required=True),
-        thycotic_auth_password=dict(type="str", required=True, no_log=True),
-        thycotic_auth_domain=dict(type="str", required=True)
-    )
+# hand the invocation to the module broker (if one is running) before loading suds and the WSDL
+if __name__ == '__main__':
+    run_via_broker('thycotic_secret', globals())
 
-    # seed result dict that is returned
-    result = dict(
-        changed=False,
-        failed=False
-    )
+import suds.plugin
+from ansible.module_utils.six import string_types
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+from ansible.module_utils.thycotic_cache import HAS_CRYPTOGRAPHY, ThycoticCacheFile, ThycoticKeyring, ThycoticTokenCache
+from ansible.module_utils.thycotic_soap import soap_errors, token_rejected
+from ansible.module_utils.thycotic_wsdl import ThycoticWSDLCache, wsdl_client, wsdl_definitions
+from multiprocessing.pool import ThreadPool
 
-    # default Ansible constructor
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
+# libraries of the rest transport - only imported when the transport is used
+requests = None
+HTTPAdapter = None
 
-    # create the SOAP client for interaction
-    client = suds.client.Client(module.params["thycotic_wsdl_url"])
-
-    # get an auth token
-    token = client.service.Authenticate(module.params["thycotic_auth_username"],
-                                        module.params["thycotic_auth_password"],
-                                        "",
-                                        module.params["thycotic_auth_domain"])
-
-    # first, inspect whether the secret exists - and if so, check whether the fields just need to be updated
-    secrets = client.factory.create("SearchSecretsByFolder")
-    secrets.token = token.Token
-    secrets.searchTerm = module.params["secret_name"]
-    secrets.folderId = module.params["folder_id"]
-    secrets.includeSubFolders = False
-    secrets.includeDeleted = False
-    secrets.includeRestricted = False
-    secret_results = client.service.SearchSecretsByFolder(secrets)
-
-    if len(secret_results.SecretSummaries) > 0:
-        # found the secret already exists - figure out if it needs to be updated or not
-        # TODO: This will grab the first result, but if there are duplicates, this
-        #       logic is likely to have issues since you won't know which instance you're grabbing
-        secret = secret_results.SecretSummaries[0][0]
-        secret_template = client.factory.create("GetSecret")
-        secret_template.token = token.Token
-        secret_template.secretId = secret.SecretId
+def import_rest_libraries():
+    """
+    Import the libraries used by the rest transport
+
+    Returns: (bool) True if they are available
+    """
+    global requests, HTTPAdapter
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+    except ImportError:
+        return False
+
+    return True
+
+# monotonic clock for measuring latency (not available on python 2)
+monotonic = getattr(time, 'monotonic', time.time)
+
+# outbound call instrumentation for this invocation
+TIMINGS = CallTimings('thycotic_secret')
+
+class ReplySizePlugin(suds.plugin.MessagePlugin):
+    '''suds plugin capturing the size of the last SOAP reply (per thread) for instrumentation.'''
+
+    def __init__(self):
+        self.replies = threading.local()
+
+    def received(self, context):
+        self.replies.size = len(context.reply)
+
+def soap_call(plugin, operation, *args):
+    """
+    Invoke a SOAP operation and record its latency and reply size
+    Args:
+        plugin: ReplySizePlugin registered with the client
+        operation: suds service method to invoke
+        args: arguments for the operation
+
+    Returns: Result of the operation
+    """
+    plugin.replies.size = None
+    start = monotonic()
+    try:
+        return operation(*args)
+    finally:
+        TIMINGS.record(operation.method.name, monotonic() - start, plugin.replies.size)
+
+# options describing a single secret - may be given at the top level or per entry in 'secrets'
+SECRET_OPTIONS = ('folder_id', 'secret_content', 'secret_field_ids', 'secret_fields', 'secret_item_values', 'secret_name',
+                  'secret_template_name', 'secret_type_id')
+
+# settings of a secret that may be given by ID or by name - an entry in 'secrets' giving either form replaces both
+# forms of the top-level defaults
+SECRET_ALTERNATIVES = (
+    (('secret_type_id',), ('secret_template_name',)),
+    (('secret_field_ids', 'secret_item_values'), ('secret_fields',))
+)
+
+class ThycoticError(Exception):
+    '''Raised for a failed Secret Server operation - reported with fail_json, or against a single secret in batch mode.'''
+    pass
+
+class ThycoticTokenRejected(ThycoticError):
+    '''Raised by a transport when Secret Server does not accept the token of a call.'''
+    pass
+
+class SecretSummary(object):
+    '''Secret found by a search - the same for every transport.'''
+
+    def __init__(self, secret_id, name, secret_type_id, folder_id):
+        self.secret_id = secret_id
+        self.name = name
+        self.secret_type_id = secret_type_id
+        self.folder_id = folder_id
+
+class SecretDetails(SecretSummary):
+    '''Secret read from (or created in) Secret Server - items holds its (field ID, value) pairs in template order
+    and raw the transport's own representation of the secret, which is sent back to update it.'''
+
+    def __init__(self, secret_id, name, secret_type_id, folder_id, items, raw):
+        super(SecretDetails, self).__init__(secret_id, name, secret_type_id, folder_id)
+        self.items = items
+        self.raw = raw
+
+def create_client(module):
+    """
+    Create the SOAP client, recording the time taken to download and parse the WSDL (or load it from the cache)
+    Args:
+        module: object containing parameters passed by playbook
+
+    Returns: (tuple) suds client and the ReplySizePlugin registered with it
+    """
+    plugin = ReplySizePlugin()
+    start = monotonic()
+    wsdl_url = module.params["thycotic_wsdl_url"]
+
+    cache = None
+    if module.params['wsdl_cache_ttl'] > 0:
+        try:
+            cache = ThycoticWSDLCache(module.params['cache_dir'], module.params['wsdl_cache_ttl'], wsdl_url,
+                                      module.params['token_cache_key'] or module.params['thycotic_auth_password'], TIMINGS)
+        except Exception as e:
+            module.warn("WSDL cache disabled - could not use cache directory %s: %s" % (module.params['cache_dir'], e))
+
+    try:
+        client = wsdl_client(wsdl_url, cache, plugins=[plugin])
+    except Exception as e:
+        module.fail_json(msg="Failed to load the WSDL %s: %s" % (wsdl_url, e))
+    TIMINGS.record("wsdl_load", monotonic() - start)
+
+    return client, plugin
+
+def prepare_broker(params):
+    """
+    Called by the module broker before it forks a child to run the module - loads the parsed WSDL into the
+    broker so that every later invocation inherits it
+    Args:
+        params: module arguments of the invocation
+
+    Returns: None
+    """
+    ttl = params.get('wsdl_cache_ttl', 86400)
+    if params.get('thycotic_transport', 'soap') == 'soap' and params.get('thycotic_wsdl_url') and ttl > 0:
+        cache_dir = os.path.expanduser(params.get('cache_dir') or "~/.ansible/cache/thycotic_secret")
+        wsdl_definitions(ThycoticWSDLCache(cache_dir, ttl, params['thycotic_wsdl_url'],
+                                           params.get('token_cache_key') or params['thycotic_auth_password']))
+
+class ThycoticTemplateCatalog(ThycoticCacheFile):
+    '''Secret templates (ID and fields) by name, shared between module runs for ttl seconds so that secrets can be
+    given by template and field name without listing every template on each run. The listing is fetched again
+    when a template is not found in a copy fetched by an earlier run, and fields are read per template where the
+    transport lists templates without them.'''
+
+    def __init__(self, cache_dir, ttl, service_url, username, domain):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the catalog in
+            ttl: number of seconds the catalog is trusted (0 to only keep it for this run)
+            service_url: URL of the Secret Server service (templates visible to a user may differ between users)
+            username: user the templates are listed as
+            domain: domain of the user
+
+        Returns: (ThycoticTemplateCatalog) Instance of the ThycoticTemplateCatalog class
+        """
+        super(ThycoticTemplateCatalog, self).__init__(cache_dir, "templates", service_url, username, domain)
+        self.ttl = ttl
+        self.document = None
+        self.listed = False
+        self.thread_lock = threading.Lock()
+
+    def template(self, session, name=None, template_id=None):
+        """
+        Get a template by name or ID - from this run's copy, the cache directory or Secret Server
+        Args:
+            session: authenticated ThycoticSession (only used on a miss)
+            name: name of the template
+            template_id: ID of the template (if no name is given)
+
+        Returns: (dict) Template (id, name and fields as [field ID, display name, slug] lists)
+        """
+        with self.thread_lock:
+            template = self.find(name, template_id)
+            if template is not None and template['fields'] is not None:
+                return template
+
+            if self.ttl <= 0:
+                return self.fetch(session, name, template_id)
+
+            # under the file lock so that concurrent runs fetch the catalog once
+            with self.lock():
+                return self.fetch(session, name, template_id)
+
+    def find(self, name, template_id):
+        """
+        Look a template up in this run's copy of the catalog
+
+        Returns: (dict) Template, or None if not found
+        """
+        templates = (self.document or {}).get('templates') or {}
+        if name is not None:
+            return templates.get(name)
+
+        for template in templates.values():
+            if template['id'] == template_id:
+                return template
+
+        return None
+
+    def fetch(self, session, name, template_id):
+        """
+        Look a template up, refreshing the catalog (and reading the template's fields) as needed - callers should
+        hold the locks
+
+        Returns: (dict) Template
+        """
+        document = self.document
+        if self.ttl > 0:
+            document = self.load()
+            if document is not None and time.time() - document.get('fetched', 0) >= self.ttl:
+                document = None
+        self.document = document
+
+        changed = False
+        if self.document is None or (self.find(name, template_id) is None and not self.listed):
+            templates = {}
+            for template in session.call('list_templates'):
+                templates.setdefault(template['name'], template)
+            self.document = {'fetched': time.time(), 'templates': templates}
+            self.listed = changed = True
+
+        template = self.find(name, template_id)
+        if template is None:
+            raise ThycoticError("Secret template '{}' not found".format(name if name is not None else template_id))
+
+        if template['fields'] is None:
+            template['fields'] = session.call('get_template', template['id'])['fields']
+            changed = True
+
+        if changed and self.ttl > 0:
+            self.store(self.document)
+
+        return template
+
+def resolve_secret_fields(session, catalog, spec):
+    """
+    Fill in the template ID and field IDs/values of a secret given by template name and/or field names - fields
+    are matched by display name (or slug), case-insensitively, and fields that are not named are left as they are
+    on existing secrets (blank on new ones)
+    Args:
+        session: authenticated ThycoticSession
+        catalog: ThycoticTemplateCatalog to resolve names with
+        spec: dict of SECRET_OPTIONS describing the secret (updated in place)
+
+    Returns: None
+    """
+    template = None
+    if spec['secret_template_name'] is not None:
+        template = catalog.template(session, name=spec['secret_template_name'])
+        spec['secret_type_id'] = template['id']
+
+    if spec['secret_fields'] is None:
+        return
+    if template is None:
+        template = catalog.template(session, template_id=spec['secret_type_id'])
+
+    index = {}
+    for field_id, display_name, slug in template['fields']:
+        for label in (display_name, slug):
+            if label:
+                index.setdefault(label.lower(), field_id)
+
+    values = {}
+    for label, value in spec['secret_fields'].items():
+        field_id = index.get(str(label).lower())
+        if field_id is None:
+            raise ThycoticError("Secret template '{}' has no field '{}'".format(template['name'], label))
+        values[field_id] = "" if value is None else value if isinstance(value, string_types) else str(value)
+
+    spec['secret_field_ids'] = [field[0] for field in template['fields']]
+    spec['secret_item_values'] = [values.get(field[0], "") for field in template['fields']]
+    spec['managed_field_ids'] = sorted(values)
+
+class ThycoticLedger(ThycoticCacheFile):
+    '''Controller-side record of the secrets this module has verified or written: their ID, a keyed hash of the
+    requested template, field IDs and values, and a marker of the server-side secret (ID, name, template and
+    folder as returned by a search). A secret whose requested values and marker both match an entry verified
+    within the last ttl seconds is not fetched again. Values changed on the server without changing the marker
+    are only noticed once the entry expires.'''
+
+    def __init__(self, cache_dir, secret, ttl, wsdl_url, username, domain):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the ledger in
+            secret: secret the hash key is derived from
+            ttl: number of seconds a verified entry is trusted
+            wsdl_url: WSDL URL of the Secret Server instance
+            username: user the secrets are managed as
+            domain: domain of the user
+
+        Returns: (ThycoticLedger) Instance of the ThycoticLedger class
+        """
+        super(ThycoticLedger, self).__init__(cache_dir, "ledger", wsdl_url, username, domain)
+        self.keyring = ThycoticKeyring.get(cache_dir, secret)
+        self.key = None
+        self.ttl = ttl
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+        # read without the lock - the document is replaced atomically, and entries are re-merged under the lock on flush
+        document = self.load() or {}
+        self.salt = base64.b64decode(document['salt']) if document.get('salt') else os.urandom(16)
+        self.entries = document.get('entries', {}) if document.get('salt') else {}
+
+    @staticmethod
+    def entry_key(spec):
+        """
+        Get the ledger key of a secret
+        Args:
+            spec: dict of SECRET_OPTIONS describing the secret
+
+        Returns: (str) Key of the secret's entry
+        """
+        return "%s:%s" % (spec['folder_id'], spec['secret_name'])
+
+    def digest(self, spec):
+        """
+        Hash the requested template, field IDs and values of a secret
+        Args:
+            spec: dict of SECRET_OPTIONS describing the secret
+
+        Returns: (str) Hex digest keyed with the ledger key
+        """
+        if self.key is None:
+            self.key = self.keyring.derive("ledger", self.salt)
+
+        desired = json.dumps([spec['secret_type_id'], [str(f) for f in spec['secret_field_ids']],
+                              ["" if v is None else str(v) for v in spec['secret_item_values']]])
+        return hmac.new(self.key, desired.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def unchanged(self, record):
+        """
+        Check whether a secret is known to hold the requested values
+        Args:
+            record: ThycoticSecret with the ID and marker found by a search
+
+        Returns: (bool) Whether the secret was verified within the ttl with the same values and marker
+        """
+        entry = self.entries.get(self.entry_key(record.spec))
+        return (entry is not None and record.marker is not None and
+                entry['secret_id'] == record.secret_id and entry['marker'] == record.marker and
+                time.time() - entry['verified'] < self.ttl and
+                hmac.compare_digest(entry['values'], self.digest(record.spec)))
+
+    def record(self, record, secret):
+        """
+        Remember that a secret holds the requested values (written to disk by flush())
+        Args:
+            record: ThycoticSecret that was verified or written
+            secret: SecretDetails read or created
+
+        Returns: None
+        """
+        entry = {
+            'secret_id': secret.secret_id,
+            'values': self.digest(record.spec),
+            'marker': secret_marker(secret),
+            'verified': time.time()
+        }
+        with self.pending_lock:
+            self.pending[self.entry_key(record.spec)] = entry
+
+    def forget(self, record):
+        """
+        Drop the entry of a secret whose state is no longer known (written to disk by flush())
+        Args:
+            record: ThycoticSecret to forget
+
+        Returns: None
+        """
+        with self.pending_lock:
+            self.pending[self.entry_key(record.spec)] = None
+
+    def flush(self):
+        """
+        Merge the recorded entries into the ledger, dropping expired ones
+
+        Returns: None
+        """
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        with self.lock():
+            document = self.load() or {}
+            if not document.get('salt'):
+                document = {'salt': base64.b64encode(self.salt).decode('ascii'), 'entries': {}}
+            elif base64.b64decode(document['salt']) != self.salt:
+                # another run started the ledger meanwhile - entries hashed with this salt cannot be merged
+                return
+
+            now = time.time()
+            entries = dict((k, v) for k, v in document['entries'].items() if now - v['verified'] < self.ttl)
+            for key, entry in pending.items():
+                if entry is None:
+                    entries.pop(key, None)
+                else:
+                    entries[key] = entry
+
+            document['entries'] = entries
+            self.store(document)
+
+def secret_marker(secret):
+    """
+    Build the marker the ledger compares to detect secrets that were replaced, renamed, moved or re-templated
+    Args:
+        secret: SecretSummary (or SecretDetails) of the secret
+
+    Returns: (str) Marker
+    """
+    return json.dumps([secret.secret_id, secret.name, secret.secret_type_id, secret.folder_id])
+
+class SoapTransport(object):
+    '''Secret Server SOAP API (SSWebService.asmx) client, built from the (cached) WSDL with suds.'''
+
+    def __init__(self, module):
+        """
+        Default constructor
+        Args:
+            module: object containing parameters passed by playbook
+
+        Returns: (SoapTransport) Instance of the SoapTransport class
+        """
+        self.client, self.plugin = create_client(module)
+        self.params = module.params
+
+        # identifies the service tokens are issued by in the token cache (shared with the lookup plugin)
+        self.service_url = module.params['thycotic_wsdl_url']
+
+    def invoke(self, operation, request):
+        """
+        Invoke a SOAP operation, raising the errors Secret Server reports
+        Args:
+            operation: suds service method to invoke
+            request: request object for the operation
+
+        Returns: Result of the operation
+        """
+        result = soap_call(self.plugin, operation, request)
+
+        errors = soap_errors(result)
+        if token_rejected(errors):
+            raise ThycoticTokenRejected(errors[0])
+        if errors:
+            raise ThycoticError(errors[0])
+
+        return result
+
+    def authenticate(self):
+        """
+        Log in to Secret Server and get a new token
+
+        Returns: (str) Token
+        """
+        result = soap_call(self.plugin, self.client.service.Authenticate,
+                           self.params["thycotic_auth_username"],
+                           self.params["thycotic_auth_password"],
+                           "",
+                           self.params["thycotic_auth_domain"])
+
+        errors = soap_errors(result)
+        if errors or not getattr(result, 'Token', None):
+            raise ThycoticError("Failed to authenticate against Secret Server: %s" % (", ".join(errors)))
+
+        return result.Token
+
+    def token_is_valid(self, token):
+        """
+        Check whether Secret Server still accepts a token, without logging in
+        Args:
+            token: token to check
+
+        Returns: (bool) True if the token can be used
+        """
+        try:
+            return not soap_errors(soap_call(self.plugin, self.client.service.GetTokenIsValid, token))
+        except Exception:
+            return False
+
+    def search(self, token, folder_id, search_term):
+        """
+        Search a folder for secrets
+        Args:
+            token: session token
+            folder_id: ID of the folder to search (sub-folders are not included)
+            search_term: text to search secret names for - an empty string lists the entire folder
+
+        Returns: (list) SecretSummary objects found
+        """
+        secrets = self.client.factory.create("SearchSecretsByFolder")
+        secrets.token = token
+        secrets.searchTerm = search_term
+        secrets.folderId = folder_id
+        secrets.includeSubFolders = False
+        secrets.includeDeleted = False
+        secrets.includeRestricted = False
+
+        return secret_summaries(self.invoke(self.client.service.SearchSecretsByFolder, secrets))
+
+    def get_secret(self, token, secret_id):
+        """
+        Read a secret
+        Args:
+            token: session token
+            secret_id: ID of the secret
+
+        Returns: (SecretDetails) Secret
+        """
+        secret_template = self.client.factory.create("GetSecret")
+        secret_template.token = token
+        secret_template.secretId = secret_id
         secret_template.loadSettingsAndPermissions = False
-        secret_data = client.service.GetSecret(secret_template)
+        secret = self.invoke(self.client.service.GetSecret, secret_template).Secret
+
+        return soap_secret_details(secret)
+
+    def add_secret(self, token, spec):
+        """
+        Create a secret
+        Args:
+            token: session token
+            spec: dict of SECRET_OPTIONS describing the secret
+
+        Returns: (SecretDetails) Secret created
+        """
+        new_secret = self.client.factory.create("AddSecret")
+        new_secret.token = token
+        new_secret.secretTypeId = spec["secret_type_id"]
+        new_secret.secretName = spec["secret_name"]
+        new_secret.folderId = spec["folder_id"]
+        new_secret.secretFieldIds = self.client.factory.create("ArrayOfInt")
+        new_secret.secretFieldIds.int = spec["secret_field_ids"]
+        new_secret.secretItemValues = self.client.factory.create("ArrayOfString")
+        new_secret.secretItemValues.string = spec["secret_item_values"]
+
+        return soap_secret_details(self.invoke(self.client.service.AddSecret, new_secret).Secret)
+
+    def update_secret(self, token, secret, values):
+        """
+        Replace the values of every field of a secret
+        Args:
+            token: session token
+            secret: SecretDetails read by get_secret()
+            values: new values, in the order of the secret's fields
+
+        Returns: None
+        """
+        update_secret = self.client.factory.create("UpdateSecret")
+        update_secret.token = token
+        update_secret.secret = secret.raw
+        for i, item in enumerate(values):
+            update_secret.secret.Items.SecretItem[i].Value = item
+
+        self.invoke(self.client.service.UpdateSecret, update_secret)
+
+    def list_templates(self, token):
+        """
+        List the secret templates the user can see - the SOAP API includes their fields
+        Args:
+            token: session token
+
+        Returns: (list) Template dicts (id, name and fields)
+        """
+        templates = self.client.factory.create("GetSecretTemplates")
+        templates.token = token
+        result = getattr(self.invoke(self.client.service.GetSecretTemplates, templates), 'SecretTemplates', None)
+        if not result:
+            return []
+
+        return [{'id': template.Id, 'name': template.Name,
+                 'fields': [[field.Id, field.DisplayName, getattr(field, 'FieldSlugName', None)]
+                            for field in getattr(template.Fields, 'SecretField', None) or []] if template.Fields else []}
+                for template in getattr(result, 'SecretTemplate', None) or []]
+
+    def get_template(self, token, template_id):
+        """
+        Read a secret template
+        Args:
+            token: session token
+            template_id: ID of the template
+
+        Returns: (dict) Template (id, name and fields)
+        """
+        for template in self.list_templates(token):
+            if template['id'] == template_id:
+                return template
+
+        raise ThycoticError("Secret template {} not found".format(template_id))
+
+def soap_secret_details(secret):
+    """
+    Convert a secret returned by the SOAP API
+    Args:
+        secret: suds Secret object
+
+    Returns: (SecretDetails) Secret
+    """
+    # convert values to blank strings in case of None type to enable comparison with provided string values
+    items = [(item.FieldId, "" if item.Value is None else item.Value) for item in secret.Items.SecretItem]
+    return SecretDetails(secret.Id, secret.Name, secret.SecretTypeId, secret.FolderId, items, secret)
+
+class RestTransport(object):
+    '''Secret Server REST API (api/v1) client - JSON over a pooled keep-alive session authenticated with an
+    OAuth2 bearer token, without the WSDL download, parse and XML envelopes of the SOAP API.'''
+
+    # number of secrets requested per page of search results
+    SEARCH_PAGE_SIZE = 500
 
-        if len(secret_data.Errors) > 0:
-            module.fail_json(msg="Failed to get details of existing Secret with ID {} - errors: {}".format(secret.SecretId, secret_data.Errors[0]))
+    # seconds to wait for Secret Server to respond (the suds default)
+    TIMEOUT = 90
+
+    def __init__(self, module):
+        """
+        Default constructor
+        Args:
+            module: object containing parameters passed by playbook
+
+        Returns: (RestTransport) Instance of the RestTransport class
+        """
+        if not import_rest_libraries():
+            module.fail_json(msg="The rest transport requires the python requests library")
+
+        self.params = module.params
+        self.api_url = rest_api_url(module.params)
+        if self.api_url is None:
+            module.fail_json(msg="thycotic_api_url is required for the rest transport when thycotic_wsdl_url is not a URL")
+
+        # identifies the service tokens are issued by in the token cache
+        self.service_url = "%s/oauth2/token" % (self.api_url)
+
+        # one keep-alive connection per concurrent call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, module.params['batch_concurrency']))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # secret stubs (new secret models) by template and folder, shared between threads
+        self.stubs = {}
+        self.stubs_lock = threading.Lock()
+
+    def request(self, operation, method, path, token=None, **kwargs):
+        """
+        Make a call to the REST API and record its latency and reply size
+        Args:
+            operation: name of the operation recorded in the timings (named after the SOAP equivalent)
+            method: HTTP method
+            path: path under the API URL
+            token: bearer token (None for the token request itself)
+            kwargs: additional arguments for requests (params, data, json)
+
+        Returns: Decoded JSON reply (None if empty)
+        """
+        headers = {'Accept': 'application/json'}
+        if token is not None:
+            headers['Authorization'] = "Bearer %s" % (token)
+
+        response = None
+        start = monotonic()
+        try:
+            response = self.session.request(method, "%s%s" % (self.api_url, path), headers=headers, timeout=self.TIMEOUT, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise ThycoticError("%s %s failed: %s" % (method, path, e))
+        finally:
+            TIMINGS.record(operation, monotonic() - start, len(response.content) if response is not None else None)
+
+        if response.status_code == 401 and token is not None:
+            raise ThycoticTokenRejected("Token is invalid or has expired")
+        if response.status_code >= 400:
+            raise ThycoticError(rest_error(response))
+
+        return response.json() if response.content else None
+
+    def authenticate(self):
+        """
+        Log in to Secret Server and get a new token
+
+        Returns: (str) Token
+        """
+        data = {
+            'grant_type': 'password',
+            'username': self.params["thycotic_auth_username"],
+            'password': self.params["thycotic_auth_password"]
+        }
+        if self.params["thycotic_auth_domain"]:
+            data['domain'] = self.params["thycotic_auth_domain"]
+
+        try:
+            result = self.request("Authenticate", 'POST', "/oauth2/token", data=data)
+        except ThycoticError as e:
+            raise ThycoticError("Failed to authenticate against Secret Server: %s" % (e))
+
+        if not result or not result.get('access_token'):
+            raise ThycoticError("Failed to authenticate against Secret Server: no token returned")
+
+        return result['access_token']
+
+    def token_is_valid(self, token):
+        """
+        Check whether Secret Server still accepts a token, without logging in
+        Args:
+            token: token to check
+
+        Returns: (bool) True if the token can be used
+        """
+        try:
+            self.request("GetTokenIsValid", 'GET', "/api/v1/users/current", token)
+            return True
+        except Exception:
+            return False
+
+    def search(self, token, folder_id, search_term):
+        """
+        Search a folder for secrets, walking every page of results
+        Args:
+            token: session token
+            folder_id: ID of the folder to search (sub-folders are not included)
+            search_term: text to search secret names for - an empty string lists the entire folder
+
+        Returns: (list) SecretSummary objects found
+        """
+        params = {
+            'filter.folderId': folder_id,
+            'filter.searchText': search_term,
+            'filter.includeSubFolders': 'false',
+            'filter.includeRestricted': 'false'
+        }
+        return [SecretSummary(r['id'], r['name'], r['secretTemplateId'], r['folderId'])
+                for r in self.records("SearchSecretsByFolder", "/api/v1/secrets", token, params)]
+
+    def records(self, operation, path, token, params):
+        """
+        Get every record of a paged listing
+        Args:
+            operation: name of the operation recorded in the timings
+            path: path of the listing under the API URL
+            token: session token
+            params: query parameters (other than paging)
+
+        Returns: (list) Records of every page
+        """
+        records = []
+        while True:
+            page = self.request(operation, 'GET', path, token, params=dict(params, skip=len(records), take=self.SEARCH_PAGE_SIZE)) or {}
+            page_records = page.get('records') or []
+            records.extend(page_records)
+
+            if not page.get('hasNext') or not page_records:
+                return records
+
+    def list_templates(self, token):
+        """
+        List the secret templates the user can see - the REST API lists them without their fields
+        Args:
+            token: session token
+
+        Returns: (list) Template dicts (id, name and fields - None until read with get_template())
+        """
+        return [{'id': r['id'], 'name': r['name'], 'fields': None}
+                for r in self.records("GetSecretTemplates", "/api/v1/secret-templates", token, {})]
+
+    def get_template(self, token, template_id):
+        """
+        Read a secret template
+        Args:
+            token: session token
+            template_id: ID of the template
+
+        Returns: (dict) Template (id, name and fields)
+        """
+        template = self.request("GetSecretTemplate", 'GET', "/api/v1/secret-templates/%s" % (template_id), token)
+        return {'id': template['id'], 'name': template['name'],
+                'fields': [[field['secretTemplateFieldId'], field.get('displayName'), field.get('fieldSlugName')]
+                           for field in template.get('fields') or []]}
+
+    def get_secret(self, token, secret_id):
+        """
+        Read a secret
+        Args:
+            token: session token
+            secret_id: ID of the secret
+
+        Returns: (SecretDetails) Secret
+        """
+        return rest_secret_details(self.request("GetSecret", 'GET', "/api/v1/secrets/%s" % (secret_id), token))
+
+    def add_secret(self, token, spec):
+        """
+        Create a secret from the stub (new secret model) of its template and folder
+        Args:
+            token: session token
+            spec: dict of SECRET_OPTIONS describing the secret
+
+        Returns: (SecretDetails) Secret created
+        """
+        # fetched under the lock so that concurrent creates of the same template and folder fetch it once
+        key = (spec["secret_type_id"], spec["folder_id"])
+        with self.stubs_lock:
+            stub = self.stubs.get(key)
+            if stub is None:
+                params = {'filter.secretTemplateId': spec["secret_type_id"], 'filter.folderId': spec["folder_id"]}
+                stub = self.stubs[key] = self.request("GetSecretStub", 'GET', "/api/v1/secrets/stub", token, params=params)
+
+        # copy the stub so that threads creating secrets from the same template do not share it
+        secret = json.loads(json.dumps(stub))
+        secret['name'] = spec["secret_name"]
+        secret['folderId'] = spec["folder_id"]
+        items = dict((item['fieldId'], item) for item in secret.get('items') or [])
+        for field_id, value in zip(spec["secret_field_ids"], spec["secret_item_values"]):
+            if int(field_id) not in items:
+                raise ThycoticError("field ID %s is not part of secret template %s" % (field_id, spec["secret_type_id"]))
+            items[int(field_id)]['itemValue'] = value
+
+        return rest_secret_details(self.request("AddSecret", 'POST', "/api/v1/secrets", token, json=secret))
+
+    def update_secret(self, token, secret, values):
+        """
+        Replace the values of every field of a secret
+        Args:
+            token: session token
+            secret: SecretDetails read by get_secret()
+            values: new values, in the order of the secret's fields
+
+        Returns: None
+        """
+        model = dict(secret.raw)
+        model['items'] = [dict(item) for item in secret.raw['items']]
+        for i, value in enumerate(values):
+            model['items'][i]['itemValue'] = value
+
+        self.request("UpdateSecret", 'PUT', "/api/v1/secrets/%s" % (secret.secret_id), token, json=model)
+
+def rest_secret_details(secret):
+    """
+    Convert a secret model returned by the REST API
+    Args:
+        secret: decoded secret model
+
+    Returns: (SecretDetails) Secret
+    """
+    items = [(item['fieldId'], item.get('itemValue') or "") for item in secret.get('items') or []]
+    return SecretDetails(secret['id'], secret['name'], secret['secretTemplateId'], secret['folderId'], items, secret)
+
+def rest_error(response):
+    """
+    Get the error message of a failed REST API call
+    Args:
+        response: requests response
+
+    Returns: (str) Error message
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+
+    if isinstance(body, dict):
+        message = body.get('message') or body.get('error_description') or body.get('error')
+        if message:
+            detail = body.get('messageDetail')
+            return "%s (%s)" % (message, detail) if detail and detail != message else message
+
+    return "HTTP %s: %s" % (response.status_code, response.text[:200])
+
+def rest_api_url(params):
+    """
+    Get the base URL of the REST API - thycotic_api_url if given, otherwise the application root of the WSDL URL
+    (e.g. https://host/SecretServer for https://host/SecretServer/webservices/SSWebService.asmx?wsdl)
+    Args:
+        params: module parameters
+
+    Returns: (str) Base URL, or None if it cannot be derived (e.g. the WSDL is a local file)
+    """
+    if params.get('thycotic_api_url'):
+        return params['thycotic_api_url'].rstrip('/')
+
+    parsed = urlparse(params['thycotic_wsdl_url'])
+    if parsed.scheme not in ('http', 'https'):
+        return None
+
+    path = parsed.path
+    index = path.lower().find('/webservices/')
+    path = path[:index] if index >= 0 else path.rsplit('/', 1)[0]
+    return "%s://%s%s" % (parsed.scheme, parsed.netloc, path)
+
+def create_transport(module):
+    """
+    Create the client for the transport selected by thycotic_transport
+    Args:
+        module: object containing parameters passed by playbook
+
+    Returns: (SoapTransport or RestTransport) Transport
+    """
+    if module.params['thycotic_transport'] == 'rest':
+        return RestTransport(module)
+
+    return SoapTransport(module)
+
+class ThycoticSession(object):
+    '''Authenticated connection to Secret Server over a transport - re-uses a cached token where possible and
+    logs in again when the server rejects the token in use.'''
+
+    def __init__(self, module, transport):
+        """
+        Default constructor
+        Args:
+            module: object containing parameters passed by playbook
+            transport: SoapTransport or RestTransport to make calls with
+
+        Returns: (ThycoticSession) Instance of the ThycoticSession class
+        """
+        self.module = module
+        self.transport = transport
+        self.token = None
+        self.auth_lock = threading.Lock()
+
+        self.token_cache = None
+        if module.params['token_cache']:
+            if not HAS_CRYPTOGRAPHY:
+                module.warn("Token cache disabled - the cryptography library is required to encrypt cached tokens")
+            else:
+                try:
+                    self.token_cache = ThycoticTokenCache(module.params['cache_dir'],
+                                                          module.params['token_cache_key'] or module.params['thycotic_auth_password'],
+                                                          transport.service_url,
+                                                          module.params['thycotic_auth_username'],
+                                                          module.params['thycotic_auth_domain'])
+                except Exception as e:
+                    module.warn("Token cache disabled - could not use cache directory %s: %s" % (module.params['cache_dir'], e))
+
+        # initialize the token for auth
+        self.get_auth()
+
+    def get_auth(self, stale_token=None):
+        """
+        Get a token for the session - tokens are shared between module runs via the token cache (if enabled)
+        so only one process logs in at a time
+        Args:
+            stale_token: token that Secret Server rejected and which must not be re-used
+
+        Returns: None (updates the session token)
+        """
+        if self.token_cache is None:
+            self.token = self.transport.authenticate()
+            return
+
+        try:
+            self.token = self.token_cache.get_token(self.transport.authenticate, self.transport.token_is_valid,
+                                                    stale_token)
+        except (IOError, OSError) as e:
+            raise ThycoticError("Failed to get authentication token: %s" % (e))
+
+    def call(self, operation, *args):
+        """
+        Invoke a transport operation with the session token, logging in again and retrying once if the token is
+        rejected - safe to use from several threads, which share the session token
+        Args:
+            operation: name of the transport method (search, get_secret, add_secret, update_secret, list_templates
+                       or get_template)
+            args: arguments for the operation (after the token)
+
+        Returns: Result of the operation
+        """
+        token = self.token
+        try:
+            return getattr(self.transport, operation)(token, *args)
+        except ThycoticTokenRejected:
+            with self.auth_lock:
+                # another thread may already have replaced the rejected token
+                if self.token == token:
+                    self.get_auth(stale_token=token)
+
+        return getattr(self.transport, operation)(self.token, *args)
+
+class ThycoticSecret(object):
+    '''A single secret being managed - its settings, what was found in Secret Server and the outcome.'''
+
+    def __init__(self, spec):
+        """
+        Default constructor
+        Args:
+            spec: dict of SECRET_OPTIONS describing the secret
+
+        Returns: (ThycoticSecret) Instance of the ThycoticSecret class
+        """
+        self.spec = spec
+        self.secret_id = None
+        self.marker = None
+        self.changed = False
+        self.error = None
+        self.created = None
+
+    def result(self):
+        """
+        Build the per-secret portion of the module result
+
+        Returns: (dict) Result for the secret
+        """
+        return dict(
+            secret_name=self.spec['secret_name'],
+            folder_id=self.spec['folder_id'],
+            secret_id=self.secret_id,
+            changed=self.changed,
+            failed=self.error is not None,
+            msg=self.error or ''
+        )
+
+def secret_summaries(result):
+    """
+    Get the secret summaries returned by a search
+    Args:
+        result: result of SearchSecretsByFolder
+
+    Returns: (list) SecretSummary objects
+    """
+    summaries = getattr(result, 'SecretSummaries', None)
+    if not summaries:
+        return []
+
+    return [SecretSummary(summary.SecretId, summary.SecretName, summary.SecretTypeId, summary.FolderId)
+            for summary in getattr(summaries, 'SecretSummary', None) or []]
+
+def search_folder(session, folder_id, search_term):
+    """
+    Search a folder for secrets
+    Args:
+        session: authenticated ThycoticSession
+        folder_id: ID of the folder to search (sub-folders are not included)
+        search_term: text to search secret names for - an empty string lists the entire folder
+
+    Returns: (list) SecretSummary objects found
+    """
+    try:
+        return session.call('search', folder_id, search_term)
+    except ThycoticError as e:
+        raise ThycoticError("Failed to search folder {} - errors: {}".format(folder_id, e))
+
+def ensure_secret(session, record, check_mode, ledger=None):
+    """
+    Create the secret if it does not exist (record.secret_id is None), otherwise update its fields if any
+    of them differ from the requested values - existing secrets the ledger knows to be up to date are not fetched
+    Args:
+        session: authenticated ThycoticSession
+        record: ThycoticSecret to ensure (updated in place)
+        check_mode: whether to only report the changes that would be made
+        ledger: ThycoticLedger to consult and update (None if disabled)
+
+    Returns: None
+    """
+    if ledger is not None and record.secret_id is not None and ledger.unchanged(record):
+        return
+
+    try:
+        ensure_secret_state(session, record, check_mode, ledger)
+    except Exception:
+        if ledger is not None:
+            ledger.forget(record)
+        raise
+
+def ensure_secret_state(session, record, check_mode, ledger):
+    """
+    Fetch and compare (then update) or create the secret - see ensure_secret()
+    Args:
+        session: authenticated ThycoticSession
+        record: ThycoticSecret to ensure (updated in place)
+        check_mode: whether to only report the changes that would be made
+        ledger: ThycoticLedger to record verified and written secrets in (None if disabled)
+
+    Returns: None
+    """
+    spec = record.spec
+
+    if record.secret_id is not None:
+        # found the secret already exists - figure out if it needs to be updated or not
+        try:
+            secret_data = session.call('get_secret', record.secret_id)
+        except ThycoticError as e:
+            raise ThycoticError("Failed to get details of existing Secret with ID {} - errors: {}".format(record.secret_id, e))
 
         # parse each data field for each mapping and ensure values are aligned - if not, update
         need_to_update = False
-        for i, prop in enumerate(secret_data.Secret.Items.SecretItem):
-            # first, ensure the property ID matches what we expect (ensure template has not been changed)
-            if prop.FieldId != module.params["secret_field_ids"][i]:
-                module.fail_json(msg="Failed to assess Secret - field ID {} in position {} does not line up with expected value {}".format(prop.FieldId, i, module.params["secret_field_ids"][i]))
+        values = spec["secret_item_values"]
+        if spec.get("managed_field_ids") is not None:
+            # fields given by name are compared (and updated) by field ID, leaving the other fields as they are
+            desired = dict(zip(spec["secret_field_ids"], spec["secret_item_values"]))
+            current = dict(secret_data.items)
+            absent = [field_id for field_id in spec["managed_field_ids"] if field_id not in current]
+            if absent:
+                raise ThycoticError("Failed to assess Secret - field IDs {} of the template are not part of the Secret".format(absent))
 
-            # convert value to blank string in case None type to enable comparison with provided string values
-            prop.Value = "" if (prop.Value == None) else prop.Value
+            need_to_update = any(current[field_id] != desired[field_id] for field_id in spec["managed_field_ids"])
+            values = [desired[field_id] if field_id in spec["managed_field_ids"] else value for field_id, value in secret_data.items]
+        else:
+            for i, (field_id, value) in enumerate(secret_data.items):
+                # first, ensure the property ID matches what we expect (ensure template has not been changed)
+                if field_id != spec["secret_field_ids"][i]:
+                    raise ThycoticError("Failed to assess Secret - field ID {} in position {} does not line up with expected value {}".format(field_id, i, spec["secret_field_ids"][i]))
 
-            # next, ensure the value is correct - if not, kick out and perform a full update of all fields to be on the safe side
-            if prop.Value != module.params["secret_item_values"][i]:
-                need_to_update = True
-                break
+                # next, ensure the value is correct - if not, kick out and perform a full update of all fields to be on the safe side
+                if value != spec["secret_item_values"][i]:
+                    need_to_update = True
+                    break
 
         # if we need to update the secret, perform a full update of all fields to be on the safe side
         if need_to_update == True:
-            result['changed'] = True
-            update_secret = client.factory.create("UpdateSecret")
-            update_secret.token = token.Token
-            update_secret.secret = secret_data.Secret
-            for i, item in enumerate(module.params["secret_item_values"]):
-                update_secret.secret.Items.SecretItem[i].Value = item
-            update_result = client.service.UpdateSecret(update_secret)
-
-            if (len(update_result.Errors) > 0):
-                module.fail_json(msg="Failed to update Secret with ID {} - errors: {}".format(secret.SecretId, update_result.Errors))
+            record.changed = True
+            if check_mode:
+                return
+
+            try:
+                session.call('update_secret', secret_data, values)
+            except ThycoticError as e:
+                raise ThycoticError("Failed to update Secret with ID {} - errors: {}".format(record.secret_id, e))
+
+        if ledger is not None:
+            ledger.record(record, secret_data)
     else:
         # did not find an existing secret - create new from scratch
         # this implementation is terribly inflexible and confusing needing to specify IDs for various
@@ -206,35 +1458,267 @@ def run_module():
         #
         # There is a Python script in the utils/ directory that allows you to specify a Secret Template ID
         # and will pull the information related to what the field IDs are for the specific template
-        result['changed'] = True
-
-        new_secret = client.factory.create("AddSecret")
-        new_secret.token = token.Token
-        new_secret.secretTypeId = module.params["secret_type_id"]
-        new_secret.secretName = module.params["secret_name"]
-        new_secret.folderId = module.params["folder_id"]
-        new_secret.secretFieldIds = client.factory.create("ArrayOfInt")
-        new_secret.secretFieldIds.int = module.params["secret_field_ids"]
-        new_secret.secretItemValues = client.factory.create("ArrayOfString")
-        new_secret.secretItemValues.string = module.params["secret_item_values"]
+        record.changed = True
+        if check_mode:
+            return
 
         # attempt to create the secret, but thrown an error if something goes wrong
         try:
-            secret = client.service.AddSecret(new_secret)
-            if secret.Errors != "":
-                module.fail_json(msg="Failed to create secret '{}' in Thycotic: {}".format(module.params["secret_name"], secret.Errors[0]))
-            else:
-                result['secret_name'] = secret.Secret.Name
-                result['secret_id'] = secret.Secret.Id
-                result['folder_id'] = secret.Secret.FolderId
+            secret = session.call('add_secret', spec)
+        except Exception as e:
+            raise ThycoticError("Failed to create secret '{}' in Thycotic: {}".format(spec["secret_name"], e))
+
+        record.created = secret
+        record.secret_id = secret.secret_id
+        if ledger is not None:
+            ledger.record(record, secret)
+
+def run_secret_step(step):
+    """
+    Wrap a per-secret step for use in a thread pool so that failures are recorded against the secret
+    rather than aborting the entire batch
+    Args:
+        step: function taking a ThycoticSecret instance
+
+    Returns: (function) Wrapped step
+    """
+    def wrapper(record):
+        if record.error is not None:
+            return
+        try:
+            step(record)
         except Exception as e:
-            module.fail_json(msg="Failed to create secret '{}' in Thycotic: {}".format(module.params["secret_name"], e))
+            record.error = str(e)
+
+    return wrapper
+
+def run_batch(module, session, specs, result, ledger, catalog):
+    """
+    Manage a batch of secrets - each folder involved is listed once to find the existing secrets, then the
+    reads and writes needed run concurrently
+    Args:
+        module: AnsibleModule instance
+        session: authenticated ThycoticSession shared by all secrets
+        specs: list of secret specifications (dicts of SECRET_OPTIONS)
+        result: module result dict to update
+        ledger: ThycoticLedger of verified secrets (None if disabled)
+        catalog: ThycoticTemplateCatalog to resolve template and field names with
+
+    Returns: None (exits the module)
+    """
+    records = [ThycoticSecret(spec) for spec in specs]
+    for record in records:
+        try:
+            resolve_secret_fields(session, catalog, record.spec)
+        except ThycoticError as e:
+            record.error = str(e)
+
+    folder_ids = []
+    for record in records:
+        if record.spec['folder_id'] not in folder_ids:
+            folder_ids.append(record.spec['folder_id'])
+
+    pool = ThreadPool(max(1, min(module.params['batch_concurrency'], len(records))))
+    try:
+        # name -> summary index of every folder involved (the first secret listed wins for duplicated names)
+        folders = {}
+        listings = pool.map(lambda folder_id: folder_listing(session, folder_id), folder_ids)
+        for folder_id, listing in zip(folder_ids, listings):
+            folders[folder_id] = listing
+
+        for record in records:
+            listing = folders[record.spec['folder_id']]
+            if record.error is not None:
+                continue
+            elif isinstance(listing, Exception):
+                record.error = str(listing)
+            elif record.spec['secret_name'] in listing:
+                record.secret_id = listing[record.spec['secret_name']].secret_id
+                record.marker = secret_marker(listing[record.spec['secret_name']])
+
+        pool.map(run_secret_step(lambda r: ensure_secret(session, r, module.check_mode, ledger)), records)
+    finally:
+        pool.close()
+        pool.join()
+        if ledger is not None:
+            ledger.flush()
+
+    result['secrets'] = [r.result() for r in records]
+    result['changed'] = any(r.changed for r in records)
+    result['timings'] = TIMINGS.summary()
+
+    failures = [r for r in records if r.error is not None]
+    if failures:
+        module.fail_json(msg="Failed to manage %s of %s secrets" % (len(failures), len(records)), **result)
+
+    module.exit_json(**result)
+
+def folder_listing(session, folder_id):
+    """
+    Index the secrets of a folder by name
+    Args:
+        session: authenticated ThycoticSession
+        folder_id: ID of the folder
+
+    Returns: (dict) Secret name -> SecretSummary, or the exception raised if the folder could not be listed
+    """
+    try:
+        listing = {}
+        for summary in search_folder(session, folder_id, ""):
+            listing.setdefault(summary.name, summary)
+        return listing
+    except Exception as e:
+        return e
+
+def run_module():
+    # available options for the module
+    module_args = dict(
+        folder_id=dict(type="int"),
+        secret_type_id=dict(type="int"),
+        secret_name=dict(type="str"),
+        secret_content=dict(type="str"),
+        secret_field_ids=dict(type="list"),
+        secret_item_values=dict(type="list"),
+        secrets=dict(type="list"),
+        batch_concurrency=dict(type="int", default=10),
+        thycotic_wsdl_url=dict(type="str", required=True),
+        thycotic_auth_username=dict(type="str", required=True),
+        thycotic_auth_password=dict(type="str", required=True, no_log=True),
+        thycotic_auth_domain=dict(type="str", required=True),
+        cache_dir=dict(type="path", default="~/.ansible/cache/thycotic_secret"),
+        token_cache=dict(type="bool", default=True),
+        token_cache_key=dict(type="str", required=False, no_log=True),
+        wsdl_cache_ttl=dict(type="int", default=86400),
+        thycotic_transport=dict(type="str", default="soap", choices=["soap", "rest"]),
+        thycotic_api_url=dict(type="str", required=False),
+        secret_ledger=dict(type="bool", default=False),
+        secret_ledger_ttl=dict(type="int", default=3600),
+        secret_template_name=dict(type="str"),
+        secret_fields=dict(type="dict"),
+        template_cache_ttl=dict(type="int", default=86400),
+        broker_socket=dict(type="path", default=BROKER_SOCKET)
+    )
+
+    # seed result dict that is returned
+    result = dict(
+        changed=False,
+        failed=False
+    )
+
+    # default Ansible constructor
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[['secrets', 'secret_name'], ['secret_type_id', 'secret_template_name'],
+                            ['secret_fields', 'secret_field_ids'], ['secret_fields', 'secret_item_values']],
+        required_one_of=[['secrets', 'secret_name']],
+        supports_check_mode=True
+    )
+
+    # secret settings given at the top level act as defaults for each entry in 'secrets'
+    defaults = dict((option, module.params[option]) for option in SECRET_OPTIONS)
+    specs = []
+    seen = set()
+    for entry in (module.params['secrets'] or [defaults]):
+        if not isinstance(entry, dict):
+            module.fail_json(msg="Each entry in 'secrets' must be a dictionary of secret settings")
+
+        given = dict((k, v) for k, v in entry.items() if k in SECRET_OPTIONS and v is not None)
+        spec = dict(defaults)
+        for by_id, by_name in SECRET_ALTERNATIVES:
+            if any(k in given for k in by_id) and any(k in given for k in by_name):
+                module.fail_json(msg="Secret '%s' may not give both %s and %s" % (given.get('secret_name'), "/".join(by_id), "/".join(by_name)))
+            # only the other form is reset, so that e.g. top-level secret_field_ids still apply to an entry
+            # giving its own secret_item_values
+            if any(k in given for k in by_name):
+                spec.update(dict.fromkeys(by_id))
+            elif any(k in given for k in by_id):
+                spec.update(dict.fromkeys(by_name))
+        spec.update(given)
+
+        missing = [option for option in ('folder_id', 'secret_name', 'secret_content') if spec[option] is None]
+        for by_id, by_name in SECRET_ALTERNATIVES:
+            if all(spec[k] is None for k in by_name):
+                missing.extend([option for option in by_id if spec[option] is None])
+        if missing:
+            module.fail_json(msg="Missing required secret settings for '%s': %s" % (spec['secret_name'], ", ".join(missing)))
+
+        if spec['secret_fields'] is not None and not isinstance(spec['secret_fields'], dict):
+            module.fail_json(msg="The secret_fields of '%s' must be a dictionary of field name to value" % (spec['secret_name']))
+
+        try:
+            spec['folder_id'] = int(spec['folder_id'])
+            if spec['secret_type_id'] is not None:
+                spec['secret_type_id'] = int(spec['secret_type_id'])
+        except (TypeError, ValueError):
+            module.fail_json(msg="The folder_id and secret_type_id of '%s' must be integers" % (spec['secret_name']))
+
+        if (spec['folder_id'], spec['secret_name']) in seen:
+            module.fail_json(msg="Secret '%s' is given more than once for folder %s" % (spec['secret_name'], spec['folder_id']))
+        seen.add((spec['folder_id'], spec['secret_name']))
+        specs.append(spec)
+
+    # create the client for the selected transport
+    transport = create_transport(module)
+
+    try:
+        # get an auth token (re-using a cached one where possible)
+        session = ThycoticSession(module, transport)
+    except ThycoticError as e:
+        module.fail_json(msg=str(e))
+
+    ledger = None
+    if module.params['secret_ledger']:
+        ledger = ThycoticLedger(os.path.expanduser(module.params['cache_dir']),
+                                module.params['token_cache_key'] or module.params['thycotic_auth_password'],
+                                module.params['secret_ledger_ttl'],
+                                module.params['thycotic_wsdl_url'],
+                                module.params['thycotic_auth_username'],
+                                module.params['thycotic_auth_domain'])
+
+    catalog = ThycoticTemplateCatalog(os.path.expanduser(module.params['cache_dir']),
+                                      module.params['template_cache_ttl'],
+                                      transport.service_url,
+                                      module.params['thycotic_auth_username'],
+                                      module.params['thycotic_auth_domain'])
+
+    if module.params['secrets']:
+        run_batch(module, session, specs, result, ledger, catalog)
+
+    record = ThycoticSecret(specs[0])
+    try:
+        resolve_secret_fields(session, catalog, record.spec)
+
+        # first, inspect whether the secret exists - and if so, check whether the fields just need to be updated
+        # TODO: This will grab the first result, but if there are duplicates, this
+        #       logic is likely to have issues since you won't know which instance you're grabbing
+        summaries = search_folder(session, record.spec["folder_id"], record.spec["secret_name"])
+        if len(summaries) > 0:
+            record.secret_id = summaries[0].secret_id
+            record.marker = secret_marker(summaries[0])
+
+        ensure_secret(session, record, module.check_mode, ledger)
+    except ThycoticError as e:
+        module.fail_json(msg=str(e))
+    finally:
+        if ledger is not None:
+            ledger.flush()
+
+    result['changed'] = record.changed
+    if record.created is not None:
+        result['secret_name'] = record.created.name
+        result['secret_id'] = record.created.secret_id
+        result['folder_id'] = record.created.folder_id
 
     # successful run
+    result['timings'] = TIMINGS.summary()
     module.exit_json(**result)
 
 def main():
-    run_module()
+    TIMINGS.start_profile()
+    try:
+        run_module()
+    finally:
+        TIMINGS.write_trace()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,502 @@
+DOCUMENTATION = '''
+---
+name: thycotic_secret
+plugin_type: lookup
+
+short_description: Read secrets from Thycotic Secret Server
+
+version_added: "2.6"
+
+description:
+    - "Returns the value of a field (or every field, as a dictionary) of each named secret in a Secret Server folder"
+    - "Secrets are memoized for the life of the process and, encrypted, in C(cache_dir) for C(cache_ttl) seconds so
+      that the worker processes of every host in a play share a single fetch of each secret - a whole folder can be
+      prefetched in one pass with C(prefetch)"
+    - "Authentication tokens and the parsed WSDL are shared with the thycotic_secret module through the same caches"
+
+options:
+    _terms:
+        description:
+            - Names of the secrets to read (matched exactly within the folder)
+        required: true
+    folder_id:
+        description:
+            - ID of the folder the secrets are stored in
+        type: int
+        required: true
+    field:
+        description:
+            - Name (or display name) of the field to return - every field is returned as a dictionary when not given
+        type: str
+        required: false
+    prefetch:
+        description:
+            - Whether to read every secret in the folder on the first lookup of the folder, so that later lookups of any
+              secret in it are served from the cache
+        type: bool
+        default: false
+    prefetch_concurrency:
+        description:
+            - Number of secrets read in parallel when prefetching a folder
+        type: int
+        default: 8
+    cache_dir:
+        description:
+            - Directory on the controller used to store state shared between processes (shared with the thycotic_secret
+              module)
+        type: path
+        default: "~/.ansible/cache/thycotic_secret"
+    cache_ttl:
+        description:
+            - Number of seconds secrets read by one process are shared (encrypted) with the others through C(cache_dir) - a
+              value of 0 keeps them in the memory of the reading process only
+        type: int
+        default: 300
+    token_cache:
+        description:
+            - Whether to share authentication tokens with other processes (and the thycotic_secret module) via C(cache_dir)
+        type: bool
+        default: true
+    token_cache_key:
+        description:
+            - Secret the key used to encrypt cached tokens and secrets (and to sign the cached parsed WSDL) is derived from -
+              defaults to C(thycotic_auth_password)
+        type: str
+        required: false
+        vars:
+            - name: thycotic_token_cache_key
+    wsdl_cache_ttl:
+        description:
+            - Number of seconds to trust the copy of the WSDL cached in C(cache_dir) (shared with the thycotic_secret module)
+              before checking whether it changed - a value of 0 disables the WSDL cache
+        type: int
+        default: 86400
+    thycotic_wsdl_url:
+        description:
+            - Full path/URL to the Thycotic WSDL
+        type: str
+        required: true
+        vars:
+            - name: thycotic_wsdl_url
+        env:
+            - name: THYCOTIC_WSDL_URL
+    thycotic_auth_username:
+        description:
+            - Username for the account to authenticate against Secret Server
+        type: str
+        required: true
+        vars:
+            - name: thycotic_auth_username
+        env:
+            - name: THYCOTIC_AUTH_USERNAME
+    thycotic_auth_password:
+        description:
+            - Password for the account to authenticate against Secret Server
+        type: str
+        required: true
+        vars:
+            - name: thycotic_auth_password
+        env:
+            - name: THYCOTIC_AUTH_PASSWORD
+    thycotic_auth_domain:
+        description:
+            - Domain for the account to authenticate against Secret Server
+        type: str
+        required: true
+        vars:
+            - name: thycotic_auth_domain
+        env:
+            - name: THYCOTIC_AUTH_DOMAIN
+
+requirements:
+    - cryptography
+    - suds
+
+author:
+    - Justin Karimi (@jekhokie) <jekhokie@gmail.com>
+'''
+
+EXAMPLES = '''
+# connection settings are taken from the thycotic_wsdl_url, thycotic_auth_username, thycotic_auth_password
+# and thycotic_auth_domain variables (or THYCOTIC_* environment variables) unless given to the lookup
+- name: Configure the application database password
+  template:
+    src: app.conf.j2
+    dest: /etc/app/app.conf
+  vars:
+    db_password: "{{ lookup('thycotic_secret', 'svc-app-db', folder_id=123, field='Password') }}"
+
+- name: Read every field of two secrets, prefetching the whole folder for the other hosts of the play
+  debug:
+    msg: "{{ lookup('thycotic_secret', 'svc-app-1', 'svc-app-2', folder_id=123, prefetch=true, wantlist=true) }}"
+'''
+
+RETURN = '''
+_raw:
+    description: Value of C(field) for each secret, or a dictionary of field name to value if C(field) is not given
+    type: list
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+from ansible.errors import AnsibleError
+from ansible.module_utils.thycotic_cache import HAS_CRYPTOGRAPHY, ThycoticEncryptedCacheFile, ThycoticTokenCache
+from ansible.module_utils.thycotic_soap import soap_errors, token_rejected
+from ansible.plugins.lookup import LookupBase
+from ansible.utils.display import Display
+from multiprocessing.pool import ThreadPool
+
+try:
+    from ansible.module_utils.thycotic_wsdl import ThycoticWSDLCache, wsdl_client
+    HAS_SUDS = True
+except ImportError:
+    HAS_SUDS = False
+
+display = Display()
+
+# readers (authenticated clients and memoized secrets) by connection - kept for the life of the process
+READERS = {}
+READERS_LOCK = threading.Lock()
+
+class FolderCache(ThycoticEncryptedCacheFile):
+    '''Secrets of a folder read by any process, shared (encrypted) for cache_ttl seconds.'''
+
+    def __init__(self, cache_dir, secret, ttl, wsdl_url, username, domain, folder_id):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the secrets in
+            secret: secret the encryption key is derived from
+            ttl: number of seconds a secret read by one process is served to others
+            wsdl_url: WSDL URL of the Secret Server instance
+            username: user the secrets are read as
+            domain: domain of the user
+            folder_id: ID of the folder
+
+        Returns: (FolderCache) Instance of the FolderCache class
+        """
+        super(FolderCache, self).__init__(cache_dir, secret, "lookup", wsdl_url, username, domain, folder_id)
+        self.ttl = ttl
+
+    def read(self):
+        """
+        Read the secrets that are still fresh
+
+        Returns: (tuple) Dict of secret name -> secret, and whether the whole folder was listed (so that a name missing
+                 from it does not exist)
+        """
+        document = self.load()
+        data = self.decrypt(document, 'secrets')
+        if data is None:
+            return {}, False
+
+        now = time.time()
+        secrets = dict((name, secret) for name, secret in json.loads(data).items() if now - secret['fetched'] < self.ttl)
+        return secrets, now - (document.get('listed') or 0) < self.ttl
+
+    def write(self, secrets, listed=False):
+        """
+        Merge newly-read secrets into the document - callers should hold the lock
+        Args:
+            secrets: dict of secret name -> secret
+            listed: whether the secrets are the complete contents of the folder
+
+        Returns: None
+        """
+        document = self.load() or {}
+        merged = {}
+        if not listed:
+            merged = json.loads(self.decrypt(document, 'secrets') or "{}")
+        merged.update(secrets)
+
+        self.encrypt(document, 'secrets', json.dumps(merged))
+        if listed:
+            document['listed'] = time.time()
+        self.store(document)
+
+class SecretReader(object):
+    '''Authenticated Secret Server client and memoized secrets for one connection (WSDL URL, username and domain)
+    - shared by every lookup in the process and created lazily, so lookups served from the cache never log in.'''
+
+    def __init__(self, options):
+        """
+        Default constructor
+        Args:
+            options: dict of lookup options
+
+        Returns: (SecretReader) Instance of the SecretReader class
+        """
+        self.options = options
+        self.client = None
+        self.token = None
+        self.memo = {}
+
+        # the memo lock is held while secrets are read by the worker threads, which take the token lock (never the
+        # memo lock) to log in again when the token expires mid-read
+        self.memo_lock = threading.Lock()
+        self.token_lock = threading.Lock()
+        self.cache_dir = os.path.expanduser(options['cache_dir'])
+        self.cache_key = options['token_cache_key'] or options['thycotic_auth_password']
+
+        self.token_cache = None
+        if options['token_cache'] and HAS_CRYPTOGRAPHY:
+            self.token_cache = ThycoticTokenCache(self.cache_dir, self.cache_key, options['thycotic_wsdl_url'],
+                                                  options['thycotic_auth_username'], options['thycotic_auth_domain'])
+
+    @classmethod
+    def for_options(cls, options):
+        """
+        Get the reader for a connection, creating it on first use
+        Args:
+            options: dict of lookup options
+
+        Returns: (SecretReader) Reader shared by every lookup of the connection in this process
+        """
+        key = (options['thycotic_wsdl_url'], options['thycotic_auth_username'], options['thycotic_auth_domain'],
+               hashlib.sha256((options['thycotic_auth_password'] or "").encode('utf-8')).hexdigest())
+        with READERS_LOCK:
+            if key not in READERS:
+                READERS[key] = cls(options)
+            return READERS[key]
+
+    def connect(self):
+        """
+        Create the SOAP client and get a token - only done once a secret has to be read from Secret Server
+
+        Returns: None
+        """
+        if self.client is not None:
+            return
+
+        if not HAS_SUDS:
+            raise AnsibleError("The thycotic_secret lookup requires the suds library")
+
+        wsdl_url = self.options['thycotic_wsdl_url']
+        cache = None
+        if self.options['wsdl_cache_ttl'] > 0:
+            try:
+                cache = ThycoticWSDLCache(self.cache_dir, self.options['wsdl_cache_ttl'], wsdl_url, self.cache_key)
+            except Exception as e:
+                display.warning("WSDL cache disabled - could not use cache directory %s: %s" % (self.cache_dir, e))
+
+        try:
+            self.client = wsdl_client(wsdl_url, cache)
+        except Exception as e:
+            raise AnsibleError("Failed to load the WSDL %s: %s" % (self.options['thycotic_wsdl_url'], e))
+        self.get_auth()
+
+    def get_auth(self, stale_token=None):
+        """
+        Get a token - shared with other processes and the thycotic_secret module via the token cache (if enabled)
+        Args:
+            stale_token: token that Secret Server rejected and which must not be re-used
+
+        Returns: None (updates the reader token)
+        """
+        if self.token_cache is None:
+            self.token = self.authenticate()
+            return
+
+        self.token = self.token_cache.get_token(self.authenticate, self.token_is_valid, stale_token)
+
+    def token_is_valid(self, token):
+        """
+        Check whether Secret Server still accepts a token
+        Args:
+            token: token to check
+
+        Returns: (bool) True if the token is valid
+        """
+        return not soap_errors(self.client.service.GetTokenIsValid(token))
+
+    def authenticate(self):
+        """
+        Log in to Secret Server and get a new token
+
+        Returns: (str) Token
+        """
+        result = self.client.service.Authenticate(self.options['thycotic_auth_username'],
+                                                  self.options['thycotic_auth_password'],
+                                                  "",
+                                                  self.options['thycotic_auth_domain'])
+
+        errors = soap_errors(result)
+        if errors or not getattr(result, 'Token', None):
+            raise AnsibleError("Failed to authenticate against Secret Server: %s" % (", ".join(errors)))
+
+        return result.Token
+
+    def call(self, name, **fields):
+        """
+        Invoke a SOAP operation with the reader token, logging in again and retrying once if the token is rejected
+        Args:
+            name: name of the operation
+            fields: fields of the request (other than the token)
+
+        Returns: Result of the operation
+        """
+        request = self.client.factory.create(name)
+        for field, value in fields.items():
+            setattr(request, field, value)
+
+        for attempt in range(2):
+            token = request.token = self.token
+            result = getattr(self.client.service, name)(request)
+            if attempt or not token_rejected(soap_errors(result)):
+                return result
+
+            with self.token_lock:
+                if self.token == token:
+                    self.get_auth(stale_token=token)
+
+    def search(self, folder_id, search_term):
+        """
+        Search a folder for secrets
+        Args:
+            folder_id: ID of the folder to search (sub-folders are not included)
+            search_term: text to search secret names for - an empty string lists the entire folder
+
+        Returns: (list) SecretSummary objects found
+        """
+        result = self.call("SearchSecretsByFolder", searchTerm=search_term, folderId=folder_id, includeSubFolders=False,
+                           includeDeleted=False, includeRestricted=False)
+
+        errors = soap_errors(result)
+        if errors:
+            raise AnsibleError("Failed to search folder %s - errors: %s" % (folder_id, errors[0]))
+
+        summaries = getattr(result, 'SecretSummaries', None)
+        return list(getattr(summaries, 'SecretSummary', None) or []) if summaries else []
+
+    def fetch(self, secret_id):
+        """
+        Read a secret
+        Args:
+            secret_id: ID of the secret
+
+        Returns: (dict) Secret name, ID, fields and the time it was read
+        """
+        result = self.call("GetSecret", secretId=secret_id, loadSettingsAndPermissions=False)
+
+        errors = soap_errors(result)
+        if errors:
+            raise AnsibleError("Failed to get details of Secret with ID %s - errors: %s" % (secret_id, errors[0]))
+
+        return {
+            'id': result.Secret.Id,
+            'fields': [[item.FieldName, getattr(item, 'FieldDisplayName', None), "" if item.Value is None else item.Value]
+                       for item in result.Secret.Items.SecretItem],
+            'fetched': time.time()
+        }
+
+    def read(self, folder_id, names, prefetch):
+        """
+        Read secrets from Secret Server - either the named secrets or, when prefetching, the whole folder
+        Args:
+            folder_id: ID of the folder
+            names: names of the secrets needed
+            prefetch: whether to read every secret in the folder
+
+        Returns: (tuple) Dict of secret name -> secret read, and whether it holds the entire folder
+        """
+        self.connect()
+
+        if prefetch:
+            summaries = self.search(folder_id, "")
+        else:
+            summaries = []
+            for name in names:
+                summaries.extend([s for s in self.search(folder_id, name) if s.SecretName == name][:1])
+
+        # the first secret listed wins for duplicated names
+        wanted = {}
+        for summary in summaries:
+            wanted.setdefault(summary.SecretName, summary.SecretId)
+
+        pool = ThreadPool(max(1, min(self.options['prefetch_concurrency'], len(wanted) or 1)))
+        try:
+            fetched = pool.map(self.fetch, list(wanted.values()))
+        finally:
+            pool.close()
+            pool.join()
+
+        return dict(zip(wanted.keys(), fetched)), prefetch
+
+    def get(self, folder_id, names, prefetch):
+        """
+        Get secrets from the process memo, the shared cache or (under the cache lock, so that only one process
+        reads a folder at a time) from Secret Server
+        Args:
+            folder_id: ID of the folder
+            names: names of the secrets
+            prefetch: whether to read every secret in the folder on a miss
+
+        Returns: (dict) Secret name -> secret for every name found
+        """
+        with self.memo_lock:
+            memo = self.memo.setdefault(folder_id, {'secrets': {}, 'listed': False})
+            missing = [name for name in names if name not in memo['secrets']]
+            if not missing or memo['listed']:
+                return memo['secrets']
+
+            cache = None
+            if self.options['cache_ttl'] > 0 and HAS_CRYPTOGRAPHY:
+                cache = FolderCache(self.cache_dir, self.cache_key, self.options['cache_ttl'], self.options['thycotic_wsdl_url'],
+                                    self.options['thycotic_auth_username'], self.options['thycotic_auth_domain'], folder_id)
+
+            if cache is None:
+                secrets, listed = self.read(folder_id, missing, prefetch)
+            else:
+                with cache.lock():
+                    secrets, listed = cache.read()
+                    missing = [name for name in missing if name not in secrets]
+                    if missing and not listed:
+                        found, listed = self.read(folder_id, missing, prefetch)
+                        cache.write(found, listed)
+                        secrets.update(found)
+
+            memo['secrets'].update(secrets)
+            memo['listed'] = memo['listed'] or listed
+            return memo['secrets']
+
+class LookupModule(LookupBase):
+    '''Lookup plugin reading secrets from Thycotic Secret Server.'''
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        options = dict((name, self.get_option(name)) for name in (
+            'folder_id', 'field', 'prefetch', 'prefetch_concurrency', 'cache_dir', 'cache_ttl', 'token_cache',
+            'token_cache_key', 'wsdl_cache_ttl', 'thycotic_wsdl_url', 'thycotic_auth_username', 'thycotic_auth_password', 'thycotic_auth_domain'))
+
+        for name in ('folder_id', 'thycotic_wsdl_url', 'thycotic_auth_username', 'thycotic_auth_password', 'thycotic_auth_domain'):
+            if options[name] is None:
+                raise AnsibleError("The thycotic_secret lookup requires '%s'" % (name))
+
+        reader = SecretReader.for_options(options)
+        try:
+            secrets = reader.get(options['folder_id'], terms, options['prefetch'])
+        except AnsibleError:
+            raise
+        except Exception as e:
+            raise AnsibleError("Failed to read secrets from Secret Server: %s" % (e))
+
+        values = []
+        for term in terms:
+            if term not in secrets:
+                raise AnsibleError("No Secret with name '%s' found in folder with ID %s" % (term, options['folder_id']))
+
+            fields = secrets[term]['fields']
+            if options['field'] is None:
+                values.append(dict((name, value) for name, _, value in fields))
+                continue
+
+            matches = [value for name, display_name, value in fields
+                       if options['field'].lower() in ((name or "").lower(), (display_name or "").lower())]
+            if not matches:
+                raise AnsibleError("Secret '%s' has no field '%s'" % (term, options['field']))
+            values.append(matches[0])
+
+        return values
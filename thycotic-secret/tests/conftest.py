@@ -0,0 +1,15 @@
+# Purpose: Test set-up - the tests import the module utilities and plugins of the checkout and run the module
+# against the mock Secret Server of the benchmarks, so both are made importable here, once, through the
+# development launcher.
+
+import os
+import sys
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+os.environ['ANSIBLE_MODULE_UTILS'] = os.pathsep.join([os.path.join(BASE, '../lib/ansible/module_utils'),
+                                                      os.path.join(BASE, '../../module-utils/lib/ansible/module_utils')])
+sys.path.insert(0, os.path.join(BASE, '../../module-utils/hacking'))
+sys.path.insert(0, os.path.join(BASE, '../benchmarks'))
+
+import sitecustomize  # noqa: E402 - registers the module utilities of ANSIBLE_MODULE_UTILS
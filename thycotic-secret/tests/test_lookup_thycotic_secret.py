@@ -0,0 +1,45 @@
+# Purpose: Tests for the thycotic_secret lookup plugin, run against the mock Secret Server of the benchmarks.
+
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from ansible.plugins.loader import lookup_loader
+from mock_thycotic import PASSWORD, MockThycoticServer
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/ansible/plugins/lookup')
+
+@pytest.fixture
+def lookup_module():
+    lookup_loader.add_directory(PLUGIN_DIR)
+    return lookup_loader.get('thycotic_secret')
+
+@pytest.fixture
+def cache_dir():
+    cache_dir = tempfile.mkdtemp()
+    os.chmod(cache_dir, 0o700)
+    yield cache_dir
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+@pytest.mark.parametrize("token_cache", [False, True])
+def test_token_expiring_during_prefetch(lookup_module, cache_dir, token_cache):
+    server = MockThycoticServer(secrets=90, latency=0.05, token_ttl=0.5, wsdl_operations=0).start()
+    try:
+        values = []
+        thread = threading.Thread(target=lambda: values.extend(lookup_module.run(
+            ["existing-00000"], {}, folder_id=10, prefetch=True, prefetch_concurrency=4, cache_dir=cache_dir, cache_ttl=0,
+            token_cache=token_cache, wsdl_cache_ttl=0, thycotic_wsdl_url=server.wsdl_url,
+            thycotic_auth_username="automation-user", thycotic_auth_password=PASSWORD, thycotic_auth_domain="local")))
+        thread.daemon = True
+        thread.start()
+        thread.join(60)
+
+        assert not thread.is_alive(), "the lookup deadlocked"
+        assert values[0]['Password'] == "password-0"
+        assert server.state.stats['operations']['soap GetSecret'] >= 30
+        assert server.state.stats['operations']['soap Authenticate'] > 1
+    finally:
+        server.stop()
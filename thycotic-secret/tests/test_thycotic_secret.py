@@ -0,0 +1,73 @@
+# Purpose: Tests for the thycotic_secret module, run against the mock Secret Server of the benchmarks.
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from bench_thycotic_secret import module_args, run_tasks, secret_entries
+from mock_thycotic import MockThycoticServer
+
+@pytest.fixture
+def server():
+    server = MockThycoticServer(secrets=20, wsdl_operations=0).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def work_dir():
+    work_dir = tempfile.mkdtemp()
+    os.chmod(work_dir, 0o700)
+    yield work_dir
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_module(server, work_dir, entries, **extra_args):
+    """
+    Run the module once for a batch of secrets and get its result
+    """
+    server.state.reset_stats()
+    args = module_args(server, os.path.join(work_dir, "cache"), "soap", dict(extra_args, secrets=entries))
+    return run_tasks([args], work_dir)[0]['result']
+
+def test_ledger_skips_fetching_verified_secrets(server, work_dir):
+    entries = secret_entries(6, 'converge', 'ledger')
+
+    first = run_module(server, work_dir, entries, secret_ledger=True)
+    assert not first.get('failed'), first.get('msg')
+    assert server.state.stats['operations'].get('soap GetSecret') == 6
+
+    second = run_module(server, work_dir, entries, secret_ledger=True)
+    assert not second.get('failed'), second.get('msg')
+    assert second['changed'] is False
+    assert 'soap GetSecret' not in server.state.stats['operations']
+
+def test_ledger_notices_changed_values(server, work_dir):
+    entries = secret_entries(6, 'converge', 'ledger')
+    run_module(server, work_dir, entries, secret_ledger=True)
+
+    entries[0] = dict(entries[0], secret_item_values=entries[0]['secret_item_values'][:2] + ["changed", ""])
+    result = run_module(server, work_dir, entries, secret_ledger=True)
+
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed'] is True
+    assert server.state.stats['operations'].get('soap GetSecret') == 1
+    assert server.state.stats['operations'].get('soap UpdateSecret') == 1
+
+def test_ledger_is_not_used_with_another_key(server, work_dir):
+    entries = secret_entries(6, 'converge', 'ledger')
+    run_module(server, work_dir, entries, secret_ledger=True)
+
+    result = run_module(server, work_dir, entries, secret_ledger=True, token_cache_key="another key")
+
+    assert not result.get('failed'), result.get('msg')
+    assert server.state.stats['operations'].get('soap GetSecret') == 6
+
+def test_ledger_disabled_fetches_every_secret(server, work_dir):
+    entries = secret_entries(6, 'converge', 'ledger')
+    run_module(server, work_dir, entries)
+
+    result = run_module(server, work_dir, entries)
+
+    assert not result.get('failed'), result.get('msg')
+    assert server.state.stats['operations'].get('soap GetSecret') == 6
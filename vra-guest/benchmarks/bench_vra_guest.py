@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#
+# Purpose: Benchmark the vra_guest module against the local mock vRA server in
+# 'mock_vra.py' - reports wall time, HTTP calls, bytes transferred and peak RSS per
+# task for a range of concurrent host counts.
+#
+# Requirements:
+#  - The module dependencies (ansible, requests) must be installed - remember to
+#    install dependencies prior to running this file
+#      pip install -r requirements.txt
+#  - The openssl binary must be available (used for the mock server certificate)
+#
+# Parameters:
+#  - 'hosts': Comma-separated list of concurrent host counts to run (default 1,50,500)
+#  - 'machines': Number of pre-existing machines in the mock tenant (1000-50000)
+#  - 'latency': Seconds of latency added to every mock response
+#  - 'build-time': Seconds a mock build request takes to complete
+#  - 'max-rps': Calls per second the mock serves before answering 429 (0 for unlimited)
+#  - 'modes': Comma-separated list of 'forks' (one module process per host, as Ansible
+#             forks would run it) and/or 'batch' (one module process using 'guests')
+#  - 'extra-args': JSON object of additional module arguments (e.g. '{"engine": "asyncio"}')
+#  - 'state': 'present' to provision new hosts or 'absent' to destroy pre-existing machines
+#             (requires at least as many 'machines' as the total number of hosts run)
+#
+# Example:
+#    python benchmarks/bench_vra_guest.py --hosts 1,50 --machines 10000 --latency 0.02
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_vra import BLUEPRINT_INSTANCE_ID, BLUEPRINT_NAME, MockVRAServer
+
+MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/ansible/modules/cloud/vmware/vra_guest.py')
+
+# the modules load the module utilities of the checkout through the development launcher (see module-utils/hacking)
+MODULE_ENV = dict(os.environ,
+                  ANSIBLE_MODULE_UTILS=os.pathsep.join([
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/ansible/module_utils'),
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../module-utils/lib/ansible/module_utils')]),
+                  PYTHONPATH=os.pathsep.join(
+                      [os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../module-utils/hacking')] +
+                      [path for path in os.environ.get('PYTHONPATH', '').split(os.pathsep) if path]))
+
+def module_args(server, cache_dir, extra_args):
+    """
+    Build the module arguments common to every task
+    """
+    args = {
+        "blueprint_instance_id": BLUEPRINT_INSTANCE_ID,
+        "blueprint_name": BLUEPRINT_NAME,
+        "cpu": 2,
+        "extra_disks": [{"size_gb": 12, "mount_point": "/a"}, {"size_gb": 5, "mount_point": "/b"}],
+        "memory": 4096,
+        "network_adapter": "network-adapter-name",
+        "vra_hostname": server.address,
+        "vra_password": "super-secret-pass",
+        "vra_tenant": "vsphere.local",
+        "vra_username": "automation-user",
+        "cache_dir": cache_dir,
+        "wait_timeout": 600
+    }
+    args.update(extra_args)
+    return args
+
+def run_tasks(task_args, work_dir, module=MODULE):
+    """
+    Run one module process per set of arguments concurrently
+    Args:
+        task_args: list of module argument dicts
+        work_dir: directory to write argument files to
+        module: path of the module to run (vra_guest by default)
+
+    Returns: (list) Dict per task with 'wall', 'rss_mb' and the module 'result'
+    """
+    processes = {}
+    for i, args in enumerate(task_args):
+        args_file = os.path.join(work_dir, "args-%s.json" % (i))
+        with open(args_file, 'w') as f:
+            json.dump({"ANSIBLE_MODULE_ARGS": args}, f)
+
+        out = tempfile.TemporaryFile()
+        process = subprocess.Popen([sys.executable, module, args_file], stdout=out, stderr=subprocess.STDOUT,
+                                   env=MODULE_ENV)
+        processes[process.pid] = {'process': process, 'out': out, 'start': time.time()}
+
+    tasks = []
+    while processes:
+        pid, status, rusage = os.wait4(-1, 0)
+        if pid not in processes:
+            continue
+
+        task = processes.pop(pid)
+        task['process'].returncode = status
+        task['out'].seek(0)
+        output = task['out'].read().decode('utf-8', 'replace')
+        try:
+            result = json.loads(output)
+        except ValueError:
+            result = {'failed': True, 'msg': output[-500:]}
+
+        # ru_maxrss is reported in KB on linux and bytes on macOS
+        rss = rusage.ru_maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rusage.ru_maxrss / 1024.0
+        tasks.append({'wall': time.time() - task['start'], 'rss_mb': rss, 'result': result})
+
+    return tasks
+
+def run_scenario(server, hosts, mode, extra_args, run_id, destroy_offset=None):
+    """
+    Run a single benchmark scenario against a freshly-reset mock server
+    Args:
+        server: MockVRAServer instance
+        hosts: number of hosts to provision (or destroy)
+        mode: 'forks' or 'batch'
+        extra_args: additional module arguments
+        run_id: unique prefix for the hostnames of this scenario
+        destroy_offset: index of the first pre-existing machine to destroy (provisions new hosts if None)
+
+    Returns: (dict) Scenario measurements
+    """
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, "cache")
+    if destroy_offset is None:
+        hostnames = ["%s-%s-%05d" % (run_id, mode, i) for i in range(hosts)]
+    else:
+        hostnames = ["existing-vm-%05d" % (i) for i in range(destroy_offset, destroy_offset + hosts)]
+        extra_args = dict(extra_args, state='absent')
+
+    try:
+        server.state.reset_stats()
+        start = time.time()
+        if mode == 'forks':
+            tasks = run_tasks([dict(module_args(server, cache_dir, extra_args), hostname=h) for h in hostnames], work_dir)
+        else:
+            args = module_args(server, cache_dir, extra_args)
+            args['guests'] = [{"hostname": h} for h in hostnames]
+            tasks = run_tasks([args], work_dir)
+        wall = time.time() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    failures = [t['result'].get('msg') for t in tasks if t['result'].get('failed')]
+    stats = server.state.stats
+    return {
+        'hosts': hosts,
+        'mode': mode,
+        'tasks': len(tasks),
+        'failed': len(failures),
+        'first_failure': failures[0] if failures else None,
+        'wall_s': round(wall, 2),
+        'task_wall_max_s': round(max(t['wall'] for t in tasks), 2),
+        'http_calls': stats['http_calls'],
+        'http_calls_per_host': round(stats['http_calls'] / float(hosts), 2),
+        'logins': stats['logins'],
+        'throttled': stats['throttled'],
+        'bytes_in': stats['bytes_in'],
+        'bytes_out': stats['bytes_out'],
+        'peak_rss_mb_max': round(max(t['rss_mb'] for t in tasks), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vra_guest against a local mock vRA server')
+    parser.add_argument('--hosts', default='1,50,500', help='Comma-separated concurrent host counts')
+    parser.add_argument('--machines', type=int, default=1000, help='Pre-existing machines in the mock tenant')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per mock response')
+    parser.add_argument('--build-time', type=float, default=5.0, help='Seconds a mock build takes')
+    parser.add_argument('--max-rps', type=int, default=0, help='Calls per second served by the mock before 429s')
+    parser.add_argument('--modes', default='forks,batch', help='Comma-separated modes (forks, batch)')
+    parser.add_argument('--extra-args', default='{}', help='JSON object of additional module arguments')
+    parser.add_argument('--state', default='present', choices=['present', 'absent'], help='Provision or destroy hosts')
+    parser.add_argument('--json', action='store_true', help='Output JSON Lines rather than a table')
+    args = parser.parse_args()
+
+    extra_args = json.loads(args.extra_args)
+    server = MockVRAServer(machines=args.machines, latency=args.latency, build_time=args.build_time,
+                           max_rps=args.max_rps).start()
+    columns = ['hosts', 'mode', 'failed', 'wall_s', 'task_wall_max_s', 'http_calls', 'http_calls_per_host',
+               'logins', 'throttled', 'bytes_in', 'bytes_out', 'peak_rss_mb_max']
+
+    try:
+        if not args.json:
+            print(" ".join(["%16s" % c for c in columns]))
+
+        run_id = "bench%s" % (int(time.time()))
+        destroy_offset = 0 if args.state == 'absent' else None
+        for hosts in [int(h) for h in args.hosts.split(',')]:
+            for mode in args.modes.split(','):
+                measurement = run_scenario(server, hosts, mode, extra_args, run_id, destroy_offset)
+                if destroy_offset is not None:
+                    destroy_offset += hosts
+                if args.json:
+                    print(json.dumps(measurement))
+                else:
+                    print(" ".join(["%16s" % measurement[c] for c in columns]))
+                    if measurement['first_failure']:
+                        print("    first failure: %s" % (measurement['first_failure']))
+                sys.stdout.flush()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+#
+# Purpose: Local stand-in for the subset of the vRealize Automation (vRA) API used by
+# the vra_guest and vra_request_info modules, for benchmarking without a real vRA.
+#
+# Endpoints:
+#  - POST /identity/api/tokens
+#  - GET  /catalog-service/api/consumer/entitledCatalogItems
+#  - GET  /catalog-service/api/consumer/entitledCatalogItems/<id>/requests/template
+#  - POST /catalog-service/api/consumer/entitledCatalogItems/<id>/requests
+#  - GET  /catalog-service/api/consumer/requests (filtered by "id eq" clauses)
+#  - GET  /catalog-service/api/consumer/requests/<id>
+#  - GET  /catalog-service/api/consumer/requests/<id>/resources
+#  - GET  /catalog-service/api/consumer/resources/types/Infrastructure.Virtual/
+#  - GET  /catalog-service/api/consumer/resources/<id>
+#  - GET  /catalog-service/api/consumer/resources/<id>/actions
+#  - GET  /catalog-service/api/consumer/resources/<id>/actions/<id>/requests/template
+#  - POST /catalog-service/api/consumer/resources/<id>/actions/<id>/requests (Destroy)
+#
+# Parameters:
+#  - 'port': Port to listen on (HTTPS)
+#  - 'machines': Number of pre-existing machines in the tenant
+#  - 'latency': Seconds of latency added to every response
+#  - 'build-time': Seconds a build request takes to complete
+#  - 'max-rps': Calls per second served before answering 429 with Retry-After (0 for unlimited)
+#
+# Example:
+#    python benchmarks/mock_vra.py --port 8443 --machines 10000 --latency 0.05 --build-time 30
+
+import argparse
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+BLUEPRINT_NAME = "Linux-1"
+BLUEPRINT_INSTANCE_ID = "vSphere__vCenter__Machine_1"
+CATALOG_ID = "2f1b5c4e-0000-4000-8000-000000000001"
+CATALOG_ETAG = '"catalog-1"'
+DESTROY_ACTION_ID = "2f1b5c4e-0000-4000-8000-000000000002"
+API = "/catalog-service/api/consumer"
+REQUESTS_PAGE_SIZE = 20
+
+class MockVRAState(object):
+    '''In-memory tenant - machines, build requests and traffic statistics.'''
+
+    def __init__(self, machines, latency, build_time, max_rps=0):
+        """
+        Default constructor
+        Args:
+            machines: number of pre-existing machines in the tenant
+            latency: seconds of latency added to every response
+            build_time: seconds a build request takes to complete
+            max_rps: calls per second served before answering 429 (0 for unlimited)
+
+        Returns: (MockVRAState) Instance of the MockVRAState class
+        """
+        self.latency = latency
+        self.build_time = build_time
+        self.max_rps = max_rps
+        self.window = (0, 0)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.machines = {}
+        self.by_name = {}
+        self.tokens = set()
+        self.revoked = set()
+        self.sequence = 0
+        self.reset_stats()
+
+        for i in range(machines):
+            self.add_machine("existing-vm-%05d" % (i), self.next_id("req"), time.time() - 1)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'http_calls': 0, 'bytes_in': 0, 'bytes_out': 0, 'logins': 0, 'throttled': 0, 'unauthorized': 0,
+                          'operations': {}}
+
+    def revoke_tokens(self):
+        """
+        Reject every bearer token issued so far with 401, as vRA does once they expire
+        """
+        with self.lock:
+            self.revoked.update(self.tokens)
+
+    def over_capacity(self):
+        """
+        Count a call against the current one-second window
+
+        Returns: (bool) True if the call exceeds max_rps and should be refused
+        """
+        if not self.max_rps:
+            return False
+
+        second = int(time.time())
+        with self.lock:
+            start, count = self.window
+            if start != second:
+                start, count = second, 0
+            self.window = (start, count + 1)
+            if count < self.max_rps:
+                return False
+
+            self.stats['throttled'] += 1
+            return True
+
+    def next_id(self, prefix):
+        with self.lock:
+            self.sequence += 1
+            return "%s-%08d" % (prefix, self.sequence)
+
+    def add_machine(self, hostname, request_id, done):
+        machine = {
+            'id': self.next_id("res"),
+            'name': hostname,
+            'requestId': request_id,
+            'ip': "10.%s.%s.%s" % ((self.sequence >> 16) & 255, (self.sequence >> 8) & 255, self.sequence & 255),
+            'done': done
+        }
+        with self.lock:
+            self.requests[request_id] = machine
+            self.machines[machine['id']] = machine
+            self.by_name[hostname] = machine
+
+    def destroy_machine(self, machine):
+        """
+        Start destroying a machine - it disappears once the destroy request completes
+
+        Returns: (str) ID of the destroy request
+        """
+        request_id = self.next_id("req")
+        done = time.time() + self.build_time
+        with self.lock:
+            machine['gone'] = done
+            self.requests[request_id] = {'requestId': request_id, 'done': done}
+
+        return request_id
+
+    @staticmethod
+    def exists(machine, now):
+        return machine is not None and machine['done'] <= now and machine.get('gone', now + 1) > now
+
+    def count(self, operation):
+        with self.lock:
+            self.stats['operations'][operation] = self.stats['operations'].get(operation, 0) + 1
+
+    def record(self, bytes_in, bytes_out):
+        with self.lock:
+            self.stats['http_calls'] += 1
+            self.stats['bytes_in'] += bytes_in
+            self.stats['bytes_out'] += bytes_out
+
+def resource_data(machine):
+    """
+    Build the resourceData block for a machine
+    """
+    return {
+        'entries': [
+            {'key': 'ip_address', 'value': {'type': 'string', 'value': machine['ip']}},
+            {'key': 'MachineStatus', 'value': {'type': 'string', 'value': 'On'}}
+        ]
+    }
+
+def listing_entry(machine, extended):
+    """
+    Build an Infrastructure.Virtual listing entry for a machine - padded with the kind of metadata
+    vRA returns so that payload sizes are realistic
+    """
+    entry = {
+        '@type': 'CatalogResource',
+        'id': machine['id'],
+        'name': machine['name'],
+        'requestId': machine['requestId'],
+        'resourceTypeRef': {'id': 'Infrastructure.Virtual', 'label': 'Virtual Machine'},
+        'status': 'ACTIVE',
+        'lastUpdated': datetime.datetime.utcfromtimestamp(machine['done']).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        'description': 'Machine provisioned from %s' % (BLUEPRINT_NAME),
+        'owners': [{'tenantName': 'vsphere.local', 'ref': 'automation-user@vsphere.local', 'type': 'USER', 'value': 'automation-user'}],
+        'organization': {'tenantRef': 'vsphere.local', 'subtenantRef': '00000000-0000-0000-0000-000000000000'},
+        'providerBinding': {'bindingId': machine['id'], 'providerRef': {'id': 'provider', 'label': 'Infrastructure Service'}}
+    }
+    if extended:
+        entry['resourceData'] = resource_data(machine)
+
+    return entry
+
+class MockVRAHandler(BaseHTTPRequestHandler):
+    '''Request handler implementing the mock vRA endpoints.'''
+
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, code, body, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b""
+        compressed = body is not None and 'gzip' in (self.headers.get('Accept-Encoding') or '') and hasattr(gzip, 'compress')
+        if compressed:
+            data = gzip.compress(data)
+
+        time.sleep(self.state.latency)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        if compressed:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.state.record(self.bytes_in, len(data))
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.bytes_in = length + len(self.path)
+        return json.loads(self.rfile.read(length).decode('utf-8') or '{}') if length else {}
+
+    def unauthorized(self):
+        """
+        Refuse the call with 401 if its bearer token was revoked
+
+        Returns: (bool) True if the call was refused
+        """
+        token = (self.headers.get('Authorization') or '')[len("Bearer "):]
+        with self.state.lock:
+            if token not in self.state.revoked:
+                return False
+            self.state.stats['unauthorized'] += 1
+
+        self.send_json(401, {'errors': [{'message': 'token expired'}]})
+        return True
+
+    def throttle(self):
+        """
+        Refuse the call with 429 if the server is over capacity
+
+        Returns: (bool) True if the call was refused
+        """
+        if not self.state.over_capacity():
+            return False
+
+        self.send_json(429, {'errors': [{'message': 'too many requests'}]}, {'Retry-After': '1'})
+        return True
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self.read_body()
+        if self.throttle():
+            return
+
+        if path == "/identity/api/tokens":
+            token = "token-%s" % (self.state.next_id("t"))
+            with self.state.lock:
+                self.state.stats['logins'] += 1
+                self.state.tokens.add(token)
+            expires = (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            return self.send_json(200, {'id': token, 'expires': expires, 'tenant': body.get('tenant')})
+
+        if self.unauthorized():
+            return
+
+        if re.match(r"^%s/entitledCatalogItems/[^/]+/requests$" % (API), path):
+            hostname = body['data'][BLUEPRINT_INSTANCE_ID]['data']['Hostname']
+            request_id = self.state.next_id("req")
+            self.state.add_machine(hostname, request_id, time.time() + self.state.build_time)
+            return self.send_json(201, {'id': request_id, 'stateName': 'Submitted', 'phase': 'PENDING_PRE_APPROVAL'})
+
+        match = re.match(r"^%s/resources/([^/]+)/actions/%s/requests$" % (API, DESTROY_ACTION_ID), path)
+        if match:
+            machine = self.state.machines.get(match.group(1))
+            if not self.state.exists(machine, time.time()):
+                return self.send_json(404, {'errors': [{'message': 'not found'}]})
+            request_id = self.state.destroy_machine(machine)
+            return self.send_json(201, None, {'Location': "https://%s%s/requests/%s/" % (self.headers.get('Host'), API, request_id)})
+
+        self.send_json(404, {'errors': [{'message': 'not found'}]})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        query = parse_qs(url.query)
+        self.read_body()
+        if self.throttle() or self.unauthorized():
+            return
+        now = time.time()
+
+        if path == "%s/entitledCatalogItems" % (API):
+            if self.headers.get('If-None-Match') == CATALOG_ETAG:
+                self.state.count('catalog_not_modified')
+                return self.send_json(304, None, {'ETag': CATALOG_ETAG})
+            self.state.count('catalog')
+            return self.send_json(200, {
+                'content': [{'catalogItem': {'id': CATALOG_ID, 'name': BLUEPRINT_NAME, 'version': 1}}],
+                'metadata': {'size': 20, 'totalElements': 1, 'totalPages': 1, 'number': 1}
+            }, {'ETag': CATALOG_ETAG})
+
+        if re.match(r"^%s/entitledCatalogItems/[^/]+/requests/template$" % (API), path):
+            self.state.count('template')
+            return self.send_json(200, {
+                'type': 'com.vmware.vcac.catalog.domain.request.CatalogItemProvisioningRequest',
+                'catalogItemId': CATALOG_ID,
+                'data': {
+                    BLUEPRINT_INSTANCE_ID: {
+                        'componentTypeId': 'com.vmware.csp.iaas.blueprint.service',
+                        'data': {
+                            'cpu': 1,
+                            'memory': 1024,
+                            'disks': [{'componentTypeId': 'com.vmware.csp.iaas.blueprint.service',
+                                       'data': {'capacity': 40, 'id': 1, 'label': 'Hard disk 1', 'volumeId': 0}}]
+                        }
+                    }
+                }
+            })
+
+        if path == "%s/requests" % (API):
+            # pages are capped like vRA does, whatever limit the client asks for
+            ids = [i.replace("''", "'") for i in re.findall(r"id eq '((?:[^']|'')+)'", query.get('$filter', [''])[0])]
+            content = [self.request_status(self.state.requests[i], now) for i in ids if i in self.state.requests]
+            limit = min(int(query.get('limit', ['20'])[0]), REQUESTS_PAGE_SIZE)
+            page = int(query.get('page', ['1'])[0])
+            total_pages = max(1, (len(content) + limit - 1) // limit)
+            return self.send_json(200, {'content': content[(page - 1) * limit:page * limit],
+                                        'metadata': {'size': limit, 'totalElements': len(content), 'totalPages': total_pages, 'number': page}})
+
+        match = re.match(r"^%s/requests/([^/]+)/resources$" % (API), path)
+        if match:
+            machine = self.state.requests.get(match.group(1))
+            if not self.state.exists(machine, now) or 'name' not in machine:
+                return self.send_json(200, {'content': []})
+            entry = listing_entry(machine, True)
+            return self.send_json(200, {'content': [entry]})
+
+        match = re.match(r"^%s/requests/([^/]+)$" % (API), path)
+        if match:
+            machine = self.state.requests.get(match.group(1))
+            if machine is None:
+                return self.send_json(404, {'errors': [{'message': 'not found'}]})
+            return self.send_json(200, self.request_status(machine, now))
+
+        if path == "%s/resources/types/Infrastructure.Virtual/" % (API):
+            return self.send_json(200, self.listing(query, now))
+
+        match = re.match(r"^%s/resources/([^/]+)$" % (API), path)
+        if match:
+            machine = self.state.machines.get(match.group(1))
+            if not self.state.exists(machine, now):
+                return self.send_json(404, {'errors': [{'message': 'not found'}]})
+            return self.send_json(200, listing_entry(machine, True))
+
+        match = re.match(r"^%s/resources/([^/]+)/actions$" % (API), path)
+        if match:
+            if not self.state.exists(self.state.machines.get(match.group(1)), now):
+                return self.send_json(404, {'errors': [{'message': 'not found'}]})
+            return self.send_json(200, {'content': [
+                {'id': "2f1b5c4e-0000-4000-8000-000000000003", 'name': 'Reboot', 'bindingId': 'Infrastructure.Machine.Action.Reboot'},
+                {'id': DESTROY_ACTION_ID, 'name': 'Destroy', 'bindingId': 'Infrastructure.Virtual.Action.Destroy'}
+            ], 'metadata': {'totalPages': 1}})
+
+        match = re.match(r"^%s/resources/([^/]+)/actions/%s/requests/template$" % (API, DESTROY_ACTION_ID), path)
+        if match:
+            return self.send_json(200, {
+                'type': 'com.vmware.vcac.catalog.domain.request.CatalogResourceRequest',
+                'resourceId': match.group(1),
+                'actionId': DESTROY_ACTION_ID,
+                'description': None,
+                'data': {'ForceDestroy': False, 'description': None, 'reasons': None}
+            })
+
+        self.send_json(404, {'errors': [{'message': 'not found'}]})
+
+    def request_status(self, machine, now):
+        done = machine['done'] <= now
+        return {
+            'id': machine['requestId'],
+            'stateName': 'Successful' if done else 'In Progress',
+            'phase': 'SUCCESSFUL' if done else 'IN_PROGRESS',
+            'requestCompletion': {'completionDetails': 'Request succeeded.'} if done else None
+        }
+
+    def listing(self, query, now):
+        limit = int(query.get('limit', ['20'])[0])
+        page = int(query.get('page', ['1'])[0])
+        extended = query.get('withExtendedData', ['false'])[0] == 'true'
+        name_filter = re.match(r"^name eq '(.*)'$", query.get('$filter', [''])[0])
+
+        if name_filter:
+            machine = self.state.by_name.get(name_filter.group(1).replace("''", "'"))
+            machines = [machine] if self.state.exists(machine, now) else []
+        else:
+            machines = [m for m in list(self.state.machines.values()) if self.state.exists(m, now)]
+
+        total_pages = max(1, (len(machines) + limit - 1) // limit)
+        content = [listing_entry(m, extended) for m in machines[(page - 1) * limit:page * limit]]
+        return {
+            'content': content,
+            'metadata': {'size': limit, 'totalElements': len(machines), 'totalPages': total_pages, 'number': page}
+        }
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+class MockVRAServer(object):
+    '''HTTPS server wrapper - generates a throwaway self-signed certificate (requires openssl).'''
+
+    def __init__(self, port=0, machines=1000, latency=0.0, build_time=5.0, max_rps=0):
+        self.state = MockVRAState(machines, latency, build_time, max_rps)
+        handler = type('Handler', (MockVRAHandler,), {'state': self.state})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+        self.cert_dir = tempfile.mkdtemp()
+        cert = os.path.join(self.cert_dir, "cert.pem")
+        key = os.path.join(self.cert_dir, "key.pem")
+        subprocess.check_call(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                               "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = None
+
+    @property
+    def address(self):
+        return "127.0.0.1:%s" % (self.server.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cert_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local mock vRA server')
+    parser.add_argument('--port', type=int, default=8443, help='Port to listen on')
+    parser.add_argument('--machines', type=int, default=1000, help='Number of pre-existing machines')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of latency per response')
+    parser.add_argument('--build-time', type=float, default=5.0, help='Seconds a build takes to complete')
+    parser.add_argument('--max-rps', type=int, default=0, help='Calls per second served before answering 429')
+    args = parser.parse_args()
+
+    server = MockVRAServer(args.port, args.machines, args.latency, args.build_time, args.max_rps)
+    print("Mock vRA listening on https://%s" % (server.address))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,617 @@
+# Purpose: Controller-side state and the authenticated session shared by the vra_guest and vra_request_info
+# modules and the vra inventory plugin - locked JSON documents in the cache directory, the bearer token
+# cache, the controller-wide rate limiter and circuit breaker, and the session making calls through them.
+
+import datetime
+import json
+import random
+import threading
+import time
+import requests
+from ansible.module_utils.cache_file import CacheFile
+from requests.adapters import HTTPAdapter
+
+# monotonic clock for measuring timeouts (not available on python 2)
+monotonic = getattr(time, 'monotonic', time.time)
+
+class VRACacheFile(CacheFile):
+    '''JSON document stored on the controller and shared between module runs (and the vra inventory plugin),
+    identified by the vRA hostname, tenant, username, etc.'''
+    pass
+
+class VRATokenCache(VRACacheFile):
+    '''Controller-side cache of vRA bearer tokens shared between module runs.'''
+
+    # number of seconds before actual expiry that a token is considered stale
+    EXPIRY_SKEW = 60
+
+    def __init__(self, cache_dir, vra_hostname, vra_tenant, vra_username):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store tokens in
+            vra_hostname: hostname of the vRA instance the token is issued by
+            vra_tenant: tenant the token is issued for
+            vra_username: user the token is issued for
+
+        Returns: (VRATokenCache) Instance of the VRATokenCache class
+        """
+        super(VRATokenCache, self).__init__(cache_dir, "token", vra_hostname, vra_tenant, vra_username)
+
+    def read(self):
+        """
+        Read the cached token if present and not (nearly) expired - callers should hold the lock
+
+        Returns: (str) Token ID, or None if no usable token is cached
+        """
+        token = self.load()
+        if token is None:
+            return None
+
+        expires = self.parse_expiry(token.get('expires'))
+        if expires is None or expires - datetime.timedelta(seconds=self.EXPIRY_SKEW) <= datetime.datetime.utcnow():
+            return None
+
+        return token.get('id')
+
+    def write(self, token):
+        """
+        Store a token response from vRA - callers should hold the lock
+        Args:
+            token: dict of the token response (containing at least 'id' and 'expires')
+
+        Returns: None
+        """
+        self.store({'id': token['id'], 'expires': token.get('expires')})
+
+    def invalidate(self, token_id):
+        """
+        Drop the cached token, but only if it is still the one that was rejected (another process may
+        already have replaced it with a fresh one) - callers should hold the lock
+        Args:
+            token_id: ID of the token that vRA rejected
+
+        Returns: None
+        """
+        token = self.load()
+        if token is not None and token.get('id') == token_id:
+            self.remove()
+
+    @staticmethod
+    def parse_expiry(expires):
+        """
+        Parse the 'expires' timestamp returned by vRA (e.g. "2018-06-06T02:43:37.000Z")
+        Args:
+            expires: timestamp string
+
+        Returns: (datetime) Naive UTC datetime, or None if it cannot be parsed
+        """
+        if not expires:
+            return None
+
+        for fmt in ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+            try:
+                return datetime.datetime.strptime(expires, fmt)
+            except ValueError:
+                pass
+
+        return None
+
+class VRAPollScheduler(object):
+    '''Schedules polls of outstanding vRA requests - polls quickly at first and whenever the build
+    phase changes, backs off with jitter while nothing changes, honors Retry-After and measures the
+    deadline against a monotonic clock.'''
+
+    DEFAULTS = {
+        'initial_interval': 2,
+        'max_interval': 30,
+        'backoff_factor': 1.5,
+        'jitter': 0.2
+    }
+
+    def __init__(self, strategy, timeout):
+        """
+        Default constructor
+        Args:
+            strategy: dict overriding any of the DEFAULTS settings
+            timeout: number of seconds before the deadline is reached
+
+        Returns: (VRAPollScheduler) Instance of the VRAPollScheduler class
+        """
+        self.settings = dict(self.DEFAULTS)
+        self.settings.update(dict((k, v) for k, v in (strategy or {}).items() if v is not None))
+        self.interval = float(self.settings['initial_interval'])
+        self.deadline = monotonic() + timeout
+        self.phase = None
+
+    def expired(self):
+        """
+        Check whether the deadline has passed
+
+        Returns: (bool) True if the deadline has been reached
+        """
+        return monotonic() >= self.deadline
+
+    def next_delay(self, phase, retry_after=None):
+        """
+        Compute the delay before the next poll
+        Args:
+            phase: observed build phase (any comparable value) - a change resets the interval
+            retry_after: number of seconds requested by the server via Retry-After (optional)
+
+        Returns: (float) Number of seconds to wait
+        """
+        if phase != self.phase:
+            self.phase = phase
+            self.interval = float(self.settings['initial_interval'])
+
+        delay = self.interval * (1 + random.uniform(-1, 1) * float(self.settings['jitter']))
+        self.interval = min(self.interval * float(self.settings['backoff_factor']), float(self.settings['max_interval']))
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return max(0, delay)
+
+    def wait(self, phase, retry_after=None):
+        """
+        Sleep until the next poll, without sleeping past the deadline
+        Args:
+            phase: observed build phase
+            retry_after: number of seconds requested by the server via Retry-After (optional)
+
+        Returns: None
+        """
+        time.sleep(max(0, min(self.next_delay(phase, retry_after), self.deadline - monotonic())))
+
+    @staticmethod
+    def parse_retry_after(value):
+        """
+        Parse a Retry-After header given in seconds (HTTP dates are ignored)
+        Args:
+            value: header value
+
+        Returns: (float) Number of seconds, or None if absent/unparseable
+        """
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+class VRAThrottleError(Exception):
+    '''Raised when a call is shed because the vRA circuit breaker stayed open.'''
+    pass
+
+class VRAThrottle(VRACacheFile):
+    '''Controller-wide limiter for calls to a vRA instance, shared by every module process through a
+    locked state file - a token bucket paces calls (halving its rate whenever vRA answers 429/503 and
+    creeping back up to the configured rate as calls succeed) and a circuit breaker stops all calls for
+    a cool-down period once vRA fails repeatedly, then lets a single probe call through to test it.
+    Each process takes a small allowance of calls from the bucket at a time and counts successes in
+    memory, so the state file is only rewritten once per allowance or when the breaker state changes.'''
+
+    DEFAULTS = {
+        'requests_per_second': 20,
+        'burst': 40,
+        'max_retries': 5,
+        'failure_threshold': 5,
+        'cooldown': 30
+    }
+
+    # statuses worth retrying - calls that are not GETs are only retried when vRA refused them outright
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    RETRY_STATUSES_UNSAFE = (429, 503)
+
+    # statuses signalling vRA wants fewer calls, and those counted as vRA failing (for the circuit breaker)
+    SLOW_DOWN_STATUSES = (429, 503)
+    FAILURE_STATUSES = (500, 502, 503, 504)
+
+    # calls taken from the shared bucket at a time, and seconds an unused allowance stays valid
+    ALLOWANCE = 5
+    ALLOWANCE_TTL = 1.0
+
+    # backoff between retries of a failed call
+    RETRY_STRATEGY = {
+        'initial_interval': 1,
+        'max_interval': 30,
+        'backoff_factor': 2,
+        'jitter': 0.5
+    }
+
+    def __init__(self, cache_dir, settings, vra_hostname):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the shared state in
+            settings: dict overriding any of the DEFAULTS settings
+            vra_hostname: hostname of the vRA instance being limited
+
+        Returns: (VRAThrottle) Instance of the VRAThrottle class
+        """
+        super(VRAThrottle, self).__init__(cache_dir, "throttle", vra_hostname)
+        self.settings = dict(self.DEFAULTS)
+        self.settings.update(dict((k, v) for k, v in (settings or {}).items() if v is not None))
+        self.max_rate = float(self.settings['requests_per_second'])
+        self.min_rate = self.max_rate / 20.0
+
+        # in-process view of the shared state since this process last synced with it
+        self.local_lock = threading.Lock()
+        self.allowance = 0
+        self.allowance_expires = 0
+        self.successes = 0
+        self.circuit = 'closed'
+        self.failures = 0
+
+    def load_state(self):
+        """
+        Read the shared state, starting from a full bucket if there is none - callers should hold the lock
+
+        Returns: (dict) Shared limiter and circuit breaker state
+        """
+        state = self.load() or {}
+        now = time.time()
+        state.setdefault('tokens', float(self.settings['burst']))
+        state.setdefault('updated', now)
+        state.setdefault('rate', self.max_rate)
+        state.setdefault('slowed', 0)
+        state.setdefault('failures', 0)
+        state.setdefault('circuit', 'closed')
+        state.setdefault('open_until', 0)
+
+        # refill the bucket for the time elapsed since it was last touched
+        if self.max_rate > 0:
+            state['rate'] = min(max(state['rate'], self.min_rate), self.max_rate)
+            elapsed = max(0, now - state['updated'])
+            state['tokens'] = min(float(self.settings['burst']), state['tokens'] + elapsed * state['rate'])
+        state['updated'] = now
+
+        return state
+
+    def sync(self, state):
+        """
+        Fold the successes counted in memory into the shared state and remember its breaker state - callers
+        should hold both locks
+        Args:
+            state: shared state returned by load_state()
+
+        Returns: (bool) Whether the state changed and needs storing
+        """
+        self.circuit = state['circuit']
+        self.failures = state['failures']
+
+        if not self.successes:
+            return False
+
+        state['rate'] = min(state['rate'] + self.successes * self.max_rate / 50.0, self.max_rate)
+        self.successes = 0
+        return True
+
+    def reserve(self):
+        """
+        Reserve a slot for a call - from the allowance of this process if it has one left, otherwise from the
+        shared bucket, which may go into debt, in which case the caller waits its turn
+
+        Returns: (tuple) Seconds to wait before calling, and whether the slot was reserved (False when
+                 the circuit breaker is open and the caller should wait and try to reserve again)
+        """
+        with self.local_lock:
+            if self.allowance > 0 and time.time() < self.allowance_expires:
+                self.allowance -= 1
+                return 0, True
+
+            with self.lock():
+                state = self.load_state()
+                changed = self.sync(state)
+                now = state['updated']
+
+                # hand back what is left of an expired allowance rather than let it go to waste
+                if self.allowance > 0 and self.max_rate > 0:
+                    state['tokens'] = min(float(self.settings['burst']), state['tokens'] + self.allowance)
+                    self.allowance = 0
+                    changed = True
+
+                count = self.ALLOWANCE
+                if state['circuit'] != 'closed':
+                    if now < state['open_until']:
+                        if changed:
+                            self.store(state)
+                        return state['open_until'] - now, False
+
+                    # let a single probe through, holding everyone else back until it reports in
+                    state['circuit'] = 'half-open'
+                    state['open_until'] = now + float(self.settings['cooldown'])
+                    self.circuit = state['circuit']
+                    count = 1
+
+                delay = 0
+                if self.max_rate > 0:
+                    # take a full allowance only while the bucket can cover it - otherwise a single (paced) call
+                    count = min(count, int(state['tokens'])) if state['tokens'] >= 1 else 1
+                    state['tokens'] -= count
+                    if state['tokens'] < 0:
+                        delay = -state['tokens'] / state['rate']
+
+                self.allowance = count - 1
+                self.allowance_expires = now + self.ALLOWANCE_TTL
+                self.store(state)
+                return delay, True
+
+    def report(self, status):
+        """
+        Report the outcome of a call - a success while the breaker is closed with no failures is only counted in
+        memory (folded into the shared rate on the next sync), anything else updates the shared state at once
+        Args:
+            status: HTTP status of the response, or None if the call failed without one
+
+        Returns: None
+        """
+        success = status is not None and status != 429 and status not in self.FAILURE_STATUSES
+        with self.local_lock:
+            if success and self.circuit == 'closed' and self.failures == 0:
+                self.successes += 1
+                return
+
+            with self.lock():
+                state = self.load_state()
+                before = dict(state)
+                self.sync(state)
+
+                # calls refused in the same burst all report at once - only slow down once per second
+                if status in self.SLOW_DOWN_STATUSES and state['updated'] - state['slowed'] >= 1:
+                    state['rate'] = max(state['rate'] / 2.0, self.min_rate)
+                    state['slowed'] = state['updated']
+                    self.allowance = 0
+
+                if status is None or status in self.FAILURE_STATUSES:
+                    state['failures'] += 1
+                    if state['circuit'] == 'half-open' or \
+                            (self.settings['failure_threshold'] > 0 and state['failures'] >= self.settings['failure_threshold']):
+                        state['circuit'] = 'open'
+                        state['open_until'] = state['updated'] + float(self.settings['cooldown'])
+                        self.allowance = 0
+                elif status == 429:
+                    # vRA is healthy, just busy - leave the circuit breaker alone
+                    pass
+                else:
+                    state['failures'] = 0
+                    state['circuit'] = 'closed'
+                    state['rate'] = min(state['rate'] + self.max_rate / 50.0, self.max_rate)
+
+                self.circuit = state['circuit']
+                self.failures = state['failures']
+                if state != before:
+                    self.store(state)
+
+    @classmethod
+    def should_retry(cls, method, status):
+        """
+        Check whether a failed call can safely be retried
+        Args:
+            method: HTTP method of the call
+            status: HTTP status of the response, or None if the call failed without one
+
+        Returns: (bool) True if the call should be retried
+        """
+        if method == "GET":
+            return status is None or status in cls.RETRY_STATUSES
+
+        return status in cls.RETRY_STATUSES_UNSAFE
+
+class VRABearerToken(object):
+    '''Bearer token of a session, held in one place so that every copy of the session (see VRAHelper.for_guest)
+    uses the token any of them refreshed.'''
+
+    def __init__(self):
+        """
+        Default constructor
+
+        Returns: (VRABearerToken) Instance of the VRABearerToken class
+        """
+        self.id = None
+        self.lock = threading.Lock()
+
+class VRASession(object):
+    '''Authenticated keep-alive session with a vRA instance - bearer tokens are shared between processes through
+    the token cache and every call goes through the controller-wide rate limiter and circuit breaker (if enabled).
+    Failures are reported through the fail_json of the module (or stand-in) given.'''
+
+    def __init__(self, module, timings=None, pool_connections=4, pool_maxsize=10):
+        """
+        Default constructor
+        Args:
+            module: object with the parameters (vra_*, cache_dir, token_cache and rate_limit), warn and fail_json
+            timings: CallTimings to record calls in (optional)
+            pool_connections: number of connection pools kept by the session
+            pool_maxsize: number of connections kept per pool
+
+        Returns: (VRASession) Instance of the VRASession class
+        """
+        self.module = module
+        self.timings = timings
+        self.vra_hostname = module.params['vra_hostname']
+        self.vra_password = module.params['vra_password']
+        self.vra_tenant = module.params['vra_tenant']
+        self.vra_username = module.params['vra_username']
+        self.bearer = VRABearerToken()
+        self.headers = {
+            "accept": "application/json",
+            "content-type": "application/json"
+        }
+
+        # responses memoized for the duration of the run and statistics
+        self.memo = {}
+        self.stats = {'http_calls': 0}
+        self.stats_lock = threading.Lock()
+
+        # keep-alive connection pool re-used by every call to vRA (including status polling)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+
+        self.token_cache = None
+        if module.params['token_cache']:
+            try:
+                self.token_cache = VRATokenCache(module.params['cache_dir'], self.vra_hostname, self.vra_tenant, self.vra_username)
+            except Exception as e:
+                self.module.warn("Token cache disabled - could not use cache directory %s: %s" % (module.params['cache_dir'], e))
+
+        self.throttle = None
+        if module.params['rate_limit']['enabled']:
+            try:
+                self.throttle = VRAThrottle(module.params['cache_dir'], module.params['rate_limit'], self.vra_hostname)
+            except Exception as e:
+                self.module.warn("Rate limiting disabled - could not use cache directory %s: %s" % (module.params['cache_dir'], e))
+
+    def get_auth(self, stale_token=None):
+        """
+        Get a bearer token for every copy of the session - tokens are shared between module runs via
+        the token cache (if enabled) so only one process logs in at a time
+        Args:
+            stale_token: ID of a token that vRA rejected and which must not be re-used
+
+        Returns: None (updates the shared bearer token)
+        """
+        try:
+            with self.bearer.lock:
+                # another thread (or copy of the session) may already have refreshed the token
+                if stale_token is not None and self.bearer.id != stale_token:
+                    return
+
+                if self.token_cache is None:
+                    self.bearer.id = self.request_token()['id']
+                else:
+                    with self.token_cache.lock():
+                        if stale_token is not None:
+                            self.token_cache.invalidate(stale_token)
+
+                        token_id = self.token_cache.read()
+                        if token_id is None:
+                            token = self.request_token()
+                            self.token_cache.write(token)
+                            token_id = token['id']
+                        self.bearer.id = token_id
+        except Exception as e:
+            self.module.fail_json(msg="Failed to get bearer token: %s" % (e))
+
+    def request_token(self):
+        """
+        Log in to vRA and request a new bearer token
+
+        Returns: (dict) Token response (containing 'id' and 'expires')
+        """
+        url = "https://%s/identity/api/tokens" % (self.vra_hostname)
+        payload = json.dumps({"username": self.vra_username, "password": self.vra_password, "tenant": self.vra_tenant})
+
+        def send():
+            self.count_http_call()
+            return self.session.request("POST", url, data=payload, headers=self.headers, verify=False)
+
+        start = monotonic()
+        response, retries = self.send_throttled("POST", send)
+        if self.timings is not None:
+            self.timings.record("get_auth", monotonic() - start, len(response.content), retries)
+        response.raise_for_status()
+
+        return response.json()
+
+    def request(self, method, url, operation, extra_headers=None, memoize=False, **kwargs):
+        """
+        Perform an authenticated request against vRA, refreshing the bearer token once if it was rejected
+        Args:
+            method: HTTP method
+            url: full URL of the resource
+            operation: name of the operation, used for instrumentation
+            extra_headers: dict of headers to send in addition to the instance headers
+            memoize: re-use a previous successful response for the same GET within this run - memoized
+                     responses are discarded whenever a non-GET (mutating) request is made
+            kwargs: additional arguments passed through to the requests library
+
+        Returns: (Response) HTTP response object
+        """
+        key = None
+        if memoize:
+            key = (url, json.dumps(kwargs.get('params'), sort_keys=True))
+            response = self.memo.get(key)
+            if response is not None:
+                return response
+        elif method != "GET":
+            self.memo.clear()
+
+        sent = {}
+
+        def send():
+            # format bearer token into correct auth pattern
+            sent['token'] = self.bearer.id
+            headers = dict(self.headers, authorization="Bearer %s" % (sent['token']))
+            headers.update(extra_headers or {})
+            self.count_http_call()
+            return self.session.request(method, url, headers=headers, verify=False, **kwargs)
+
+        start = monotonic()
+        response, retries = self.send_throttled(method, send)
+
+        if response.status_code == 401:
+            self.get_auth(stale_token=sent['token'])
+            response, more_retries = self.send_throttled(method, send)
+            retries += more_retries + 1
+
+        if self.timings is not None:
+            self.timings.record(operation, monotonic() - start, len(response.content), retries)
+
+        if key is not None and response.ok:
+            self.memo[key] = response
+
+        return response
+
+    def send_throttled(self, method, send):
+        """
+        Make a call through the controller-wide rate limiter (if enabled), retrying transient failures
+        (429 and 5xx responses, and connection errors for GETs) with jittered backoff that honors Retry-After
+        Args:
+            method: HTTP method of the call
+            send: function making the call and returning the response
+
+        Returns: (tuple) Final response and the number of retries made
+        """
+        if self.throttle is None:
+            return send(), 0
+
+        backoff = VRAPollScheduler(VRAThrottle.RETRY_STRATEGY, 0)
+        retries = 0
+        while True:
+            delay, reserved = self.throttle.reserve()
+            if not reserved:
+                if retries >= self.throttle.settings['max_retries']:
+                    raise VRAThrottleError("vRA circuit breaker is open after repeated failures - not calling vRA")
+                retries += 1
+                time.sleep(delay)
+                continue
+            time.sleep(delay)
+
+            try:
+                response = send()
+                status = response.status_code
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.throttle.report(None)
+                if method != "GET" or retries >= self.throttle.settings['max_retries']:
+                    raise
+                response = None
+                status = None
+            else:
+                self.throttle.report(status)
+
+            if retries >= self.throttle.settings['max_retries'] or not VRAThrottle.should_retry(method, status):
+                return response, retries
+
+            retries += 1
+            retry_after = None if response is None else VRAPollScheduler.parse_retry_after(response.headers.get('Retry-After'))
+            time.sleep(backoff.next_delay(None, retry_after))
+
+    def count_http_call(self):
+        """
+        Record an outbound HTTP call in the per-run statistics (shared between guests in batch mode)
+
+        Returns: None
+        """
+        with self.stats_lock:
+            self.stats['http_calls'] += 1
@@ -18,18 +18,61 @@ description:
     - "Create a VM from a Blueprint via vRealizeAutomation (vRA)"
 
 options:
+    broker_socket:
+        description:
+            - Path of the unix socket of the optional module broker (C(module-broker/module_broker.py)) - when a
+              broker is listening the invocation is handed to it and run in a process forked from the warm broker,
+              otherwise the module runs directly
+            - The invocation is only handed to a broker run by the same user that serves this version of the module
+            - An empty value always runs the module directly
+        type: path
+        default: "~/.ansible/module_broker.sock"
+        required: false
+    batch_concurrency:
+        description:
+            - Maximum number of concurrent calls to vRA when provisioning the entries in C(guests)
+        type: int
+        default: 10
+        required: false
     blueprint_instance_id:
         description:
             - ID of the instance within the Blueprint - there should only ever be a single ID for this module to work
-        required: true
+            - Required unless given for every entry in C(guests)
+        required: false
     blueprint_name:
         description:
             - Name of the Blueprint to use for provisioning
-        required: true
+            - Required unless given for every entry in C(guests)
+        required: false
+    cache_dir:
+        description:
+            - Directory on the controller used to store state shared between module runs (bearer tokens, etc.)
+        type: path
+        default: "~/.ansible/cache/vra_guest"
+        required: false
+    catalog_cache_ttl:
+        description:
+            - Number of seconds to trust the cached entitled catalog index before re-validating it against vRA
+              (using a conditional GET where supported) - Blueprint templates are cached per catalog ID and
+              Blueprint version for the same amount of time - a value of 0 disables both caches
+        type: int
+        default: 3600
+        required: false
     cpu:
         description:
             - Number of CPUs for the VM (integer)
-        required: true
+            - Required unless given for every entry in C(guests)
+        required: false
+    engine:
+        description:
+            - Client engine used to talk to vRA - C(threads) uses the synchronous requests-based client (with a
+              thread pool in batch mode) while C(asyncio) keeps every lookup, submission and poll in flight from a
+              single event loop, which scales to many more concurrent guests per process
+            - C(asyncio) requires python 3 and the aiohttp library
+        type: str
+        choices: [ threads, asyncio ]
+        default: threads
+        required: false
     extra_disks:
         description:
             - Array of additional disks to add to the VM - these are *in addition to* the base/root disk (Disk0 - which cannot be modified)
@@ -37,18 +80,100 @@ options:
             - ' - C(size_gb) (integer): Disk storage size in specified unit.'
             - ' - C(mount_point) (str): Mount point (Linux) or drive letter (Windows).'
         required: false
+    guests:
+        description:
+            - List of guests to provision in a single task - each entry accepts C(hostname) (required) along with
+              any of C(blueprint_instance_id), C(blueprint_name), C(cpu), C(extra_disks), C(memory) and
+              C(network_adapter), which otherwise default to the top-level values
+            - Existence checks and build requests are submitted concurrently, the catalog and template are
+              fetched once per Blueprint, and a single loop waits on every outstanding build
+        type: list
+        required: false
     hostname:
         description:
             - Hostname of the VM - note that this requires a custom "Hostname" property be added to the Blueprint
-        required: true
+            - Mutually exclusive with C(guests)
+        required: false
+    http_pool_connections:
+        description:
+            - Number of per-host connection pools to keep alive and re-use for calls to vRA
+        type: int
+        default: 4
+        required: false
+    http_pool_maxsize:
+        description:
+            - Maximum number of keep-alive connections held per host
+        type: int
+        default: 10
+        required: false
+    inventory_index_max_age:
+        description:
+            - Maximum age, in seconds, of the machine index maintained by the C(vra) inventory plugin (in C(cache_dir))
+              for it to be used as the existence check - a hostname found in the index skips the vRA lookup, while
+              a hostname missing from it still falls back to querying vRA
+            - A value of 0 disables the use of the index
+        type: int
+        default: 0
+        required: false
     memory:
         description:
             - Amount of memory, in GB (integer)
-        required: true
+            - Required unless given for every entry in C(guests)
+        required: false
     network_adapter:
         description:
             - Name of the 'Network Adapter' (network) to attach the VM to - this will drive the target network for the VM
-        required: true
+            - Required unless given for every entry in C(guests)
+        required: false
+    poll_strategy:
+        description:
+            - Tuning for polling the status of build requests - polls start at C(initial_interval) seconds, grow
+              by C(backoff_factor) (with +/- C(jitter) randomization) up to C(max_interval) seconds while the
+              request phase is unchanged, and restart at C(initial_interval) whenever the phase changes
+            - A C(Retry-After) header returned by vRA is always honored
+            - 'Valid attributes are:'
+            - ' - C(initial_interval) (float): Seconds between the first polls (default 2).'
+            - ' - C(max_interval) (float): Upper bound on seconds between polls (default 30).'
+            - ' - C(backoff_factor) (float): Multiplier applied to the interval after each poll (default 1.5) - use 1 for fixed-interval polling.'
+            - ' - C(jitter) (float): Fraction of randomization applied to each interval (default 0.2).'
+        type: dict
+        required: false
+    state:
+        description:
+            - Whether the VMs should exist - C(absent) submits the Destroy action for each VM that exists (only
+              C(hostname) is needed per guest) and, unless C(wait) is false, waits for the destroy requests to complete
+            - The machine index maintained by the C(vra) inventory plugin is never trusted for C(absent) and destroyed
+              VMs are removed from it
+        type: str
+        choices: [ present, absent ]
+        default: present
+        required: false
+    rate_limit:
+        description:
+            - Controller-wide limits on calls to vRA, shared by every module process on the controller (via a
+              state file in C(cache_dir)) so that many forks do not overwhelm vRA - calls are paced by a token
+              bucket whose rate is halved whenever vRA answers 429 or 503 and recovers as calls succeed, transient
+              failures (429 and 5xx, and connection errors for lookups) are retried with jittered backoff honoring
+              C(Retry-After), and a circuit breaker stops all calls for C(cooldown) seconds once C(failure_threshold)
+              consecutive calls have failed, then lets a single call through to check whether vRA has recovered -
+              each process takes calls from the shared bucket a few at a time and batches successes, so the
+              state file is rewritten once per batch or when the circuit breaker changes state
+            - 'Valid attributes are:'
+            - ' - C(enabled) (bool): Whether to rate limit and retry calls (default true).'
+            - ' - C(requests_per_second) (float): Maximum sustained calls per second across the controller (default 20) - use 0 to only retry and break the circuit.'
+            - ' - C(burst) (int): Number of calls that may be made at once before pacing starts (default 40).'
+            - ' - C(max_retries) (int): Maximum number of retries of a failed call (default 5).'
+            - ' - C(failure_threshold) (int): Consecutive failed calls that open the circuit breaker (default 5) - use 0 to disable it.'
+            - ' - C(cooldown) (float): Seconds the circuit breaker stays open before a probe call is let through (default 30).'
+        type: dict
+        required: false
+    token_cache:
+        description:
+            - Whether to share bearer tokens between module runs via C(cache_dir) - tokens are keyed by
+              vRA hostname, tenant and username and re-used until they expire or are rejected by vRA
+        type: bool
+        default: true
+        required: false
     vra_hostname:
         description:
             - Hostname of the vRA instance to communicate with
@@ -65,6 +190,14 @@ options:
         description:
             - Name of the user interacting with the API
         required: true
+    wait:
+        description:
+            - Whether to wait for build requests to complete - when false, the module returns as soon as the build
+              request has been submitted, with its C(request_id), so that many builds can be submitted without
+              holding a fork each and collected later with the C(vra_request_info) module
+        type: bool
+        default: true
+        required: false
     wait_timeout:
         description:
           - Number of seconds to wait for a VM to boot on creation
@@ -75,8 +208,11 @@ options:
 requirements:
     - copy
     - json
+    - multiprocessing
     - requests
+    - threading
     - time
+    - aiohttp (optional, for the asyncio engine)
 
 author:
     - Justin Karimi (@jekhokie) <jekhokie@gmail.com>
@@ -102,6 +238,42 @@ EXAMPLES = '''
     vra_tenant: "vsphere.local"
     vra_username: "automation-user"
     wait_timeout: 300
+    poll_strategy:
+        initial_interval: 5
+        max_interval: 60
+
+- name: Create a batch of VMs from a Blueprint in a single task
+  delegate_to: localhost
+  run_once: true
+  vra_guest:
+    blueprint_instance_id: "vSphere__vCenter__Machine_1"
+    blueprint_name: "Linux"
+    cpu: 2
+    memory: 4096
+    network_adapter: "network-adapter-name"
+    guests:
+        - hostname: "Test-VM-1"
+        - hostname: "Test-VM-2"
+          cpu: 4
+    batch_concurrency: 20
+    vra_hostname: "my-vra-host.localhost"
+    vra_password: "super-secret-pass"
+    vra_tenant: "vsphere.local"
+    vra_username: "automation-user"
+
+- name: Tear down a batch of VMs
+  delegate_to: localhost
+  run_once: true
+  vra_guest:
+    state: absent
+    guests:
+        - hostname: "Test-VM-1"
+        - hostname: "Test-VM-2"
+    batch_concurrency: 50
+    vra_hostname: "my-vra-host.localhost"
+    vra_password: "super-secret-pass"
+    vra_tenant: "vsphere.local"
+    vra_username: "automation-user"
 '''
 
 RETURN = '''
@@ -110,21 +282,307 @@ instance:
     type: dict
     returned: always
     sample: none
+request_id:
+    description: ID of the vRA request that built the VM (when it was created or found)
+    type: str
+    returned: success
+    sample: "7aaf9baf-aa4e-47c4-997b-edd7c7983a5b"
+destroy_request_id:
+    description: ID of the vRA request that destroys the VM (when state is absent and the VM existed)
+    type: str
+    returned: when state is absent
+    sample: "0c3b2f7e-1b2a-4c9d-8e7f-6a5b4c3d2e1f"
+timings:
+    description: Per-operation count, total/max latency (seconds), response bytes and retries of the calls made to vRA
+    type: dict
+    returned: success
+    sample: {"get_vm": {"calls": 2, "total_latency": 0.12, "max_latency": 0.08, "bytes": 2048, "retries": 0}}
+http_calls:
+    description: Number of HTTP calls made to vRA by the task
+    type: int
+    returned: always
+    sample: 7
+guests:
+    description: Per-guest results (changed, failed, msg, state, destroy_id, ip, hostname, request_id and destroy_request_id) when C(guests) is given
+    type: list
+    returned: when guests is given
+    sample: none
 '''
 
 import copy
 import json
-import requests
+import threading
 import time
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.call_timings import CallTimings
+from ansible.module_utils.module_broker_client import BROKER_SOCKET, run_via_broker
+from multiprocessing.pool import ThreadPool
+
+# hand the invocation to the module broker (if one is running) before loading the heavier libraries below
+if __name__ == '__main__':
+    run_via_broker('vra_guest', globals())
+
+import requests
+from ansible.module_utils.vra_session import (VRACacheFile, VRAPollScheduler, VRASession, VRAThrottle, VRAThrottleError,
+                                              VRATokenCache, monotonic)
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
+# libraries of the asyncio engine - only imported when the engine is used, as aiohttp is slow to import
+asyncio = None
+aiohttp = None
+
+def import_async_libraries():
+    """
+    Import the libraries used by the asyncio engine
+
+    Returns: (bool) True if they are available
+    """
+    global asyncio, aiohttp
+    try:
+        import asyncio
+        import aiohttp
+    except ImportError:
+        return False
+
+    return True
+
 # ignore annoyances
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-class VRAHelper(object):
+# binding of the resource action that destroys a machine
+DESTROY_ACTION = 'Infrastructure.Virtual.Action.Destroy'
+
+# options describing a single guest - may be given at the top level or per entry in 'guests'
+GUEST_OPTIONS = ('blueprint_instance_id', 'blueprint_name', 'cpu', 'extra_disks', 'hostname', 'memory', 'network_adapter')
+
+# outbound call instrumentation for this invocation
+TIMINGS = CallTimings('vra_guest')
+
+class VRACatalogCache(VRACacheFile):
+    '''Controller-side index of entitled catalog item names to IDs, per vRA hostname/tenant/user.'''
+
+    def __init__(self, cache_dir, ttl, vra_hostname, vra_tenant, vra_username):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the index in
+            ttl: number of seconds the index is trusted before it is re-validated against vRA
+            vra_hostname: hostname of the vRA instance
+            vra_tenant: tenant the entitlements belong to
+            vra_username: user the entitlements belong to
+
+        Returns: (VRACatalogCache) Instance of the VRACatalogCache class
+        """
+        super(VRACatalogCache, self).__init__(cache_dir, "catalog", vra_hostname, vra_tenant, vra_username)
+        self.ttl = ttl
+
+    def is_fresh(self, index):
+        """
+        Check whether a loaded index is still within its TTL
+        Args:
+            index: document returned by load()
+
+        Returns: (bool) True if the index can be used without contacting vRA
+        """
+        return index is not None and (time.time() - index.get('fetched', 0)) < self.ttl
+
+    def revalidation(self, index, blueprint_name):
+        """
+        Decide whether a loaded index must be refreshed from vRA before a Blueprint is looked up in it
+        Args:
+            index: document returned by load()
+            blueprint_name: name of the Blueprint being looked up
+
+        Returns: (tuple) Whether to fetch the catalog, and the index to re-validate with a conditional GET (None
+                 to download it in full)
+        """
+        if self.is_fresh(index) and blueprint_name in index['items']:
+            return False, None
+
+        # a missing Blueprint means the index may be out of date - skip the conditional GET
+        return True, index if (index is not None and blueprint_name in index['items']) else None
+
+class VRATemplateCache(VRACacheFile):
+    '''Controller-side copy of the request template of a catalog item, per catalog ID and Blueprint version.'''
+
+    def __init__(self, cache_dir, ttl, vra_hostname, vra_tenant, vra_username, catalog_id, catalog_version):
+        """
+        Default constructor
+        Args:
+            cache_dir: directory on the controller to store the template in
+            ttl: number of seconds the template is used before it is fetched again
+            vra_hostname: hostname of the vRA instance
+            vra_tenant: tenant the catalog item belongs to
+            vra_username: user the catalog item is entitled to
+            catalog_id: ID of the catalog item
+            catalog_version: version of the catalog item (a new version invalidates the template)
+
+        Returns: (VRATemplateCache) Instance of the VRATemplateCache class
+        """
+        super(VRATemplateCache, self).__init__(cache_dir, "template", vra_hostname, vra_tenant, vra_username,
+                                               catalog_id, catalog_version)
+        self.ttl = ttl
+
+    def load_template(self):
+        """
+        Read the cached template
+
+        Returns: (dict) Template JSON object, or None if missing or older than the TTL
+        """
+        cached = self.load()
+        if cached is not None and (time.time() - cached.get('fetched', 0)) < self.ttl:
+            return cached['template']
+
+        return None
+
+    def store_template(self, template):
+        """
+        Cache a template fetched from vRA
+        Args:
+            template: template JSON object
+
+        Returns: None
+        """
+        self.store({'fetched': time.time(), 'template': template})
+
+class VRACatalogListing(object):
+    '''Builds the catalog index from the pages of entitled catalog items, re-validating a cached index with a
+    conditional GET - shared by VRAHelper and VRAAsyncClient, which only differ in how the pages are requested.'''
+
+    # path of the entitled catalog items (relative to the vRA hostname)
+    PATH = "/catalog-service/api/consumer/entitledCatalogItems"
+
+    # page size used when downloading the entitled catalog
+    PAGE_SIZE = 500
+
+    def __init__(self, cached=None):
+        """
+        Default constructor
+        Args:
+            cached: previously-fetched index to re-validate with a conditional GET (ETag/Last-Modified)
+
+        Returns: (VRACatalogListing) Instance of the VRACatalogListing class
+        """
+        self.cached = cached
+        self.params = {"limit": self.PAGE_SIZE, "page": 1}
+        self.headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                self.headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                self.headers['If-Modified-Since'] = cached['last_modified']
+
+        self.items = {}
+        self.versions = {}
+        self.validators = {}
+        self.index = None
+
+    def add_page(self, status, headers, page):
+        """
+        Add the response for the page requested with the current params and headers
+        Args:
+            status: HTTP status of the response (304 if the cached index is still current)
+            headers: response headers
+            page: decoded JSON body of the response (None for a 304)
+
+        Returns: (bool) True once the index is complete (in self.index) - otherwise request the next page
+        """
+        if status == 304:
+            self.cached['fetched'] = time.time()
+            self.index = self.cached
+            return True
+
+        if self.params['page'] == 1:
+            self.validators = {
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')
+            }
+
+        for i in page['content']:
+            self.items[i['catalogItem']['name']] = i['catalogItem']['id']
+            self.versions[i['catalogItem']['name']] = i['catalogItem'].get('version')
+
+        if self.params['page'] >= page.get('metadata', {}).get('totalPages', 1):
+            self.index = {
+                'fetched': time.time(),
+                'etag': self.validators.get('etag'),
+                'last_modified': self.validators.get('last_modified'),
+                'items': self.items,
+                'versions': self.versions
+            }
+            return True
+
+        # validators only apply to the first page
+        self.params = dict(self.params, page=self.params['page'] + 1)
+        self.headers = {}
+        return False
+
+def load_machine_index(params, warn):
+    """
+    Load the machine index maintained by the vra inventory plugin, if recent enough to be trusted (a stale
+    entry must never be destroyed, so it is ignored when removing VMs)
+    Args:
+        params: module parameters (vRA connection settings, cache_dir, inventory_index_max_age and state)
+        warn: function reporting a warning
+
+    Returns: (dict) Machines (request_id, destroy_id and ip) by hostname - empty when the index is not used
+    """
+    if params['inventory_index_max_age'] <= 0 or params['state'] != 'present':
+        return {}
+
+    try:
+        index = VRACacheFile(params['cache_dir'], "index", params['vra_hostname'], params['vra_tenant'], params['vra_username']).load()
+        if index is not None and (time.time() - index.get('fetched', 0)) < params['inventory_index_max_age']:
+            return index['machines']
+    except Exception as e:
+        warn("Machine index disabled - could not use cache directory %s: %s" % (params['cache_dir'], e))
+
+    return {}
+
+def indexed_machine(machine_index, hostname):
+    """
+    Look up a VM in the machine index
+    Args:
+        machine_index: machines by hostname returned by load_machine_index
+        hostname: hostname of the VM
+
+    Returns: (dict) Machine (request_id, destroy_id and ip) known to exist without asking vRA, or None
+    """
+    machine = machine_index.get(hostname)
+    return machine if machine is not None and machine.get('ip') else None
+
+class VRAGuestError(Exception):
+    '''Raised in place of fail_json for a single guest of a batch.'''
+    pass
+
+class VRAGuestModule(object):
+    '''Stand-in for the AnsibleModule used by per-guest helpers in batch mode - failures are raised
+    rather than ending the module run so that the remaining guests can carry on.'''
+
+    def __init__(self, module):
+        """
+        Default constructor
+        Args:
+            module: AnsibleModule instance being wrapped
+
+        Returns: (VRAGuestModule) Instance of the VRAGuestModule class
+        """
+        self.module = module
+        self.params = module.params
+        self.check_mode = module.check_mode
+
+    def warn(self, warning):
+        self.module.warn(warning)
+
+    def fail_json(self, msg, **kwargs):
+        raise VRAGuestError(msg)
+
+class VRAHelper(VRASession):
     '''Helper class for managing interaction with vRA and corresponding resources.'''
 
+    # page size used when walking filtered resource listings
+    VM_PAGE_SIZE = 20
+
     def __init__(self, module):
         """
         Default constructor
@@ -133,7 +591,7 @@ class VRAHelper(object):
 
         Returns: (VRAHelper) Instance of the VRAHelper class
         """
-        self.module = module
+        super(VRAHelper, self).__init__(module, TIMINGS, module.params['http_pool_connections'], module.params['http_pool_maxsize'])
         self.blueprint_instance_id = module.params['blueprint_instance_id']
         self.blueprint_name = module.params['blueprint_name']
         self.cpu = module.params['cpu']
@@ -141,69 +599,129 @@ class VRAHelper(object):
         self.hostname = module.params['hostname']
         self.memory = module.params['memory']
         self.network_adapter = module.params['network_adapter']
-        self.vra_hostname = module.params['vra_hostname']
-        self.vra_password = module.params['vra_password']
-        self.vra_tenant = module.params['vra_tenant']
-        self.vra_username = module.params['vra_username']
 
         self.ip = None
-        self.headers = {
-            "accept": "application/json",
-            "content-type": "application/json"
-        }
+        self.request_id = None
+        self.destroy_id = None
+        self.destroy_request_id = None
+        self.state = None
+        self.build_phase = None
+        self.retry_after = None
+        self.changed = False
+        self.error = None
+        self.catalog_version = None
+
+        # machine index maintained by the vra inventory plugin
+        self.machine_index = load_machine_index(module.params, module.warn)
 
         # initialize bearer token for auth
         self.get_auth()
 
-    def get_auth(self):
+    def for_guest(self, guest):
         """
-        Get a bearer token and update the instance headers for authorization
+        Create a helper for another guest that shares this instance's session, token and caches
+        Args:
+            guest: dict of GUEST_OPTIONS describing the guest
 
-        Returns: None (updates the instance headers with token)
+        Returns: (VRAHelper) Helper whose failures raise VRAGuestError rather than exiting the module
         """
-        try:
-            url = "https://%s/identity/api/tokens" % (self.vra_hostname)
-            payload = '{"username":"%s","password":"%s","tenant":"%s"}' % (self.vra_username, self.vra_password, self.vra_tenant)
-            response = requests.request("POST", url, data=payload, headers=self.headers, verify=False)
+        helper = copy.copy(self)
+        helper.module = VRAGuestModule(self.module)
+        for option in GUEST_OPTIONS:
+            setattr(helper, option, guest[option])
 
-            # format bearer token into correct auth pattern
-            token = response.json()['id']
-            self.headers["authorization"] = "Bearer %s" % token
-        except Exception as e:
-            self.module.fail_json(msg="Failed to get bearer token: %s" % (e))
+        helper.ip = None
+        helper.request_id = None
+        helper.destroy_id = None
+        helper.destroy_request_id = None
+        helper.state = None
+        helper.changed = False
+        helper.error = None
+
+        return helper
 
     def get_catalog_id(self):
         """
-        Retrieve the catalog ID for the Blueprint requested
+        Retrieve the catalog ID for the Blueprint requested - served from the on-disk catalog index
+        when possible, which is re-validated once its TTL expires and forcibly refreshed if the
+        Blueprint is missing from it
 
         Returns: None (updates the instance with the catalog ID)
         """
-        catalog_dict = {}
-
         try:
-            url = "https://%s/catalog-service/api/consumer/entitledCatalogItems" % (self.vra_hostname)
-            response = requests.request("GET", url, headers=self.headers, verify=False)
-
-            for i in response.json()['content']:
-                item_name = i['catalogItem']['name']
-                item_id = i['catalogItem']['id']
-                catalog_dict[item_name] = item_id
-
-            self.catalog_id = catalog_dict[self.blueprint_name]
+            cache = None
+            if self.module.params['catalog_cache_ttl'] > 0:
+                try:
+                    cache = VRACatalogCache(self.module.params['cache_dir'], self.module.params['catalog_cache_ttl'],
+                                            self.vra_hostname, self.vra_tenant, self.vra_username)
+                except Exception as e:
+                    self.module.warn("Catalog cache disabled - could not use cache directory %s: %s" % (self.module.params['cache_dir'], e))
+
+            if cache is None:
+                index = self.fetch_catalog_index()
+                self.catalog_id = index['items'][self.blueprint_name]
+                self.catalog_version = index.get('versions', {}).get(self.blueprint_name)
+                return
+
+            with cache.lock():
+                index = cache.load()
+                refresh, conditional = cache.revalidation(index, self.blueprint_name)
+                if refresh:
+                    index = self.fetch_catalog_index(conditional)
+                    cache.store(index)
+
+            self.catalog_id = index['items'][self.blueprint_name]
+            self.catalog_version = index.get('versions', {}).get(self.blueprint_name)
         except Exception as e:
             self.module.fail_json(msg="Failed to get catalog ID for blueprint %s: %s" % (self.blueprint_name, e))
 
+    def fetch_catalog_index(self, cached=None):
+        """
+        Download the entitled catalog items and index them by name
+        Args:
+            cached: previously-fetched index to re-validate with a conditional GET (ETag/Last-Modified)
+
+        Returns: (dict) Index document containing the name->id 'items' and validators
+        """
+        listing = VRACatalogListing(cached)
+        url = "https://%s%s" % (self.vra_hostname, VRACatalogListing.PATH)
+        while True:
+            response = self.request("GET", url, "get_catalog_id", params=listing.params, extra_headers=listing.headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+
+            if listing.add_page(response.status_code, response.headers, response.json() if response.status_code != 304 else None):
+                return listing.index
+
     def get_template_json(self):
         """
-        Retrieve a template JSON object for the Blueprint being requested
+        Retrieve a template JSON object for the Blueprint being requested - templates are cached on
+        disk per catalog ID and Blueprint version (for at most catalog_cache_ttl seconds)
 
         Returns: None (updates the instance with the template JSON object)
         """
         try:
+            cache = None
+            if self.module.params['catalog_cache_ttl'] > 0:
+                try:
+                    cache = VRATemplateCache(self.module.params['cache_dir'], self.module.params['catalog_cache_ttl'], self.vra_hostname,
+                                             self.vra_tenant, self.vra_username, self.catalog_id, self.catalog_version)
+                except Exception as e:
+                    self.module.warn("Template cache disabled - could not use cache directory %s: %s" % (self.module.params['cache_dir'], e))
+
+            if cache is not None:
+                template = cache.load_template()
+                if template is not None:
+                    self.template_json = template
+                    return
+
             url = "https://%s/catalog-service/api/consumer/entitledCatalogItems/%s/requests/template" % (self.vra_hostname, self.catalog_id)
-            response = requests.request("GET", url, headers=self.headers, verify=False)
+            response = self.request("GET", url, "get_template_json", memoize=True)
+            response.raise_for_status()
 
-            self.template_json = response
+            self.template_json = response.json()
+            if cache is not None:
+                cache.store_template(self.template_json)
         except Exception as e:
             self.module.fail_json(msg="Failed to get template JSON for creating the VM: %s" % (e))
 
@@ -213,31 +731,9 @@ class VRAHelper(object):
 
         Returns: None (updates the instance template JSON with customizations)
         """
-        template = dict(self.template_json.json())
-        metadata = template['data'][self.blueprint_instance_id]['data']
-        metadata['cpu'] = self.cpu
-        metadata['memory'] = self.memory
-        metadata['Hostname'] = self.hostname
-        metadata['VirtualMachine.Network0.Name'] = self.network_adapter
-
-        # add custom additional disk drives if requested
-        if len(self.extra_disks) >= 1:
-            disk_meta_orig = copy.deepcopy(metadata['disks'][0])
-            disk_id = disk_meta_orig['data']['id']
-
-            for i, disk in enumerate(self.extra_disks):
-                disk_id += 1
-                disk_meta = copy.deepcopy(disk_meta_orig)
-                disk_meta['data']['capacity'] = self.extra_disks[i]['size_gb']
-                disk_meta['data']['label'] = "Hard disk %s" % (i + 2)
-                disk_meta['data']['volumeId'] = (i + 1)
-                disk_meta['data']['id'] = disk_id
-                disk_meta['data']['userCreated'] = "true"
-                disk_meta['data']['is_clone'] = "false"
-                disk_meta['data']['initial_location'] = self.extra_disks[i]['mount_point']
-                metadata['disks'].append(disk_meta)
-
-        self.template_json = template
+        guest = dict((option, getattr(self, option)) for option in GUEST_OPTIONS)
+        plan = compile_customization(self.template_json, guest)
+        self.template_json = apply_customization(self.template_json, plan, guest)
 
     def create_vm_from_template(self):
         """
@@ -247,23 +743,55 @@ class VRAHelper(object):
         """
         try:
             url = "https://%s/catalog-service/api/consumer/entitledCatalogItems/%s/requests" % (self.vra_hostname, self.catalog_id)
-            response = requests.request("POST", url, headers=self.headers, data=json.dumps(self.template_json), verify=False)
+            response = self.request("POST", url, "create_vm_from_template", data=json.dumps(self.template_json))
 
             self.request_id = response.json()['id']
         except Exception as e:
             self.module.fail_json(msg="Failed to create VM from template: %s" % (e))
 
+    def in_machine_index(self):
+        """
+        Check whether the inventory machine index shows that the VM exists
+
+        Returns: (bool) True if the VM is known to exist without asking vRA
+        """
+        return indexed_machine(self.machine_index, self.hostname) is not None
+
     def get_vm(self):
         """
         Make a request for the details of a VM having a specific hostname
 
         Returns: None (updates the instance with the VM details)
         """
+        # a machine present in the inventory index is known to exist - only fall back to vRA otherwise
+        machine = indexed_machine(self.machine_index, self.hostname)
+        if machine is not None:
+            self.request_id = machine['request_id']
+            self.destroy_id = machine['destroy_id']
+            self.ip = machine['ip']
+            return
+
         try:
-            url = "https://%s/catalog-service/api/consumer/resources/types/Infrastructure.Virtual/?limit=5000" % (self.vra_hostname)
-            response = requests.request("GET", url, headers=self.headers, verify=False)
+            # push the hostname filter to vRA rather than listing every machine in the tenant - the
+            # result set is paged in case the filter is broader than expected (e.g. case-insensitive)
+            url = "https://%s/catalog-service/api/consumer/resources/types/Infrastructure.Virtual/" % (self.vra_hostname)
+            params = {
+                "$filter": "name eq '%s'" % (self.hostname.replace("'", "''")),
+                "limit": self.VM_PAGE_SIZE,
+                "page": 1
+            }
+
+            vms = []
+            while True:
+                response = self.request("GET", url, "get_vm", params=params, memoize=True)
+                page = response.json()
+                vms.extend([i for i in page['content'] if i['name'] == self.hostname])
+
+                total_pages = page.get('metadata', {}).get('totalPages', 1)
+                if params['page'] >= total_pages:
+                    break
+                params['page'] += 1
 
-            vms = [i for i in response.json()['content'] if i['name'] == self.hostname]
             if len(vms) > 1:
                 self.module.fail_json(msg="Duplicate VMs with hostname %s." % (self.hostname))
             elif len(vms) == 1:
@@ -271,7 +799,7 @@ class VRAHelper(object):
 
                 # get details about the VM
                 url = "https://%s/catalog-service/api/consumer/requests/%s/resources" % (self.vra_hostname, self.request_id)
-                response = requests.request("GET", url, headers=self.headers, verify=False)
+                response = self.request("GET", url, "get_vm", memoize=True)
 
                 # get the Destroy ID and VM Name using list comprehension
                 meta_dict = [element for element in response.json()['content'] if element['providerBinding']['providerRef']['label'] == 'Infrastructure Service'][0]
@@ -280,6 +808,11 @@ class VRAHelper(object):
                 # get the VM IP address using list comprehension
                 vm_data = [element for element in meta_dict['resourceData']['entries'] if element['key'] == 'ip_address'][0]
                 self.ip = vm_data['value']['value']
+
+                # the machine state is part of the same resource data - saves a call in get_vm_state
+                state_data = [element for element in meta_dict['resourceData']['entries'] if element['key'] == 'MachineStatus']
+                if len(state_data) > 0:
+                    self.state = state_data[0]['value']['value']
         except Exception as e:
             self.module.fail_json(msg="Failed to get VM details for '%s': %s" % (self.hostname, e))
 
@@ -297,53 +830,1046 @@ class VRAHelper(object):
         - Off
         - Rebooting
 
+        The state is usually already known from the resource data fetched by get_vm, in which case no
+        request is made.
+
         Returns: None (updates the instance with the VM state information)
         """
+        if self.state is not None:
+            return
+
         try:
             if self.request_id == None:
                 self.module.fail_json(msg="No request ID to request VM state information for")
 
             url = "https://%s/catalog-service/api/consumer/resources/%s" % (self.vra_hostname, self.destroy_id)
-            response = requests.request("GET", url, headers=self.headers, verify=False)
+            response = self.request("GET", url, "get_vm_state", memoize=True)
 
             meta_dict = [element for element in response.json()['resourceData']['entries'] if element['key'] == 'MachineStatus'][0]
             self.state = meta_dict['value']['value']
         except Exception as e:
             self.module.fail_json(msg="Failed to get VM state information for '%s': %s" % (self.hostname, e))
 
-    def get_vm_build_status(self):
+    def get_vm_build_status(self, request_id=None):
         """
-        Check on the status of a VM that had been requested to be built
+        Check on the status of a VM that had been requested to be built (or destroyed)
+        Args:
+            request_id: ID of the request to check (defaults to the build request)
 
         Returns: None (updates the instance with the VM build details)
         """
         try:
-            url = "https://%s/catalog-service/api/consumer/requests/%s" % (self.vra_hostname, self.request_id)
-            response = requests.request("GET", url, headers=self.headers, verify=False)
+            url = "https://%s/catalog-service/api/consumer/requests/%s" % (self.vra_hostname, request_id or self.request_id)
+            response = self.request("GET", url, "get_vm_build_status")
 
             self.build_status = response.json()['stateName']
+            self.build_phase = response.json().get('phase')
+            self.retry_after = VRAPollScheduler.parse_retry_after(response.headers.get('Retry-After'))
             explanation = response.json()['requestCompletion']
             if explanation is None:
                 self.build_explanation = ""
             else:
                 self.build_explanation = explanation['completionDetails']
         except Exception as e:
-            self.module.fail_json(msg="Failed to get VM create status: %s" % (e))
+            self.module.fail_json(msg="Failed to get VM %s status: %s" % ("create" if request_id is None else "destroy", e))
+
+    def destroy_vm(self):
+        """
+        Submit the Destroy resource action for the VM
+
+        Returns: None (updates the instance with the destroy request ID)
+        """
+        try:
+            url = "https://%s/catalog-service/api/consumer/resources/%s/actions" % (self.vra_hostname, self.destroy_id)
+            response = self.request("GET", url, "get_destroy_action", memoize=True)
+            response.raise_for_status()
+
+            actions = [a for a in response.json()['content'] if a.get('bindingId') == DESTROY_ACTION or a.get('name') == 'Destroy']
+            if len(actions) == 0:
+                self.module.fail_json(msg="No Destroy action is available for '%s'" % (self.hostname))
+
+            url = "%s/%s/requests" % (url, actions[0]['id'])
+            response = self.request("GET", "%s/template" % (url), "get_destroy_template", memoize=True)
+            response.raise_for_status()
+
+            response = self.request("POST", url, "destroy_vm", data=json.dumps(response.json()))
+            response.raise_for_status()
+
+            self.destroy_request_id = request_id_from(response.headers.get('Location'), response.content)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to destroy VM '%s': %s" % (self.hostname, e))
+
+class VRAAsyncClient(object):
+    '''asyncio-native client covering the same vRA operations as VRAHelper, allowing many requests to
+    be in flight from a single process - the machine index, catalog index and template caches are shared
+    with VRAHelper, and the (blocking) cache file locks are taken in the default executor.'''
+
+    def __init__(self, module, concurrency):
+        """
+        Default constructor
+        Args:
+            module: AnsibleModule instance (vRA connection settings and cache settings)
+            concurrency: maximum number of concurrent connections to vRA
+
+        Returns: (VRAAsyncClient) Instance of the VRAAsyncClient class
+        """
+        params = module.params
+        self.params = params
+        self.vra_hostname = params['vra_hostname']
+        self.concurrency = concurrency
+        self.session = None
+        self.token = None
+        self.stats = {'http_calls': 0}
+        self.auth_lock = asyncio.Lock()
+        self.catalog_lock = asyncio.Lock()
+        self.machine_index = load_machine_index(params, module.warn)
+        self.headers = {
+            "accept": "application/json",
+            "content-type": "application/json"
+        }
+
+        self.token_cache = None
+        if params['token_cache']:
+            self.token_cache = VRATokenCache(params['cache_dir'], self.vra_hostname, params['vra_tenant'], params['vra_username'])
+
+        self.throttle = None
+        if params['rate_limit']['enabled']:
+            self.throttle = VRAThrottle(params['cache_dir'], params['rate_limit'], self.vra_hostname)
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ssl=False)
+        self.session = aiohttp.ClientSession(connector=connector)
+        await self.get_auth()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def get_auth(self, stale_token=None):
+        """
+        Get a bearer token (shared with other module runs via the token cache, if enabled)
+        Args:
+            stale_token: ID of a token that vRA rejected and which must not be re-used
+
+        Returns: None (updates the instance headers with token)
+        """
+        async with self.auth_lock:
+            # another coroutine may already have refreshed the token
+            if stale_token is not None and self.token != stale_token:
+                return
+
+            if self.token_cache is None:
+                self.token = (await self.request_token())['id']
+            else:
+                lock = self.token_cache.lock()
+                await self.run_blocking(lock.__enter__)
+                try:
+                    if stale_token is not None:
+                        self.token_cache.invalidate(stale_token)
+
+                    self.token = self.token_cache.read()
+                    if self.token is None:
+                        token = await self.request_token()
+                        self.token_cache.write(token)
+                        self.token = token['id']
+                finally:
+                    lock.__exit__(None, None, None)
+
+            self.headers["authorization"] = "Bearer %s" % self.token
+
+    @staticmethod
+    async def run_blocking(function, *args):
+        """
+        Run a function that may wait on a cache file lock in the default executor, so that the event loop carries on
+        Args:
+            function: function to run
+            args: arguments of the function
+
+        Returns: Result of the function
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+
+    async def request_token(self):
+        """
+        Log in to vRA and request a new bearer token
+
+        Returns: (dict) Token response (containing 'id' and 'expires')
+        """
+        url = "https://%s/identity/api/tokens" % (self.vra_hostname)
+        payload = json.dumps({"username": self.params['vra_username'], "password": self.params['vra_password'], "tenant": self.params['vra_tenant']})
+        headers = dict((k, v) for k, v in self.headers.items() if k != "authorization")
+        start = monotonic()
+        status, response_headers, body, retries = await self.send_throttled("POST", url, headers, data=payload)
+        TIMINGS.record("get_auth", monotonic() - start, len(body), retries)
+        self.raise_for_status(url, status)
+        return json.loads(body.decode('utf-8'))
+
+    async def send_throttled(self, method, url, headers, **kwargs):
+        """
+        Make a call through the controller-wide rate limiter (if enabled), retrying transient failures
+        with jittered backoff that honors Retry-After - the asyncio counterpart of VRAHelper.send_throttled
+        Args:
+            method: HTTP method of the call
+            url: full URL of the resource
+            headers: dict of headers to send
+            kwargs: additional arguments passed through to aiohttp
+
+        Returns: (tuple) HTTP status, response headers, raw body and the number of retries made
+        """
+        backoff = VRAPollScheduler(VRAThrottle.RETRY_STRATEGY, 0)
+        retries = 0
+        while True:
+            if self.throttle is not None:
+                delay, reserved = await self.run_blocking(self.throttle.reserve)
+                if not reserved:
+                    if retries >= self.throttle.settings['max_retries']:
+                        raise VRAThrottleError("vRA circuit breaker is open after repeated failures - not calling vRA")
+                    retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                await asyncio.sleep(delay)
+
+            self.stats['http_calls'] += 1
+            try:
+                async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                    status = response.status
+                    response_headers = response.headers
+                    body = await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if self.throttle is None:
+                    raise
+                await self.run_blocking(self.throttle.report, None)
+                if method != "GET" or retries >= self.throttle.settings['max_retries']:
+                    raise
+                status = None
+                response_headers = {}
+            else:
+                if self.throttle is not None:
+                    await self.run_blocking(self.throttle.report, status)
+
+            if self.throttle is None or retries >= self.throttle.settings['max_retries'] or not VRAThrottle.should_retry(method, status):
+                return status, response_headers, body, retries
+
+            retries += 1
+            await asyncio.sleep(backoff.next_delay(None, VRAPollScheduler.parse_retry_after(response_headers.get('Retry-After'))))
+
+    @staticmethod
+    def raise_for_status(url, status):
+        """
+        Raise an error for an unsuccessful HTTP status
+        Args:
+            url: URL that was called
+            status: HTTP status of the response
+
+        Returns: None
+        """
+        if status >= 400:
+            raise VRAGuestError("HTTP %s returned by %s" % (status, url))
+
+    async def request(self, method, path, operation, extra_headers=None, **kwargs):
+        """
+        Perform an authenticated request against vRA, refreshing the bearer token once if it was rejected
+        Args:
+            method: HTTP method
+            path: path of the resource (relative to the vRA hostname)
+            operation: name of the operation, used for instrumentation
+            extra_headers: dict of additional headers for this request only (e.g. conditional GET validators)
+            kwargs: additional arguments passed through to aiohttp
+
+        Returns: (tuple) HTTP status, response headers and decoded JSON body
+        """
+        url = "https://%s%s" % (self.vra_hostname, path)
+        start = monotonic()
+        retries = 0
+        for attempt in range(2):
+            token = self.token
+            status, headers, body, attempt_retries = await self.send_throttled(method, url, dict(self.headers, **(extra_headers or {})), **kwargs)
+            retries += attempt_retries
+            if status == 401 and attempt == 0:
+                await self.get_auth(stale_token=token)
+                retries += 1
+                continue
+
+            TIMINGS.record(operation, monotonic() - start, len(body), retries)
+            self.raise_for_status(url, status)
+            return status, headers, json.loads(body.decode('utf-8')) if body else None
+
+    async def get_catalog(self, blueprint_name):
+        """
+        Retrieve the catalog ID and version for a Blueprint - served from the on-disk catalog index when possible,
+        which is re-validated once its TTL expires and forcibly refreshed if the Blueprint is missing from it
+        Args:
+            blueprint_name: name of the Blueprint
+
+        Returns: (tuple) Catalog ID and catalog item version
+        """
+        if self.params['catalog_cache_ttl'] <= 0:
+            index = await self.fetch_catalog_index()
+            return index['items'][blueprint_name], index.get('versions', {}).get(blueprint_name)
+
+        cache = VRACatalogCache(self.params['cache_dir'], self.params['catalog_cache_ttl'], self.vra_hostname,
+                                self.params['vra_tenant'], self.params['vra_username'])
+
+        # one Blueprint at a time holds (or waits for) the file lock, so the executor is never filled with waiters
+        async with self.catalog_lock:
+            lock = cache.lock()
+            await self.run_blocking(lock.__enter__)
+            try:
+                index = cache.load()
+                refresh, conditional = cache.revalidation(index, blueprint_name)
+                if refresh:
+                    index = await self.fetch_catalog_index(conditional)
+                    cache.store(index)
+            finally:
+                lock.__exit__(None, None, None)
+
+        return index['items'][blueprint_name], index.get('versions', {}).get(blueprint_name)
+
+    async def fetch_catalog_index(self, cached=None):
+        """
+        Download the entitled catalog items and index them by name
+        Args:
+            cached: previously-fetched index to re-validate with a conditional GET (ETag/Last-Modified)
+
+        Returns: (dict) Index document containing the name->id 'items' and validators
+        """
+        listing = VRACatalogListing(cached)
+        while True:
+            status, headers, page = await self.request("GET", VRACatalogListing.PATH, "get_catalog_id", extra_headers=listing.headers,
+                                                       params=listing.params)
+            if listing.add_page(status, headers, page):
+                return listing.index
+
+    async def get_template(self, catalog_id, catalog_version):
+        """
+        Retrieve the request template JSON object for a catalog item - cached on disk per catalog ID and
+        Blueprint version (for at most catalog_cache_ttl seconds)
+        Args:
+            catalog_id: ID of the catalog item
+            catalog_version: version of the catalog item
+
+        Returns: (dict) Template JSON object
+        """
+        cache = None
+        if self.params['catalog_cache_ttl'] > 0:
+            cache = VRATemplateCache(self.params['cache_dir'], self.params['catalog_cache_ttl'], self.vra_hostname,
+                                     self.params['vra_tenant'], self.params['vra_username'], catalog_id, catalog_version)
+            template = cache.load_template()
+            if template is not None:
+                return template
+
+        status, headers, template = await self.request("GET", "%s/%s/requests/template" % (VRACatalogListing.PATH, catalog_id), "get_template_json")
+        if cache is not None:
+            cache.store_template(template)
+
+        return template
+
+    async def create(self, catalog_id, template):
+        """
+        Submit a request to provision a VM with a customized template
+
+        Returns: (str) Request ID
+        """
+        status, headers, body = await self.request("POST", "/catalog-service/api/consumer/entitledCatalogItems/%s/requests" % (catalog_id), "create_vm_from_template",
+                                                   data=json.dumps(template))
+        return body['id']
+
+    async def get_request(self, request_id):
+        """
+        Check on the status of a request
+
+        Returns: (dict) 'status', 'phase', 'explanation' and 'retry_after' of the request
+        """
+        status, headers, body = await self.request("GET", "/catalog-service/api/consumer/requests/%s" % (request_id), "get_vm_build_status")
+        explanation = body['requestCompletion']
+        return {
+            'status': body['stateName'],
+            'phase': body.get('phase'),
+            'explanation': "" if explanation is None else explanation['completionDetails'],
+            'retry_after': VRAPollScheduler.parse_retry_after(headers.get('Retry-After'))
+        }
+
+    async def find_vm(self, hostname):
+        """
+        Look up a VM by hostname - in the machine index first, only falling back to vRA for a VM missing from it
+
+        Returns: (dict) 'request_id', 'destroy_id', 'ip' and 'state' of the VM, or None if it does not exist
+        """
+        machine = indexed_machine(self.machine_index, hostname)
+        if machine is not None:
+            return {'request_id': machine['request_id'], 'destroy_id': machine['destroy_id'], 'ip': machine['ip'], 'state': None}
+
+        params = {"$filter": "name eq '%s'" % (hostname.replace("'", "''")), "limit": VRAHelper.VM_PAGE_SIZE, "page": 1}
+        vms = []
+        while True:
+            status, headers, page = await self.request("GET", "/catalog-service/api/consumer/resources/types/Infrastructure.Virtual/", "get_vm", params=dict(params))
+            vms.extend([i for i in page['content'] if i['name'] == hostname])
+            if params['page'] >= page.get('metadata', {}).get('totalPages', 1):
+                break
+            params['page'] += 1
+
+        if len(vms) > 1:
+            raise VRAGuestError("Duplicate VMs with hostname %s." % (hostname))
+        elif len(vms) == 0:
+            return None
+
+        request_id = vms[0]['requestId']
+        status, headers, body = await self.request("GET", "/catalog-service/api/consumer/requests/%s/resources" % (request_id), "get_vm")
+        meta_dict = [element for element in body['content'] if element['providerBinding']['providerRef']['label'] == 'Infrastructure Service'][0]
+        vm_data = [element for element in meta_dict['resourceData']['entries'] if element['key'] == 'ip_address'][0]
+        state_data = [element for element in meta_dict['resourceData']['entries'] if element['key'] == 'MachineStatus']
+
+        return {
+            'request_id': request_id,
+            'destroy_id': meta_dict['id'],
+            'ip': vm_data['value']['value'],
+            'state': state_data[0]['value']['value'] if len(state_data) > 0 else None
+        }
+
+    async def destroy(self, destroy_id):
+        """
+        Submit the Destroy resource action for a VM
+
+        Returns: (str) Request ID
+        """
+        path = "/catalog-service/api/consumer/resources/%s/actions" % (destroy_id)
+        status, headers, body = await self.request("GET", path, "get_destroy_action")
+        actions = [a for a in body['content'] if a.get('bindingId') == DESTROY_ACTION or a.get('name') == 'Destroy']
+        if len(actions) == 0:
+            raise VRAGuestError("No Destroy action is available")
+
+        path = "%s/%s/requests" % (path, actions[0]['id'])
+        status, headers, template = await self.request("GET", "%s/template" % (path), "get_destroy_template")
+        status, headers, body = await self.request("POST", path, "destroy_vm", data=json.dumps(template))
+        return request_id_from(headers.get('Location'), json.dumps(body))
+
+    async def get_vm_state(self, destroy_id):
+        """
+        Find the state of a VM (On, TurningOn, TurningOff, Off, Rebooting)
+
+        Returns: (str) State of the VM
+        """
+        status, headers, body = await self.request("GET", "/catalog-service/api/consumer/resources/%s" % (destroy_id), "get_vm_state")
+        meta_dict = [element for element in body['resourceData']['entries'] if element['key'] == 'MachineStatus'][0]
+        return meta_dict['value']['value']
+
+class VRAAsyncGuest(object):
+    '''Progress of a single guest provisioned via the asyncio engine.'''
+
+    def __init__(self, guest):
+        """
+        Default constructor
+        Args:
+            guest: dict of GUEST_OPTIONS describing the guest
+
+        Returns: (VRAAsyncGuest) Instance of the VRAAsyncGuest class
+        """
+        self.guest = guest
+        self.hostname = guest['hostname']
+        self.ip = None
+        self.request_id = None
+        self.destroy_id = None
+        self.destroy_request_id = None
+        self.state = None
+        self.build_status = None
+        self.build_phase = None
+        self.retry_after = None
+        self.changed = False
+        self.error = None
+
+    def update_vm(self, vm):
+        """
+        Record the details of the VM found for this guest (if any)
+        """
+        if vm is not None:
+            self.request_id = vm['request_id']
+            self.destroy_id = vm['destroy_id']
+            self.ip = vm['ip']
+            self.state = vm['state']
+
+def compile_customization(template, guest):
+    """
+    Pre-compute the hostname-independent customizations (cpu, memory, network, extra disks) for a
+    Blueprint template so they can be applied to any number of hosts without re-building them
+    Args:
+        template: Blueprint template JSON object (dict) as returned by vRA
+        guest: dict of GUEST_OPTIONS describing the guest
+
+    Returns: (dict) Customization plan with the metadata 'fields' to set and 'disks' to append
+    """
+    metadata = template['data'][guest['blueprint_instance_id']]['data']
+    plan = {
+        'fields': {
+            'cpu': guest['cpu'],
+            'memory': guest['memory'],
+            'VirtualMachine.Network0.Name': guest['network_adapter']
+        },
+        'disks': []
+    }
+
+    # add custom additional disk drives if requested
+    if len(guest['extra_disks']) >= 1:
+        disk_meta_orig = metadata['disks'][0]
+        disk_id = disk_meta_orig['data']['id']
+
+        for i, disk in enumerate(guest['extra_disks']):
+            disk_id += 1
+            disk_meta = dict(disk_meta_orig)
+            disk_meta['data'] = dict(disk_meta_orig['data'])
+            disk_meta['data']['capacity'] = disk['size_gb']
+            disk_meta['data']['label'] = "Hard disk %s" % (i + 2)
+            disk_meta['data']['volumeId'] = (i + 1)
+            disk_meta['data']['id'] = disk_id
+            disk_meta['data']['userCreated'] = "true"
+            disk_meta['data']['is_clone'] = "false"
+            disk_meta['data']['initial_location'] = disk['mount_point']
+            plan['disks'].append(disk_meta)
+
+    return plan
+
+def apply_customization(template, plan, guest):
+    """
+    Apply a customization plan to a Blueprint template for a specific host - only the containers on
+    the path to the instance metadata are copied, the rest of the template is shared
+    Args:
+        template: Blueprint template JSON object (dict) - left unmodified
+        plan: customization plan returned by compile_customization
+        guest: dict of GUEST_OPTIONS describing the guest
+
+    Returns: (dict) Customized template JSON object
+    """
+    instance_id = guest['blueprint_instance_id']
+    customized = dict(template)
+    customized['data'] = dict(template['data'])
+    instance = dict(template['data'][instance_id])
+    customized['data'][instance_id] = instance
+
+    metadata = dict(instance['data'])
+    metadata.update(plan['fields'])
+    metadata['Hostname'] = guest['hostname']
+    metadata['disks'] = list(metadata['disks']) + plan['disks']
+    instance['data'] = metadata
+
+    return customized
+
+def guest_result(vra_helper):
+    """
+    Build the per-guest portion of the module result
+    Args:
+        vra_helper: VRAHelper instance for the guest
+
+    Returns: (dict) Result for the guest
+    """
+    return dict(
+        changed=vra_helper.changed,
+        failed=vra_helper.error is not None,
+        msg=vra_helper.error or '',
+        state=vra_helper.state or '',
+        destroy_id=vra_helper.destroy_id or '',
+        ip=vra_helper.ip or '',
+        hostname=vra_helper.hostname,
+        request_id=vra_helper.request_id or '',
+        destroy_request_id=vra_helper.destroy_request_id or ''
+    )
+
+def request_id_from(location, body):
+    """
+    Find the ID of a request submitted via a resource action - vRA answers with the new request in the
+    Location header and usually an empty body
+    Args:
+        location: Location header of the response
+        body: raw response body
+
+    Returns: (str) Request ID
+    """
+    if location:
+        return location.rstrip('/').split('/')[-1]
+
+    return json.loads(body)['id']
+
+def forget_machines(module, hostnames):
+    """
+    Remove destroyed VMs from the machine index maintained by the vra inventory plugin (if there is one)
+    Args:
+        module: AnsibleModule instance
+        hostnames: list of hostnames of the destroyed VMs
+
+    Returns: None
+    """
+    if not hostnames:
+        return
+
+    params = module.params
+    try:
+        index_file = VRACacheFile(params['cache_dir'], "index", params['vra_hostname'], params['vra_tenant'], params['vra_username'])
+        with index_file.lock():
+            index = index_file.load()
+            if index is not None and any(h in index['machines'] for h in hostnames):
+                for hostname in hostnames:
+                    index['machines'].pop(hostname, None)
+                index_file.store(index)
+    except Exception as e:
+        module.warn("Could not remove destroyed VMs from the machine index in %s: %s" % (params['cache_dir'], e))
+
+def run_guest_step(step):
+    """
+    Wrap a per-guest step for use in a thread pool so that failures are recorded against the guest
+    rather than aborting the entire batch
+    Args:
+        step: function taking a VRAHelper instance
+
+    Returns: (function) Wrapped step
+    """
+    def wrapper(vra_helper):
+        if vra_helper.error is not None:
+            return
+        try:
+            step(vra_helper)
+        except Exception as e:
+            vra_helper.error = str(e)
+
+    return wrapper
+
+class VRABlueprintPrefetch(object):
+    '''Fetches the catalog ID and template of each Blueprint in the background while the existence
+    checks are still in flight, so that they are ready by the time it is known which guests need creating.'''
+
+    def __init__(self, vra_helper, guests, concurrency):
+        """
+        Default constructor - starts fetching immediately
+        Args:
+            vra_helper: authenticated VRAHelper instance whose session, token and caches are shared
+            guests: list of guest specifications (dicts of GUEST_OPTIONS)
+            concurrency: maximum number of Blueprints fetched at once
+
+        Returns: (VRABlueprintPrefetch) Instance of the VRABlueprintPrefetch class
+        """
+        self.blueprints = {}
+        for guest in guests:
+            if guest['blueprint_name'] not in self.blueprints:
+                self.blueprints[guest['blueprint_name']] = vra_helper.for_guest(guest)
+
+        self.cancelled = threading.Event()
+        self.pool = ThreadPool(max(1, min(concurrency, len(self.blueprints))))
+        step = run_guest_step(self.fetch)
+        self.pending = dict((name, self.pool.apply_async(step, (h,))) for name, h in self.blueprints.items())
+
+    def fetch(self, vra_helper):
+        """
+        Fetch the catalog ID and template of a Blueprint - skipping whatever is left once the prefetch is closed
+        Args:
+            vra_helper: VRAHelper instance for the Blueprint
+
+        Returns: None
+        """
+        if not self.cancelled.is_set():
+            vra_helper.get_catalog_id()
+        if not self.cancelled.is_set():
+            vra_helper.get_template_json()
+
+    def apply(self, vra_helper):
+        """
+        Wait for the Blueprint of a guest to be fetched and hand its catalog ID and template to the guest
+        Args:
+            vra_helper: VRAHelper instance for the guest (its error is set if the fetch failed)
+
+        Returns: None
+        """
+        self.pending[vra_helper.blueprint_name].wait()
+        source = self.blueprints[vra_helper.blueprint_name]
+        if source.error is not None:
+            vra_helper.error = source.error
+        else:
+            vra_helper.catalog_id = source.catalog_id
+            vra_helper.catalog_version = source.catalog_version
+            vra_helper.template_json = source.template_json
+
+    def close(self):
+        """
+        Cancel the fetches not yet started (no guest needs them any more), wait for any call still in flight
+        and release the threads
+
+        Returns: None
+        """
+        self.cancelled.set()
+        self.pool.close()
+        self.pool.join()
+
+def run_batch(module, vra_helper, guests, result):
+    """
+    Provision a batch of guests - existence checks and build submissions run concurrently, the
+    catalog/template lookups happen once per Blueprint and a single loop tracks every build request
+    Args:
+        module: AnsibleModule instance
+        vra_helper: authenticated VRAHelper instance shared by all guests
+        guests: list of guest specifications (dicts of GUEST_OPTIONS)
+        result: module result dict to update
+
+    Returns: None (exits the module)
+    """
+    helpers = [vra_helper.for_guest(guest) for guest in guests]
+    pool = ThreadPool(max(1, min(module.params['batch_concurrency'], len(helpers))))
+
+    # fetch the catalog ID and template once per Blueprint, alongside the existence checks - only for the
+    # guests that the machine index does not already show as existing
+    prefetch = None
+    if not module.check_mode:
+        unindexed = [guest for guest, h in zip(guests, helpers) if not h.in_machine_index()]
+        prefetch = VRABlueprintPrefetch(vra_helper, unindexed, module.params['batch_concurrency'])
+
+    try:
+        pool.map(run_guest_step(lambda h: h.get_vm()), helpers)
+        pending = [h for h in helpers if h.error is None and h.ip is None]
+        for h in pending:
+            h.changed = True
+
+        if not module.check_mode:
+            for h in pending:
+                prefetch.apply(h)
+
+            pool.map(run_guest_step(lambda h: (h.customize_template(), h.create_vm_from_template())), pending)
+
+            # single status loop for every outstanding build request (unless only submitting)
+            if module.params['wait']:
+                wait_for_requests(module, pool, pending, lambda h: h.get_vm_build_status(), "create")
+                pool.map(run_guest_step(lambda h: h.get_vm()), [h for h in pending if h.error is None])
+            pool.map(run_guest_step(lambda h: h.get_vm_state()), [h for h in helpers if h.error is None and h.destroy_id is not None])
+    finally:
+        pool.close()
+        pool.join()
+        if prefetch is not None:
+            prefetch.close()
+
+    finish_batch(module, vra_helper, helpers, result)
+
+def run_batch_destroy(module, vra_helper, guests, result):
+    """
+    Destroy a batch of guests - existence checks and destroy submissions run concurrently and a single
+    loop tracks every destroy request
+    Args:
+        module: AnsibleModule instance
+        vra_helper: authenticated VRAHelper instance shared by all guests
+        guests: list of guest specifications (dicts of GUEST_OPTIONS)
+        result: module result dict to update
+
+    Returns: None (exits the module)
+    """
+    helpers = [vra_helper.for_guest(guest) for guest in guests]
+    pool = ThreadPool(max(1, min(module.params['batch_concurrency'], len(helpers))))
+
+    try:
+        pool.map(run_guest_step(lambda h: h.get_vm()), helpers)
+        pending = [h for h in helpers if h.error is None and h.destroy_id is not None]
+        for h in helpers:
+            h.changed = h in pending
+            if h.error is None and h.destroy_id is None:
+                h.state = 'absent'
+
+        if not module.check_mode:
+            pool.map(run_guest_step(lambda h: h.destroy_vm()), pending)
+            if module.params['wait']:
+                wait_for_requests(module, pool, pending, lambda h: h.get_vm_build_status(h.destroy_request_id), "destroy")
+                for h in pending:
+                    if h.error is None:
+                        h.state = 'absent'
+    finally:
+        pool.close()
+        pool.join()
+
+    forget_machines(module, [h.hostname for h in pending if h.error is None and h.destroy_request_id is not None])
+    finish_batch(module, vra_helper, helpers, result)
+
+def wait_for_requests(module, pool, helpers, poll, action):
+    """
+    Poll the outstanding requests of a batch in a single loop until they all finish or wait_timeout passes
+    Args:
+        module: AnsibleModule instance
+        pool: ThreadPool used to poll concurrently
+        helpers: VRAHelper instances with an outstanding request (those with an error are skipped)
+        poll: function updating the build status of a VRAHelper instance
+        action: name of the requested action for error messages (create, destroy)
+
+    Returns: None (errors are recorded against the guests)
+    """
+    outstanding = [h for h in helpers if h.error is None]
+    timeout_seconds = module.params['wait_timeout']
+    scheduler = VRAPollScheduler(module.params['poll_strategy'], timeout_seconds)
+    while outstanding:
+        pool.map(run_guest_step(poll), outstanding)
+
+        expired = scheduler.expired()
+        for h in outstanding:
+            if h.error is None and h.build_status == 'Failed':
+                h.error = "Failed to %s VM: %s" % (action, h.build_explanation)
+            elif h.error is None and h.build_status != 'Successful' and expired:
+                h.error = "Failed to %s VM in %s seconds" % (action, timeout_seconds)
+
+        outstanding = [h for h in outstanding if h.error is None and h.build_status != 'Successful']
+        if outstanding:
+            retry_after = max([h.retry_after or 0 for h in outstanding]) or None
+            scheduler.wait(tuple(sorted(set([str(h.build_phase) for h in outstanding]))), retry_after)
+
+def finish_batch(module, vra_helper, helpers, result):
+    """
+    Report the results of a batch
+    Args:
+        module: AnsibleModule instance
+        vra_helper: VRAHelper instance shared by all guests
+        helpers: VRAHelper instance per guest
+        result: module result dict to update
+
+    Returns: None (exits the module)
+    """
+    result['guests'] = [guest_result(h) for h in helpers]
+    result['changed'] = any(h.changed for h in helpers)
+    result['http_calls'] = vra_helper.stats['http_calls']
+
+    vra_helper.session.close()
+    failures = [h for h in helpers if h.error is not None]
+    if failures:
+        result['timings'] = TIMINGS.summary()
+        module.fail_json(msg="Failed to provision %s of %s guests" % (len(failures), len(helpers)), **result)
+
+    result['timings'] = TIMINGS.summary()
+    module.exit_json(**result)
+
+async def run_batch_async(module, guests):
+    """
+    Provision a list of guests using the asyncio engine - mirrors run_batch but keeps every request in
+    flight from a single event loop rather than a thread pool
+    Args:
+        module: AnsibleModule instance
+        guests: list of guest specifications (dicts of GUEST_OPTIONS)
+
+    Returns: (tuple) VRAAsyncGuest instance per guest and the client statistics
+    """
+    records = [VRAAsyncGuest(guest) for guest in guests]
+    semaphore = asyncio.Semaphore(max(1, module.params['batch_concurrency']))
+
+    async def step(record, coroutine_function):
+        if record.error is not None:
+            return
+        try:
+            async with semaphore:
+                await coroutine_function(record)
+        except Exception as e:
+            record.error = str(e)
+
+    async def each(targets, coroutine_function):
+        await asyncio.gather(*[step(record, coroutine_function) for record in targets])
+
+    async with VRAAsyncClient(module, module.params['http_pool_maxsize']) as client:
+        async def lookup(record):
+            record.update_vm(await client.find_vm(record.hostname))
+
+        if module.params['state'] == 'absent':
+            await destroy_batch_async(module, client, records, each, lookup)
+            return records, client.stats
+
+        async def prepare(blueprint_name):
+            catalog_id, catalog_version = await client.get_catalog(blueprint_name)
+            return catalog_id, await client.get_template(catalog_id, catalog_version)
+
+        # fetch the catalog ID and template once per Blueprint, alongside the existence checks - only for the
+        # guests that the machine index does not already show as existing
+        blueprints = {}
+        if not module.check_mode:
+            for r in records:
+                if indexed_machine(client.machine_index, r.hostname) is None and r.guest['blueprint_name'] not in blueprints:
+                    blueprints[r.guest['blueprint_name']] = asyncio.ensure_future(prepare(r.guest['blueprint_name']))
+
+        try:
+            await each(records, lookup)
+            pending = [r for r in records if r.error is None and r.ip is None]
+            for r in pending:
+                r.changed = True
+
+            if module.check_mode:
+                return records, client.stats
+
+            async def submit(record):
+                catalog_id, template = await blueprints[record.guest['blueprint_name']]
+                plan = compile_customization(template, record.guest)
+                record.request_id = await client.create(catalog_id, apply_customization(template, plan, record.guest))
+
+            await each(pending, submit)
+
+            # single status loop for every outstanding build request
+            if module.params['wait']:
+                await wait_for_requests_async(module, client, pending, each, lambda r: r.request_id, "create")
+                await each([r for r in pending if r.error is None], lookup)
+
+            async def state(record):
+                record.state = await client.get_vm_state(record.destroy_id)
+
+            await each([r for r in records if r.error is None and r.state is None and r.destroy_id is not None], state)
+        finally:
+            # collect fetches for Blueprints that no guest ended up needing
+            await asyncio.gather(*blueprints.values(), return_exceptions=True)
+
+    return records, client.stats
+
+async def destroy_batch_async(module, client, records, each, lookup):
+    """
+    Destroy a list of guests using the asyncio engine - mirrors run_batch_destroy
+    Args:
+        module: AnsibleModule instance
+        client: authenticated VRAAsyncClient instance
+        records: VRAAsyncGuest instance per guest
+        each: coroutine function running a step for each of a list of records
+        lookup: coroutine function updating a record with the VM found for it
+
+    Returns: None (updates the records)
+    """
+    await each(records, lookup)
+    pending = [r for r in records if r.error is None and r.destroy_id is not None]
+    for r in records:
+        r.changed = r in pending
+        if r.error is None and r.destroy_id is None:
+            r.state = 'absent'
+
+    if module.check_mode:
+        return
+
+    async def destroy(record):
+        record.destroy_request_id = await client.destroy(record.destroy_id)
+
+    await each(pending, destroy)
+    if module.params['wait']:
+        await wait_for_requests_async(module, client, pending, each, lambda r: r.destroy_request_id, "destroy")
+        for r in pending:
+            if r.error is None:
+                r.state = 'absent'
+
+    forget_machines(module, [r.hostname for r in pending if r.error is None and r.destroy_request_id is not None])
+
+async def wait_for_requests_async(module, client, records, each, request_id, action):
+    """
+    Poll the outstanding requests of an asyncio batch in a single loop until they all finish or
+    wait_timeout passes - mirrors wait_for_requests
+    Args:
+        module: AnsibleModule instance
+        client: authenticated VRAAsyncClient instance
+        records: VRAAsyncGuest instances with an outstanding request (those with an error are skipped)
+        each: coroutine function running a step for each of a list of records
+        request_id: function returning the ID of the request to poll for a record
+        action: name of the requested action for error messages (create, destroy)
+
+    Returns: None (errors are recorded against the guests)
+    """
+    async def poll(record):
+        status = await client.get_request(request_id(record))
+        record.build_status = status['status']
+        record.build_phase = status['phase']
+        record.retry_after = status['retry_after']
+        if status['status'] == 'Failed':
+            record.error = "Failed to %s VM: %s" % (action, status['explanation'])
+
+    outstanding = [r for r in records if r.error is None]
+    timeout_seconds = module.params['wait_timeout']
+    scheduler = VRAPollScheduler(module.params['poll_strategy'], timeout_seconds)
+    while outstanding:
+        await each(outstanding, poll)
+
+        expired = scheduler.expired()
+        for r in outstanding:
+            if r.error is None and r.build_status != 'Successful' and expired:
+                r.error = "Failed to %s VM in %s seconds" % (action, timeout_seconds)
+
+        outstanding = [r for r in outstanding if r.error is None and r.build_status != 'Successful']
+        if outstanding:
+            retry_after = max([r.retry_after or 0 for r in outstanding]) or None
+            delay = scheduler.next_delay(tuple(sorted(set([str(r.build_phase) for r in outstanding]))), retry_after)
+            await asyncio.sleep(max(0, min(delay, scheduler.deadline - monotonic())))
+
+def destroy_guest(module, vra_helper, result):
+    """
+    Destroy a single guest (if it exists) and wait for the destroy request to complete
+    Args:
+        module: AnsibleModule instance
+        vra_helper: authenticated VRAHelper instance for the guest
+        result: module result dict to update
+
+    Returns: None (exits the module)
+    """
+    vra_helper.get_vm()
+    result['hostname'] = vra_helper.hostname
+    result['request_id'] = vra_helper.request_id
+    result['destroy_id'] = vra_helper.destroy_id
+
+    if vra_helper.destroy_id is not None:
+        result['changed'] = True
+        result['state'] = vra_helper.state
+
+        if not module.check_mode:
+            vra_helper.destroy_vm()
+            result['destroy_request_id'] = vra_helper.destroy_request_id
+
+            if module.params['wait']:
+                scheduler = VRAPollScheduler(module.params['poll_strategy'], module.params['wait_timeout'])
+                while True:
+                    vra_helper.get_vm_build_status(vra_helper.destroy_request_id)
+
+                    if vra_helper.build_status == 'Failed':
+                        module.fail_json(msg="Failed to destroy VM: %s" % vra_helper.build_explanation)
+                    elif vra_helper.build_status == 'Successful':
+                        break
+                    elif scheduler.expired():
+                        module.fail_json(msg="Failed to destroy VM in %s seconds" % (module.params['wait_timeout']))
+
+                    scheduler.wait(vra_helper.build_phase, vra_helper.retry_after)
+
+                result['state'] = 'absent'
+
+            forget_machines(module, [vra_helper.hostname])
+    else:
+        result['state'] = 'absent'
+
+    result['http_calls'] = vra_helper.stats['http_calls']
+    vra_helper.session.close()
+    result['timings'] = TIMINGS.summary()
+    module.exit_json(**result)
 
 def run_module():
     # available options for the module
     module_args = dict(
-        blueprint_instance_id=dict(type='str', required=True),
-        blueprint_name=dict(type='str', required=True),
-        cpu=dict(type='int', required=True),
+        batch_concurrency=dict(type='int', default=10),
+        broker_socket=dict(type='path', default=BROKER_SOCKET),
+        blueprint_instance_id=dict(type='str'),
+        blueprint_name=dict(type='str'),
+        cache_dir=dict(type='path', default='~/.ansible/cache/vra_guest'),
+        catalog_cache_ttl=dict(type='int', default=3600),
+        cpu=dict(type='int'),
+        engine=dict(type='str', default='threads', choices=['threads', 'asyncio']),
         extra_disks=dict(type='list', default=[]),
-        hostname=dict(type='str', required=True),
-        memory=dict(type='int', required=True),
-        network_adapter=dict(type='str', required=True),
+        guests=dict(type='list'),
+        hostname=dict(type='str'),
+        http_pool_connections=dict(type='int', default=4),
+        http_pool_maxsize=dict(type='int', default=10),
+        inventory_index_max_age=dict(type='int', default=0),
+        memory=dict(type='int'),
+        network_adapter=dict(type='str'),
+        poll_strategy=dict(type='dict', default={}, options=dict(
+            initial_interval=dict(type='float'),
+            max_interval=dict(type='float'),
+            backoff_factor=dict(type='float'),
+            jitter=dict(type='float')
+        )),
+        state=dict(type='str', default='present', choices=['present', 'absent']),
+        rate_limit=dict(type='dict', default={}, options=dict(
+            enabled=dict(type='bool', default=True),
+            requests_per_second=dict(type='float'),
+            burst=dict(type='int'),
+            max_retries=dict(type='int'),
+            failure_threshold=dict(type='int'),
+            cooldown=dict(type='float')
+        )),
+        token_cache=dict(type='bool', default=True),
         vra_hostname=dict(type='str', required=True),
         vra_password=dict(type='str', required=True, no_log=True),
         vra_tenant=dict(type='str', required=True),
         vra_username=dict(type='str', required=True),
+        wait=dict(type='bool', default=True),
         wait_timeout=dict(type='int', default=600)
     )
 
@@ -360,42 +1886,116 @@ def run_module():
     # default Ansible constructor
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[['guests', 'hostname']],
+        required_one_of=[['guests', 'hostname']],
         supports_check_mode=True
     )
 
+    # guest settings given at the top level act as defaults for each entry in 'guests'
+    defaults = dict((option, module.params[option]) for option in GUEST_OPTIONS)
+    guests = []
+    for guest in (module.params['guests'] or [defaults]):
+        if not isinstance(guest, dict):
+            module.fail_json(msg="Each entry in 'guests' must be a dictionary of guest settings")
+
+        spec = dict(defaults)
+        spec.update(dict((k, v) for k, v in guest.items() if k in GUEST_OPTIONS and v is not None))
+        required = GUEST_OPTIONS if module.params['state'] == 'present' else ('hostname',)
+        missing = [option for option in required if spec[option] is None]
+        if missing:
+            module.fail_json(msg="Missing required guest settings for '%s': %s" % (spec['hostname'], ", ".join(missing)))
+        guests.append(spec)
+
+    if module.params['engine'] == 'asyncio':
+        if not import_async_libraries():
+            module.fail_json(msg="The asyncio engine requires python 3 and the aiohttp library")
+
+        loop = asyncio.new_event_loop()
+        try:
+            records, stats = loop.run_until_complete(run_batch_async(module, guests))
+        finally:
+            loop.close()
+
+        result['http_calls'] = stats['http_calls']
+
+        if module.params['guests']:
+            result['guests'] = [guest_result(r) for r in records]
+            result['changed'] = any(r.changed for r in records)
+            failures = [r for r in records if r.error is not None]
+            if failures:
+                result['timings'] = TIMINGS.summary()
+                module.fail_json(msg="Failed to provision %s of %s guests" % (len(failures), len(records)), **result)
+        else:
+            if records[0].error is not None:
+                module.fail_json(msg=records[0].error)
+            result.update(guest_result(records[0]))
+            del result['msg']
+
+        result['timings'] = TIMINGS.summary()
+        module.exit_json(**result)
+
     # initialize the interface and get a bearer token
     vra_helper = VRAHelper(module)
-    vra_helper.get_vm()
+
+    if module.params['state'] == 'absent':
+        if module.params['guests']:
+            run_batch_destroy(module, vra_helper, guests, result)
+        destroy_guest(module, vra_helper, result)
+
+    if module.params['guests']:
+        run_batch(module, vra_helper, guests, result)
 
     # check mode - see whether the VMs need to be created
     if module.check_mode:
+        vra_helper.get_vm()
         if vra_helper.ip == None:
             result['changed'] = True
 
+        result['timings'] = TIMINGS.summary()
         module.exit_json(**result)
 
+    # speculatively fetch the catalog ID and template while checking whether the VM exists - unless the
+    # machine index already shows that it does (closing the prefetch cancels whatever it has not started)
+    prefetch = None
+    if not vra_helper.in_machine_index():
+        prefetch = VRABlueprintPrefetch(vra_helper, guests, 1)
+    try:
+        vra_helper.get_vm()
+        if prefetch is not None and vra_helper.ip == None:
+            prefetch.apply(vra_helper)
+    finally:
+        if prefetch is not None:
+            prefetch.close()
+
     # only create the VM if it doesn't already exist
     if vra_helper.ip == None:
         result['changed'] = True
-        vra_helper.get_catalog_id()
-        vra_helper.get_template_json()
+        if vra_helper.error is not None:
+            module.fail_json(msg=vra_helper.error)
         vra_helper.customize_template()
         vra_helper.create_vm_from_template()
 
-        timer = 0
-        timeout_seconds = module.params['wait_timeout']
+        # fire-and-forget - hand back the request ID for collection with vra_request_info
+        if not module.params['wait']:
+            result['hostname'] = vra_helper.hostname
+            result['request_id'] = vra_helper.request_id
+            result['http_calls'] = vra_helper.stats['http_calls']
+            vra_helper.session.close()
+            result['timings'] = TIMINGS.summary()
+            module.exit_json(**result)
+
+        scheduler = VRAPollScheduler(module.params['poll_strategy'], module.params['wait_timeout'])
         while True:
             vra_helper.get_vm_build_status()
 
-            if timer >= timeout_seconds:
-                module.fail_json(msg="Failed to create VM in %s seconds" % (module.params['wait_timeout']))
-            elif vra_helper.build_status == 'Failed':
+            if vra_helper.build_status == 'Failed':
                 module.fail_json(msg="Failed to create VM: %s" % vra_helper.build_explanation)
             elif vra_helper.build_status == 'Successful':
                 break
+            elif scheduler.expired():
+                module.fail_json(msg="Failed to create VM in %s seconds" % (module.params['wait_timeout']))
 
-            time.sleep(15)
-            timer += 15
+            scheduler.wait(vra_helper.build_phase, vra_helper.retry_after)
 
         vra_helper.get_vm()
 
@@ -405,12 +2005,20 @@ def run_module():
     result['destroy_id'] = vra_helper.destroy_id
     result['ip'] = vra_helper.ip
     result['hostname'] = vra_helper.hostname
+    result['request_id'] = vra_helper.request_id
+    result['http_calls'] = vra_helper.stats['http_calls']
 
     # successful run
+    vra_helper.session.close()
+    result['timings'] = TIMINGS.summary()
     module.exit_json(**result)
 
 def main():
-    run_module()
+    TIMINGS.start_profile()
+    try:
+        run_module()
+    finally:
+        TIMINGS.write_trace()
 
 if __name__ == '__main__':
     main()
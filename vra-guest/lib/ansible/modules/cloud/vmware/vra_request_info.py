@@ -0,0 +1,331 @@
+#!/usr/bin/python
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+module: vra_request_info
+
+short_description: Status of many VMware vRA requests in a single task
+
+version_added: "2.6"
+
+description:
+    - "Collect the state of vRealizeAutomation (vRA) requests - typically those submitted by vra_guest with wait: false"
+    - "Requests are looked up in chunks using a single filtered listing call per chunk rather than one call per request"
+    - "Bearer tokens and the controller-wide rate limiter and circuit breaker are shared with the vra_guest module"
+
+options:
+    cache_dir:
+        description:
+            - Directory on the controller used to store state shared between module runs (bearer tokens, etc.) - the
+              same directory as the vra_guest module by default
+        type: path
+        default: "~/.ansible/cache/vra_guest"
+        required: false
+    chunk_size:
+        description:
+            - Number of request IDs looked up per call to vRA
+        type: int
+        default: 25
+        required: false
+    concurrency:
+        description:
+            - Maximum number of concurrent calls to vRA
+        type: int
+        default: 10
+        required: false
+    include_resources:
+        description:
+            - Whether to also look up the hostname, IP address and destroy ID of the machines built by successful requests
+              (one additional call per successful request)
+        type: bool
+        default: false
+        required: false
+    rate_limit:
+        description:
+            - Controller-wide limits on calls to vRA, shared with the vra_guest module (see its C(rate_limit) option for
+              the valid attributes)
+        type: dict
+        required: false
+    request_ids:
+        description:
+            - List of vRA request IDs to get the state of
+        type: list
+        required: true
+    token_cache:
+        description:
+            - Whether to share bearer tokens with other module runs (and the vra_guest module) via C(cache_dir)
+        type: bool
+        default: true
+        required: false
+    vra_hostname:
+        description:
+            - Hostname of the vRA instance to communicate with
+        required: true
+    vra_password:
+        description:
+            - Password of the user interacting with the API
+        required: true
+    vra_tenant:
+        description:
+            - Tenant name for the vRA provisioning
+        required: true
+    vra_username:
+        description:
+            - Name of the user interacting with the API
+        required: true
+
+requirements:
+    - multiprocessing
+    - requests
+
+author:
+    - Justin Karimi (@jekhokie) <jekhokie@gmail.com>
+'''
+
+EXAMPLES = '''
+- name: Submit VM builds without waiting on them
+  delegate_to: localhost
+  vra_guest:
+    blueprint_instance_id: "vSphere__vCenter__Machine_1"
+    blueprint_name: "Linux"
+    cpu: 2
+    hostname: "{{ inventory_hostname }}"
+    memory: 4096
+    network_adapter: "network-adapter-name"
+    vra_hostname: "my-vra-host.localhost"
+    vra_password: "super-secret-pass"
+    vra_tenant: "vsphere.local"
+    vra_username: "automation-user"
+    wait: false
+  register: build
+
+- name: Wait for all of the builds to complete
+  delegate_to: localhost
+  run_once: true
+  vra_request_info:
+    request_ids: "{{ ansible_play_hosts | map('extract', hostvars, ['build', 'request_id']) | select | list }}"
+    include_resources: true
+    vra_hostname: "my-vra-host.localhost"
+    vra_password: "super-secret-pass"
+    vra_tenant: "vsphere.local"
+    vra_username: "automation-user"
+  register: builds
+  until: builds.complete
+  retries: 60
+  delay: 15
+'''
+
+RETURN = '''
+requests:
+    description: State (stateName), phase and completion details of each request, plus hostname, ip and destroy_id if include_resources is set
+    type: list
+    returned: always
+    sample: none
+complete:
+    description: Whether every request has finished (successfully or not)
+    type: bool
+    returned: always
+    sample: true
+successful:
+    description: IDs of the requests that completed successfully
+    type: list
+    returned: always
+    sample: none
+failed_requests:
+    description: IDs of the requests that failed
+    type: list
+    returned: always
+    sample: none
+http_calls:
+    description: Number of HTTP calls made to vRA by the task
+    type: int
+    returned: always
+    sample: 3
+timings:
+    description: Per-operation count, total/max latency (seconds), response bytes and retries of the calls made to vRA
+    type: dict
+    returned: success
+    sample: {"get_requests": {"calls": 2, "total_latency": 0.12, "max_latency": 0.08, "bytes": 2048, "retries": 0}}
+'''
+
+import requests
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.call_timings import CallTimings
+from ansible.module_utils.vra_session import VRASession
+from multiprocessing.pool import ThreadPool
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+# ignore annoyances
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+# request states that will not change any more
+FINAL_STATES = ('Successful', 'Failed', 'Rejected')
+
+# outbound call instrumentation for this invocation
+TIMINGS = CallTimings('vra_request_info')
+
+class VRARequestInfoHelper(VRASession):
+    '''Helper class for looking up the state of many vRA requests.'''
+
+    def __init__(self, module):
+        """
+        Default constructor
+        Args:
+            module: object containing parameters passed by playbook
+
+        Returns: (VRARequestInfoHelper) Instance of the VRARequestInfoHelper class
+        """
+        super(VRARequestInfoHelper, self).__init__(module, TIMINGS, pool_maxsize=module.params['concurrency'])
+
+        # initialize bearer token for auth
+        self.get_auth()
+
+    def get_requests(self, request_ids):
+        """
+        Look up a chunk of requests with a single filtered listing call
+        Args:
+            request_ids: list of request IDs
+
+        Returns: (dict) Request ID -> request details
+        """
+        # the result set is paged in case vRA caps the page size below the chunk size
+        url = "https://%s/catalog-service/api/consumer/requests" % (self.vra_hostname)
+        params = {
+            "$filter": " or ".join(["id eq '%s'" % (request_id.replace("'", "''")) for request_id in request_ids]),
+            "limit": len(request_ids),
+            "page": 1
+        }
+
+        found = {}
+        while True:
+            response = self.request("GET", url, "get_requests", params=dict(params))
+            response.raise_for_status()
+            page = response.json()
+
+            for request in page['content']:
+                explanation = request.get('requestCompletion')
+                found[request['id']] = {
+                    'request_id': request['id'],
+                    'state': request['stateName'],
+                    'phase': request.get('phase'),
+                    'explanation': "" if explanation is None else explanation['completionDetails']
+                }
+
+            if params['page'] >= page.get('metadata', {}).get('totalPages', 1):
+                break
+            params['page'] += 1
+
+        return found
+
+    def get_resources(self, details):
+        """
+        Look up the machine built by a successful request
+        Args:
+            details: request details (updated in place with hostname, ip and destroy_id)
+
+        Returns: None
+        """
+        url = "https://%s/catalog-service/api/consumer/requests/%s/resources" % (self.vra_hostname, details['request_id'])
+        response = self.request("GET", url, "get_resources")
+        response.raise_for_status()
+
+        meta_dict = [element for element in response.json()['content'] if element['providerBinding']['providerRef']['label'] == 'Infrastructure Service'][0]
+        entries = dict((element['key'], (element.get('value') or {}).get('value')) for element in meta_dict['resourceData']['entries'])
+        details['hostname'] = meta_dict.get('name')
+        details['destroy_id'] = meta_dict['id']
+        details['ip'] = entries.get('ip_address')
+        details['machine_status'] = entries.get('MachineStatus')
+
+def run_module():
+    # available options for the module
+    module_args = dict(
+        cache_dir=dict(type='path', default='~/.ansible/cache/vra_guest'),
+        chunk_size=dict(type='int', default=25),
+        concurrency=dict(type='int', default=10),
+        include_resources=dict(type='bool', default=False),
+        rate_limit=dict(type='dict', default={}, options=dict(
+            enabled=dict(type='bool', default=True),
+            requests_per_second=dict(type='float'),
+            burst=dict(type='int'),
+            max_retries=dict(type='int'),
+            failure_threshold=dict(type='int'),
+            cooldown=dict(type='float')
+        )),
+        request_ids=dict(type='list', required=True),
+        token_cache=dict(type='bool', default=True),
+        vra_hostname=dict(type='str', required=True),
+        vra_password=dict(type='str', required=True, no_log=True),
+        vra_tenant=dict(type='str', required=True),
+        vra_username=dict(type='str', required=True)
+    )
+
+    # seed result dict that is returned
+    result = dict(
+        changed=False,
+        failed=False,
+        requests=[],
+        complete=False,
+        successful=[],
+        failed_requests=[]
+    )
+
+    # default Ansible constructor
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    # de-duplicate while keeping the requested order
+    request_ids = []
+    for request_id in module.params['request_ids']:
+        if request_id and request_id not in request_ids:
+            request_ids.append(request_id)
+
+    helper = VRARequestInfoHelper(module)
+    chunk_size = max(1, module.params['chunk_size'])
+    chunks = [request_ids[i:i + chunk_size] for i in range(0, len(request_ids), chunk_size)]
+    pool = ThreadPool(max(1, module.params['concurrency']))
+
+    try:
+        found = {}
+        for chunk in pool.map(helper.get_requests, chunks):
+            found.update(chunk)
+
+        missing = [request_id for request_id in request_ids if request_id not in found]
+        if missing:
+            module.fail_json(msg="Failed to find vRA requests: %s" % (", ".join(missing)))
+
+        if module.params['include_resources']:
+            pool.map(helper.get_resources, [found[i] for i in request_ids if found[i]['state'] == 'Successful'])
+    except Exception as e:
+        module.fail_json(msg="Failed to get vRA request details: %s" % (e))
+    finally:
+        pool.close()
+        pool.join()
+
+    result['requests'] = [found[request_id] for request_id in request_ids]
+    result['successful'] = [r['request_id'] for r in result['requests'] if r['state'] == 'Successful']
+    result['failed_requests'] = [r['request_id'] for r in result['requests'] if r['state'] in ('Failed', 'Rejected')]
+    result['complete'] = all(r['state'] in FINAL_STATES for r in result['requests'])
+    result['http_calls'] = helper.stats['http_calls']
+
+    # successful run
+    helper.session.close()
+    result['timings'] = TIMINGS.summary()
+    module.exit_json(**result)
+
+def main():
+    TIMINGS.start_profile()
+    try:
+        run_module()
+    finally:
+        TIMINGS.write_trace()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+DOCUMENTATION = '''
+---
+name: vra
+plugin_type: inventory
+
+short_description: VMware vRA machines as an inventory source
+
+version_added: "2.6"
+
+description:
+    - "Get inventory hosts from the Infrastructure.Virtual machines visible to a vRealizeAutomation (vRA) user"
+    - "Machines are kept in a local hostname index (request ID, destroy ID, IP address and MachineStatus) that is
+      refreshed incrementally by last-modified time, with a periodic full re-scan to drop machines that no
+      longer exist - the same index can be consulted by the vra_guest module for its existence check"
+    - "Bearer tokens are shared with the vra_guest module through the same token cache"
+    - "Uses a YAML configuration file that ends with vra.yml or vra.yaml"
+
+extends_documentation_fragment:
+    - constructed
+
+options:
+    plugin:
+        description:
+            - Token that ensures this is a source file for the 'vra' plugin
+        required: true
+        choices: ['vra']
+    cache_dir:
+        description:
+            - Directory on the controller used to store the machine index and bearer tokens (shared with the vra_guest
+              module)
+        type: path
+        default: "~/.ansible/cache/vra_guest"
+    full_refresh_interval:
+        description:
+            - Number of seconds after which the index is rebuilt from a full listing rather than refreshed incrementally
+        type: int
+        default: 86400
+    page_size:
+        description:
+            - Number of machines requested per page
+        type: int
+        default: 500
+    page_concurrency:
+        description:
+            - Number of pages fetched in parallel during a full listing
+        type: int
+        default: 8
+    token_cache:
+        description:
+            - Whether to share bearer tokens with other runs (and the vra_guest module) via C(cache_dir)
+        type: bool
+        default: true
+    vra_hostname:
+        description:
+            - Hostname of the vRA instance to communicate with
+        required: true
+    vra_password:
+        description:
+            - Password of the user interacting with the API
+        required: true
+    vra_tenant:
+        description:
+            - Tenant name for the vRA instance
+        required: true
+    vra_username:
+        description:
+            - Name of the user interacting with the API
+        required: true
+
+requirements:
+    - requests
+
+author:
+    - Justin Karimi (@jekhokie) <jekhokie@gmail.com>
+'''
+
+EXAMPLES = '''
+# vra.yml
+plugin: vra
+vra_hostname: "my-vra-host.localhost"
+vra_password: "super-secret-pass"
+vra_tenant: "vsphere.local"
+vra_username: "automation-user"
+keyed_groups:
+    - key: vra_machine_status
+      prefix: status
+'''
+
+import os
+import requests
+import time
+from ansible.errors import AnsibleError
+from ansible.module_utils.vra_session import VRACacheFile, VRASession
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable
+from ansible.utils.display import Display
+from multiprocessing.pool import ThreadPool
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+# ignore annoyances
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+display = Display()
+
+class VRAInventorySettings(object):
+    '''Stand-in for the AnsibleModule expected by VRASession - settings come from the plugin options and
+    failures are raised as AnsibleError.'''
+
+    def __init__(self, plugin):
+        """
+        Default constructor
+        Args:
+            plugin: InventoryModule whose options configure the session
+
+        Returns: (VRAInventorySettings) Instance of the VRAInventorySettings class
+        """
+        self.params = dict((name, plugin.get_option(name)) for name in (
+            'token_cache', 'vra_hostname', 'vra_password', 'vra_tenant', 'vra_username'))
+        self.params['cache_dir'] = os.path.expanduser(plugin.get_option('cache_dir'))
+        self.params['rate_limit'] = {'enabled': False}
+
+    def warn(self, warning):
+        display.warning(warning)
+
+    def fail_json(self, msg, **kwargs):
+        raise AnsibleError(msg)
+
+class InventoryModule(BaseInventoryPlugin, Constructable):
+    '''Inventory plugin for machines provisioned through vRA.'''
+
+    NAME = 'vra'
+
+    def verify_file(self, path):
+        """
+        Only accept configuration files named for this plugin
+        Args:
+            path: path to the inventory source
+
+        Returns: (bool) True if the file can be used by this plugin
+        """
+        return super(InventoryModule, self).verify_file(path) and path.endswith(('vra.yml', 'vra.yaml'))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        self.vra_hostname = self.get_option('vra_hostname')
+        self.session = VRASession(VRAInventorySettings(self), pool_maxsize=max(1, self.get_option('page_concurrency')))
+
+        index_file = VRACacheFile(os.path.expanduser(self.get_option('cache_dir')), "index", self.vra_hostname,
+                                  self.get_option('vra_tenant'), self.get_option('vra_username'))
+        try:
+            index = self.refresh_index(index_file)
+        finally:
+            self.session.session.close()
+
+        strict = self.get_option('strict')
+        for hostname, machine in index['machines'].items():
+            self.inventory.add_host(hostname)
+            variables = {
+                'vra_request_id': machine['request_id'],
+                'vra_destroy_id': machine['destroy_id'],
+                'vra_machine_status': machine['state']
+            }
+            if machine['ip']:
+                variables['ansible_host'] = machine['ip']
+
+            for name, value in variables.items():
+                self.inventory.set_variable(hostname, name, value)
+
+            self._set_composite_vars(self.get_option('compose'), variables, hostname, strict=strict)
+            self._add_host_to_composed_groups(self.get_option('groups'), variables, hostname, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option('keyed_groups'), variables, hostname, strict=strict)
+
+    def refresh_index(self, index_file):
+        """
+        Bring the machine index up to date - machines modified since the last refresh are fetched and
+        merged in, or the whole index is rebuilt when it is missing or older than full_refresh_interval
+        Args:
+            index_file: VRACacheFile holding the index (shared with the vra_guest module)
+
+        Returns: (dict) Index document
+        """
+        with index_file.lock():
+            index = index_file.load()
+
+            # a cached bearer token is used if there is one - the session only logs in when it has none
+            self.session.get_auth()
+            if index is None or (time.time() - index.get('full_refresh', 0)) >= self.get_option('full_refresh_interval'):
+                index = {'full_refresh': time.time(), 'last_updated': None, 'machines': {}}
+                machines = self.list_machines()
+            else:
+                machines = self.list_machines(index['last_updated'])
+
+            for item in machines:
+                machine = self.parse_machine(item)
+                index['machines'][item['name']] = machine
+                if machine['last_updated'] and (index['last_updated'] is None or machine['last_updated'] > index['last_updated']):
+                    index['last_updated'] = machine['last_updated']
+            index['fetched'] = time.time()
+            index_file.store(index)
+
+        return index
+
+    def get_page(self, page_number, since=None):
+        """
+        Fetch a single page of machines (including their resource data)
+        Args:
+            page_number: page to fetch (1-based)
+            since: only return machines modified at or after this timestamp (optional)
+
+        Returns: (dict) Page of machines as returned by vRA
+        """
+        url = "https://%s/catalog-service/api/consumer/resources/types/Infrastructure.Virtual/" % (self.vra_hostname)
+        params = {
+            "withExtendedData": "true",
+            "limit": self.get_option('page_size'),
+            "page": page_number
+        }
+        if since is not None:
+            # machines updated within the same timestamp as the newest one already indexed must not be missed -
+            # re-merging the ones already indexed (by name) is harmless
+            params["$filter"] = "lastUpdated ge '%s'" % (since)
+
+        response = self.session.request("GET", url, "list_machines", params=params)
+        response.raise_for_status()
+
+        return response.json()
+
+    def list_machines(self, since=None):
+        """
+        List machines - the first page is fetched to learn the page count and the rest in parallel
+        Args:
+            since: only return machines modified at or after this timestamp (optional)
+
+        Returns: (list) Machines as returned by vRA
+        """
+        try:
+            first = self.get_page(1, since)
+            machines = list(first['content'])
+
+            total_pages = first.get('metadata', {}).get('totalPages', 1)
+            if total_pages > 1:
+                pool = ThreadPool(max(1, min(self.get_option('page_concurrency'), total_pages - 1)))
+                try:
+                    for page in pool.map(lambda n: self.get_page(n, since), range(2, total_pages + 1)):
+                        machines.extend(page['content'])
+                finally:
+                    pool.close()
+                    pool.join()
+
+            return machines
+        except Exception as e:
+            raise AnsibleError("Failed to list vRA machines: %s" % (e))
+
+    @staticmethod
+    def parse_machine(item):
+        """
+        Reduce a machine listing entry to the fields kept in the index
+        Args:
+            item: machine as returned by vRA
+
+        Returns: (dict) Index entry for the machine
+        """
+        entries = dict((element['key'], (element.get('value') or {}).get('value'))
+                       for element in (item.get('resourceData') or {}).get('entries', []))
+
+        return {
+            'request_id': item.get('requestId'),
+            'destroy_id': item.get('id'),
+            'ip': entries.get('ip_address'),
+            'state': entries.get('MachineStatus'),
+            'last_updated': item.get('lastUpdated')
+        }
@@ -0,0 +1,144 @@
+# Purpose: Tests for the vra_guest module, run against the mock vRA server of the benchmarks.
+
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from ansible.module_utils.vra_session import VRACacheFile, VRASession
+from bench_vra_guest import MODULE, module_args, run_tasks
+from mock_vra import MockVRAServer
+
+class SessionModule(object):
+    '''Stand-in for the AnsibleModule expected by VRASession.'''
+
+    def __init__(self, server, cache_dir, token_cache):
+        self.params = {'vra_hostname': server.address, 'vra_password': "super-secret-pass", 'vra_tenant': "vsphere.local",
+                       'vra_username': "automation-user", 'cache_dir': cache_dir, 'token_cache': token_cache,
+                       'rate_limit': {'enabled': False}}
+
+    def warn(self, warning):
+        pass
+
+    def fail_json(self, msg, **kwargs):
+        raise AssertionError(msg)
+
+@pytest.fixture
+def server():
+    server = MockVRAServer(machines=10, latency=0.02, build_time=0.2).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def work_dir():
+    work_dir = tempfile.mkdtemp()
+    yield work_dir
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def write_index(server, cache_dir, hostnames):
+    """
+    Write the machine index the vra inventory plugin would maintain for some existing machines
+    """
+    machines = {}
+    for hostname in hostnames:
+        machine = server.state.by_name[hostname]
+        machines[hostname] = {'request_id': machine['requestId'], 'destroy_id': machine['id'], 'ip': machine['ip'],
+                              'last_updated': None}
+
+    VRACacheFile(cache_dir, "index", server.address, "vsphere.local", "automation-user").store(
+        {'full_refresh': time.time(), 'last_updated': None, 'fetched': time.time(), 'machines': machines})
+
+def run_module(server, work_dir, extra_args):
+    """
+    Run the module once and get its result
+    """
+    args = module_args(server, os.path.join(work_dir, "cache"), dict(extra_args, poll_strategy={'initial_interval': 0.1}))
+    return run_tasks([args], work_dir)[0]['result']
+
+def test_indexed_vm_skips_blueprint_prefetch(server, work_dir):
+    write_index(server, os.path.join(work_dir, "cache"), ["existing-vm-00001"])
+
+    result = run_module(server, work_dir, {'hostname': "existing-vm-00001", 'inventory_index_max_age': 300})
+
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed'] is False
+    assert server.state.stats['operations'] == {}
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_indexed_batch_skips_blueprint_prefetch(server, work_dir, engine):
+    hostnames = ["existing-vm-%05d" % (i) for i in range(5)]
+    write_index(server, os.path.join(work_dir, "cache"), hostnames)
+
+    result = run_module(server, work_dir, {'guests': [{'hostname': h} for h in hostnames],
+                                           'inventory_index_max_age': 300, 'engine': engine})
+
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed'] is False
+    assert server.state.stats['operations'] == {}
+
+def test_new_vm_uses_blueprint_prefetch(server, work_dir):
+    result = run_module(server, work_dir, {'hostname': "new-vm-00001", 'inventory_index_max_age': 300})
+
+    assert not result.get('failed'), result.get('msg')
+    assert result['changed'] is True
+    assert server.state.stats['operations'] == {'catalog': 1, 'template': 1}
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_catalog_and_template_cached_between_runs(server, work_dir, engine):
+    for run in range(2):
+        server.state.reset_stats()
+        result = run_module(server, work_dir, {'guests': [{'hostname': "new-vm-%s-%s" % (engine, run)}],
+                                               'catalog_cache_ttl': 300, 'engine': engine})
+
+        assert not result.get('failed'), result.get('msg')
+        assert result['changed'] is True
+
+    assert server.state.stats['operations'] == {}
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_expired_catalog_is_revalidated(server, work_dir, engine):
+    for run in range(2):
+        server.state.reset_stats()
+        result = run_module(server, work_dir, {'guests': [{'hostname': "new-vm-%s-%s" % (engine, run)}],
+                                               'catalog_cache_ttl': 1, 'engine': engine})
+        assert not result.get('failed'), result.get('msg')
+        time.sleep(1)
+
+    assert server.state.stats['operations'] == {'catalog_not_modified': 1, 'template': 1}
+
+def test_request_info_pages_large_chunks(work_dir):
+    server = MockVRAServer(machines=30).start()
+    try:
+        request_ids = sorted(server.state.requests)
+        args = {'request_ids': request_ids, 'chunk_size': 50, 'vra_hostname': server.address,
+                'vra_password': "super-secret-pass", 'vra_tenant': "vsphere.local", 'vra_username': "automation-user",
+                'cache_dir': os.path.join(work_dir, "cache")}
+        module = os.path.join(os.path.dirname(MODULE), "vra_request_info.py")
+        result = run_tasks([args], work_dir, module=module)[0]['result']
+    finally:
+        server.stop()
+
+    assert not result.get('failed'), result.get('msg')
+    assert [r['request_id'] for r in result['requests']] == request_ids
+    assert result['timings']['get_requests']['calls'] == 2
+
+@pytest.mark.filterwarnings("ignore:Unverified HTTPS request")
+@pytest.mark.parametrize("token_cache", [True, False])
+def test_refreshed_token_shared_by_session_copies(server, work_dir, token_cache):
+    session = VRASession(SessionModule(server, os.path.join(work_dir, "cache"), token_cache))
+    session.get_auth()
+    copies = [copy.copy(session) for i in range(3)]
+
+    # each copy in turn is the first to see its token rejected
+    server.state.reset_stats()
+    url = "https://%s/catalog-service/api/consumer/entitledCatalogItems" % (server.address)
+    for helper in copies:
+        server.state.revoke_tokens()
+        assert helper.request("GET", url, "get_catalog_id").status_code == 200
+        assert helper.request("GET", url, "get_catalog_id").status_code == 200
+
+    assert server.state.stats['unauthorized'] == 3
+    assert server.state.stats['logins'] == 3